@@ -36,6 +36,27 @@ LIVE vs ARCHIVE:
   - No --pos            -> LIVE: save the next --duration seconds.
   - --pos <ISO|epochMs> -> ARCHIVE: save --duration seconds starting there.
 
+BATCH EXPORT (--manifest <file>):
+  Pull many clips (e.g. one incident across 40 cameras) in ONE run: log in once,
+  then download every job in the manifest concurrently over one pooled session,
+  at most --workers at a time. The manifest is a JSON array (or JSON Lines) of
+    {"deviceId": ..., "positionMs": ..., "durationMs": ..., "format": ..., "out": ...}
+  where only deviceId is required. See export_batch().
+
+SEGMENTED ARCHIVE DOWNLOAD (--segments N):
+  One long archive GET is bound by a single TCP stream through the relay. With
+  --segments the [--pos, --pos + --duration) window is split into N contiguous
+  sub-windows, fetched in parallel, and stitched back into ONE file in order.
+  Only byte-concatenable containers (CONCATENABLE_FORMATS: mpegts) can be
+  stitched this way; webm/mp4/mkv carry headers and indexes per file.
+
+RESUMABLE ARCHIVE DOWNLOAD (--resume --out <file>):
+  The window is fetched as consecutive --checkpoint-every sub-windows appended
+  to --out; after each one a sidecar <out>.checkpoint.json records the bytes
+  written and the archive time reached. If the run dies (relay node restart,
+  network blip), rerunning the same command truncates the partial sub-window
+  and continues from the next positionMs instead of re-downloading everything.
+
 Because a CLI must terminate, the clip is always bounded by --duration
 (seconds, default 10). durationMs is sent to the server AND used as a
 client-side safety stop so the program can never hang on an endless stream.
@@ -49,18 +70,23 @@ Reference: https://meta.nxvms.com/doc/developers/api-tool/main?type=1
 """
 
 import argparse
+import concurrent.futures
 import datetime as dt
+import json
 import os
 import re
 import sys
+import tempfile
+import time
 
-import requests
-
+# nx_transport.py, one folder up, is the HTTP layer every Python sample
+# shares: pooled sessions, logins, the relay 307 and the error types.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from nx_transport import (  # noqa: E402
+    API, RELAY_SUFFIX, ApiError, AuthError, RedirectCache,
+    build_session, cloud_logout_url, local_logout_url, login_cloud, login_local,
+    revoke_token, send_following_redirects)
 
-CLIENT_ID = "3rdParty"
-RELAY_SUFFIX = ".relay.vmsproxy.com"
-# API version path segment. v4 is the latest Nx REST API.
-API = "/rest/v4"
 
 # The two auth modes this sample supports (same names as the web sample).
 MODE_DIRECT = "direct"
@@ -75,22 +101,17 @@ DEFAULT_FORMAT = "webm"
 DEFAULT_DURATION_S = 10
 # Extra wall-clock grace beyond durationMs before the client-side stop fires.
 ABORT_GRACE_MS = 10000
-# Most redirects we will follow when chasing the relay 307.
-MAX_REDIRECTS = 5
 # Size of the chunks streamed to disk (bytes).
 CHUNK_SIZE = 64 * 1024
-
-
-# ---------------------------------------------------------------------------
-# Errors
-# ---------------------------------------------------------------------------
-
-class AuthError(Exception):
-    """Raised when login or the bearer token is rejected."""
-
-
-class ApiError(Exception):
-    """Raised for any other unexpected API/network failure."""
+# Concurrent downloads in --manifest (batch) mode when --workers is not given.
+DEFAULT_WORKERS = 4
+# Containers whose byte streams can be appended back to back and still play
+# as one clip. Only these can be fetched with --segments.
+CONCATENABLE_FORMATS = ["mpegts"]
+# Archive length fetched between two checkpoints in --resume mode (seconds).
+DEFAULT_CHECKPOINT_S = 60
+# Sidecar file (next to --out) holding the --resume progress.
+CHECKPOINT_SUFFIX = ".checkpoint.json"
 
 
 # ---------------------------------------------------------------------------
@@ -148,12 +169,121 @@ def duration_to_ms(seconds):
     return round(number * 1000)
 
 
-def default_out_name(device_id, fmt, now=None):
-    """Default output filename: clip-<device>-<ts>.<fmt> (filesystem-safe)."""
+def default_out_name(device_id, fmt, now=None, tag=None):
+    """Default output filename: clip-<device>-<ts>[-<tag>].<fmt> (filesystem-safe).
+
+    The timestamp only has second resolution, so callers naming several
+    clips at once pass a distinct `tag` for each.
+    """
     now = now or dt.datetime.now(dt.timezone.utc)
     stamp = now.strftime("%Y-%m-%dT%H-%M-%S")
     safe_id = re.sub(r"[^A-Za-z0-9._-]", "_", str(device_id))
-    return f"clip-{safe_id}-{stamp}.{fmt}"
+    suffix = f"-{tag}" if tag else ""
+    return f"clip-{safe_id}-{stamp}{suffix}.{fmt}"
+
+
+def split_window(position_ms, duration_ms, segments):
+    """Split [position_ms, position_ms + duration_ms) into `segments`
+    contiguous (positionMs, durationMs) sub-windows that cover it exactly.
+
+    The remainder of an uneven split goes to the first sub-windows, so no two
+    differ by more than 1 ms. Never returns an empty sub-window.
+    """
+    if segments < 1:
+        raise ApiError("--segments must be at least 1.")
+    segments = min(segments, duration_ms)
+    base, extra = divmod(duration_ms, segments)
+    windows = []
+    start = position_ms
+    for index in range(segments):
+        length = base + (1 if index < extra else 0)
+        windows.append((start, length))
+        start += length
+    return windows
+
+
+def checkpoint_path(out_path):
+    """Where the --resume sidecar for `out_path` lives."""
+    return f"{out_path}{CHECKPOINT_SUFFIX}"
+
+
+def load_checkpoint(path):
+    """Read a --resume checkpoint. Missing file -> None."""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as handle:
+            return json.load(handle)
+    except (OSError, ValueError) as exc:
+        raise ApiError(f"Could not read checkpoint {path}: {exc}") from exc
+
+
+def save_checkpoint(path, state):
+    """Write a checkpoint atomically, so a crash never leaves half a file."""
+    temp = f"{path}.tmp"
+    with open(temp, "w", encoding="utf-8") as handle:
+        json.dump(state, handle)
+    os.replace(temp, path)
+
+
+def parse_manifest(entries, default_format=DEFAULT_FORMAT,
+                   default_duration_ms=DEFAULT_DURATION_S * 1000):
+    """Validate batch-export jobs into a list of plain job dicts.
+
+    Each entry is {"deviceId", "positionMs", "durationMs", "format", "out"};
+    only deviceId is required. positionMs may be ISO or epoch ms (omit for
+    live), durationMs is milliseconds. Missing "out" gets default_out_name()
+    tagged with the job number, so two jobs for one device never share a
+    file; two jobs naming the same "out" are rejected, since they would be
+    downloaded into one file at the same time.
+    """
+    if not isinstance(entries, list):
+        raise ApiError("The manifest must be a JSON array of job objects.")
+    jobs = []
+    outs = {}
+    for number, entry in enumerate(entries, start=1):
+        if not isinstance(entry, dict):
+            raise ApiError(f"Manifest job {number} is not an object.")
+        device_id = entry.get("deviceId") or entry.get("device_id")
+        if not device_id:
+            raise ApiError(f"Manifest job {number} has no deviceId.")
+        fmt = normalize_format(entry.get("format") or default_format)
+        duration_ms = entry.get("durationMs", default_duration_ms)
+        try:
+            duration_ms = int(duration_ms)
+        except (TypeError, ValueError):
+            duration_ms = 0
+        if duration_ms <= 0:
+            raise ApiError(
+                f"Manifest job {number}: durationMs must be a positive number "
+                f"of milliseconds (got {entry.get('durationMs')!r}).")
+        out = entry.get("out") or default_out_name(device_id, fmt, tag=f"job{number}")
+        other = outs.setdefault(os.path.abspath(out), number)
+        if other != number:
+            raise ApiError(f"Manifest jobs {other} and {number} both write {out}.")
+        jobs.append({
+            "device_id": str(device_id),
+            "format": fmt,
+            "position_ms": parse_position_ms(entry.get("positionMs")),
+            "duration_ms": duration_ms,
+            "out": out,
+        })
+    return jobs
+
+
+def load_manifest(path):
+    """Read a manifest file: a JSON array, or JSON Lines (one job per line)."""
+    try:
+        with open(path, "r", encoding="utf-8") as handle:
+            text = handle.read()
+    except OSError as exc:
+        raise ApiError(f"Could not read manifest {path}: {exc}") from exc
+    try:
+        if text.lstrip().startswith("["):
+            return json.loads(text)
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+    except ValueError as exc:
+        raise ApiError(f"Manifest {path} is not valid JSON: {exc}") from exc
 
 
 # ---------------------------------------------------------------------------
@@ -224,7 +354,7 @@ class NxMediaClient:
 
     def __init__(self, mode, user, password, server_host="",
                  cloud_host="https://nxvms.com", site_id="", mfa_code=None,
-                 verify_tls=True, session=None, timeout=15):
+                 verify_tls=True, session=None, timeout=15, redirect_cache=None):
         self.mode = mode
         self.user = user
         self.password = password
@@ -233,8 +363,9 @@ class NxMediaClient:
         self.site_id = site_id
         self.mfa_code = mfa_code
         self.timeout = timeout
-        self.session = session or requests.Session()
+        self.session = session or build_session()
         self.session.verify = verify_tls
+        self.redirect_cache = redirect_cache or RedirectCache()
         self.token = None
 
     @property
@@ -257,66 +388,19 @@ class NxMediaClient:
     # -----------------------------------------------------------------------
 
     def login(self):
-        return self._login_cloud() if self.mode == MODE_CLOUD else self._login_direct()
-
-    def _login_direct(self):
-        """Direct: POST {server}/rest/v4/login/sessions -> { token }."""
-        url = f"{self.server_host}{API}/login/sessions"
-        body = {"username": self.user, "password": self.password, "setCookie": False}
-        try:
-            response = self.session.post(url, json=body, timeout=self.timeout)
-        except requests.exceptions.RequestException as exc:
-            raise ApiError(f"Could not reach {url}: {exc}") from exc
-        if response.status_code in (401, 403):
-            raise AuthError(
-                f"Login rejected (HTTP {response.status_code}). Check the "
-                "username/password, and that it is a LOCAL server account "
-                "(cloud users use --mode cloud).")
-        if not response.ok:
-            raise ApiError(f"Login failed: HTTP {response.status_code} "
-                           f"{response.text[:200]}")
-        try:
-            data = response.json()
-        except ValueError as exc:
-            raise ApiError("Login response was not valid JSON.") from exc
-        self.token = data.get("token")
-        if not self.token:
-            raise ApiError("Login response did not contain a token.")
-        return self.token
-
-    def _login_cloud(self):
-        """Cloud: POST {cloud}/cdb/oauth2/token with cloudSystemId scope."""
-        url = f"{self.cloud_host}/cdb/oauth2/token"
-        body = {
-            "grant_type": "password",
-            "response_type": "token",
-            "client_id": CLIENT_ID,
-            "username": self.user,
-            "password": self.password,
-            # THIS scope is what makes the token usable against the site relay.
-            "scope": f"cloudSystemId={self.site_id}",
-        }
-        if self.mfa_code:
-            body["mfaCode"] = self.mfa_code
-        try:
-            response = self.session.post(url, json=body, timeout=self.timeout)
-        except requests.exceptions.RequestException as exc:
-            raise ApiError(f"Could not reach {url}: {exc}") from exc
-        if response.status_code in (401, 403):
-            raise AuthError(
-                f"Login rejected (HTTP {response.status_code}). Check the cloud "
-                "email/password, the site id, and that the account has access to "
-                "that site. Add --mfa-code for 2FA.")
-        if not response.ok:
-            raise ApiError(f"Token request failed: HTTP {response.status_code} "
-                           f"{response.text[:200]}")
-        try:
-            data = response.json()
-        except ValueError as exc:
-            raise ApiError("Token response was not valid JSON.") from exc
-        self.token = data.get("access_token")
-        if not self.token:
-            raise ApiError("Token response did not contain an access_token.")
+        """Direct: POST {server}/rest/v4/login/sessions. Cloud: a token from
+        {cloud}/cdb/oauth2/token scoped with cloudSystemId -- THAT scope is
+        what makes it usable against the site relay."""
+        if self.mode == MODE_CLOUD:
+            self.token = login_cloud(self.session, self.cloud_host, self.user,
+                                     self.password, self.site_id, self.mfa_code,
+                                     timeout=self.timeout)
+        else:
+            self.token = login_local(
+                self.session, self.server_host, self.user, self.password,
+                timeout=self.timeout,
+                rejected="Check the username/password, and that it is a LOCAL "
+                         "server account (cloud users use --mode cloud).")
         return self.token
 
     # -----------------------------------------------------------------------
@@ -341,30 +425,13 @@ class NxMediaClient:
     def _get_following_redirects(self, url):
         """GET that follows the relay's 307 MANUALLY, re-attaching the bearer.
 
-        Auto-follow can drop the Authorization header across hosts, so we use
-        allow_redirects=False and resolve Location ourselves, re-sending the
-        bearer on every hop. Works for the direct server too (it just won't
-        redirect). stream=True so the body is read in chunks, not buffered.
+        stream=True so the body is read in chunks, not buffered. Once a 307
+        has been followed, self.redirect_cache sends later requests straight
+        to the serving node. See nx_transport.send_following_redirects().
         """
-        from urllib.parse import urljoin
-        headers = self._auth_header()
-        current = url
-        for _hop in range(MAX_REDIRECTS + 1):
-            try:
-                response = self.session.get(
-                    current, headers=headers, timeout=self.timeout,
-                    allow_redirects=False, stream=True)
-            except requests.exceptions.RequestException as exc:
-                raise ApiError(f"Could not reach {current}: {exc}") from exc
-            if response.status_code in (301, 302, 303, 307, 308):
-                location = response.headers.get("Location")
-                if not location:
-                    return response
-                current = urljoin(current, location)
-                continue  # re-issue with the SAME headers -> bearer re-attached
-            return response
-        raise ApiError(
-            f"Too many redirects (>{MAX_REDIRECTS}) chasing the relay.")
+        return send_following_redirects(self.session, "GET", url,
+                                        self._auth_header(), self.redirect_cache,
+                                        timeout=self.timeout, stream=True)
 
     # -----------------------------------------------------------------------
     # save_clip(): fetch the media stream and write it through `sink`.
@@ -374,7 +441,9 @@ class NxMediaClient:
         """Fetch the clip and hand the response body to `sink`, which writes it
         somewhere and returns the number of bytes written. Returns the byte
         count. A client-side wall-clock stop (durationMs + grace) ensures the
-        CLI can never hang on an endless live stream.
+        CLI can never hang on an endless live stream. An archive window that
+        hits it raises ApiError instead: stopped early, it would be saved,
+        stitched or checkpointed as if it were whole.
         """
         url = self.build_media_url(device_id, fmt, position_ms, duration_ms)
         response = self._get_following_redirects(url)
@@ -397,8 +466,12 @@ class NxMediaClient:
         def chunks():
             for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
                 if deadline is not None and _now_ms() > deadline:
-                    # Safety stop: never hang on an endless stream.
-                    break
+                    if position_ms is None:
+                        break  # Safety stop: never hang on an endless live stream.
+                    raise ApiError(
+                        f"Archive window at {position_ms} ms was still streaming "
+                        f"{duration_ms + ABORT_GRACE_MS} ms after it started; "
+                        "stopped rather than keep it cut short.")
                 if chunk:
                     yield chunk
 
@@ -407,6 +480,123 @@ class NxMediaClient:
         finally:
             response.close()
 
+    # -----------------------------------------------------------------------
+    # save_clip_segmented(): one archive window, N parallel sub-window GETs.
+    # -----------------------------------------------------------------------
+
+    def save_clip_segmented(self, sink, device_id, fmt, position_ms, duration_ms,
+                            segments, workers=None, temp_dir=None):
+        """Fetch an ARCHIVE window as `segments` parallel sub-window requests
+        and hand their bodies to `sink` as one in-order stream.
+
+        Each sub-window is spooled to its own temp file (never held in memory)
+        by save_clip(); once all have arrived they are replayed to `sink` in
+        time order. Only CONCATENABLE_FORMATS can be stitched like this. A
+        failing sub-window -- one cut off by save_clip()'s wall-clock stop
+        included -- fails the whole clip; nothing reaches `sink`.
+        Returns the byte count written by `sink`.
+        """
+        if fmt not in CONCATENABLE_FORMATS:
+            raise ApiError(
+                f'--segments needs a concatenable container '
+                f'({", ".join(CONCATENABLE_FORMATS)}), not "{fmt}".')
+        if position_ms is None:
+            raise ApiError("--segments only applies to archive clips (--pos).")
+        windows = split_window(position_ms, duration_ms, segments)
+
+        with tempfile.TemporaryDirectory(prefix="nx-segments-", dir=temp_dir) as tmp:
+            paths = [os.path.join(tmp, f"{index:05d}.{fmt}")
+                     for index in range(len(windows))]
+
+            def fetch(index):
+                start, length = windows[index]
+                return self.save_clip(file_sink(paths[index]), device_id, fmt,
+                                      position_ms=start, duration_ms=length)
+
+            with concurrent.futures.ThreadPoolExecutor(
+                    max_workers=workers or len(windows)) as pool:
+                futures = [pool.submit(fetch, index) for index in range(len(windows))]
+                try:
+                    for future in futures:
+                        future.result()  # re-raises the first failure
+                except BaseException:
+                    for future in futures:
+                        future.cancel()
+                    raise
+
+            def chunks():
+                for path in paths:
+                    with open(path, "rb") as handle:
+                        for chunk in iter(lambda: handle.read(CHUNK_SIZE), b""):
+                            yield chunk
+
+            return sink(chunks())
+
+    # -----------------------------------------------------------------------
+    # save_clip_resumable(): sequential sub-windows + a sidecar checkpoint.
+    # -----------------------------------------------------------------------
+
+    def save_clip_resumable(self, out_path, device_id, fmt, position_ms,
+                            duration_ms, segment_ms=DEFAULT_CHECKPOINT_S * 1000,
+                            on_segment=None):
+        """Fetch an ARCHIVE window into `out_path`, checkpointing after every
+        `segment_ms` of footage, and pick up where a previous run stopped.
+
+        The checkpoint ({out_path}.checkpoint.json) stores the clip it belongs
+        to, the sub-windows completed, the bytes written, and the archive time
+        reached. On rerun the file is truncated back to the last completed
+        sub-window (dropping any half-written one) and fetching continues from
+        the next positionMs. The checkpoint is removed once the clip is whole.
+        Returns the final file size in bytes.
+        """
+        if fmt not in CONCATENABLE_FORMATS:
+            raise ApiError(
+                f'--resume needs a concatenable container '
+                f'({", ".join(CONCATENABLE_FORMATS)}), not "{fmt}".')
+        if position_ms is None:
+            raise ApiError("--resume only applies to archive clips (--pos).")
+        if segment_ms <= 0:
+            raise ApiError("--checkpoint-every must be a positive duration.")
+        windows = split_window(position_ms, duration_ms,
+                               -(-duration_ms // segment_ms))
+        clip = {"deviceId": str(device_id), "format": fmt,
+                "positionMs": position_ms, "durationMs": duration_ms,
+                "segments": len(windows)}
+
+        sidecar = checkpoint_path(out_path)
+        state = load_checkpoint(sidecar)
+        if state is not None:
+            if {key: state.get(key) for key in clip} != clip:
+                raise ApiError(
+                    f"{sidecar} belongs to a different clip. Delete it (and "
+                    f"{out_path}) to start over.")
+            if not os.path.exists(out_path) or \
+                    os.path.getsize(out_path) < state["bytesWritten"]:
+                raise ApiError(
+                    f"{out_path} is shorter than its checkpoint says. Delete "
+                    f"{sidecar} to start over.")
+            with open(out_path, "r+b") as handle:
+                handle.truncate(state["bytesWritten"])  # drop a partial segment
+        else:
+            state = dict(clip, completedSegments=0, bytesWritten=0,
+                         reachedMs=position_ms)
+            open(out_path, "wb").close()
+            save_checkpoint(sidecar, state)
+
+        for index in range(state["completedSegments"], len(windows)):
+            start, length = windows[index]
+            self.save_clip(file_sink(out_path, append=True), device_id, fmt,
+                           position_ms=start, duration_ms=length)
+            state.update(completedSegments=index + 1,
+                         bytesWritten=os.path.getsize(out_path),
+                         reachedMs=start + length)
+            save_checkpoint(sidecar, state)
+            if on_segment:
+                on_segment(dict(state))
+
+        os.remove(sidecar)
+        return state["bytesWritten"]
+
     # -----------------------------------------------------------------------
     # logout(): revoke the token. Best-effort cleanup.
     # -----------------------------------------------------------------------
@@ -414,16 +604,11 @@ class NxMediaClient:
     def logout(self):
         if not self.token:
             return
-        url = (f"{self.cloud_host}/cdb/oauth2/token/{self.token}"
+        url = (cloud_logout_url(self.cloud_host, self.token)
                if self.mode == MODE_CLOUD
-               else f"{self.server_host}{API}/login/sessions/{self.token}")
-        try:
-            self.session.delete(url, headers=self._auth_header(),
-                                timeout=self.timeout)
-        except requests.exceptions.RequestException:
-            pass  # best effort
-        finally:
-            self.token = None
+               else local_logout_url(self.server_host, self.token))
+        revoke_token(self.session, url, self.token, timeout=self.timeout)
+        self.token = None
 
 
 def _now_ms():
@@ -436,13 +621,14 @@ def _now_ms():
 # File sink: stream the response body to a file on disk (no buffering).
 # ---------------------------------------------------------------------------
 
-def file_sink(out_path):
+def file_sink(out_path, append=False):
     """Return a sink that writes each chunk to out_path and returns the byte
-    count. The clip is never held in memory all at once.
+    count. The clip is never held in memory all at once. append=True adds to
+    the end of an existing file instead of replacing it.
     """
     def sink(chunks):
         written = 0
-        with open(out_path, "wb") as handle:
+        with open(out_path, "ab" if append else "wb") as handle:
             for chunk in chunks:
                 handle.write(chunk)
                 written += len(chunk)
@@ -450,6 +636,43 @@ def file_sink(out_path):
     return sink
 
 
+# ---------------------------------------------------------------------------
+# Batch export: many clips, one login, bounded concurrency.
+# ---------------------------------------------------------------------------
+
+def export_batch(client, jobs, workers=DEFAULT_WORKERS, sink_factory=file_sink,
+                 on_result=None):
+    """Download every job with at most `workers` clips in flight.
+
+    The client must already be logged in: all jobs share its token and its
+    (pooled) session. A failing job does not stop the others; its result
+    carries the error instead. Returns one result dict per job, in manifest
+    order: {device_id, out, bytes, seconds, bytes_per_s, error}.
+    """
+    if workers < 1:
+        raise ApiError("--workers must be at least 1.")
+
+    def run(job):
+        started = time.perf_counter()
+        result = {"device_id": job["device_id"], "out": job["out"],
+                  "bytes": 0, "seconds": 0.0, "bytes_per_s": 0.0, "error": None}
+        try:
+            result["bytes"] = client.save_clip(
+                sink_factory(job["out"]), job["device_id"], job["format"],
+                position_ms=job["position_ms"], duration_ms=job["duration_ms"])
+        except (AuthError, ApiError, OSError) as exc:
+            result["error"] = str(exc)
+        result["seconds"] = time.perf_counter() - started
+        if result["seconds"] > 0:
+            result["bytes_per_s"] = result["bytes"] / result["seconds"]
+        if on_result:
+            on_result(result)
+        return result
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(run, jobs))
+
+
 # ---------------------------------------------------------------------------
 # CLI
 # ---------------------------------------------------------------------------
@@ -480,6 +703,20 @@ def build_arg_parser():
                         help="Clip length in seconds (default 10)")
     parser.add_argument("--out", default=None,
                         help="Output file (default clip-<device>-<ts>.<format>)")
+    parser.add_argument("--segments", default=1, type=int,
+                        help="Archive only: fetch the window as N parallel "
+                             "sub-windows and stitch them (mpegts; default 1)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Archive only: checkpoint progress next to --out and "
+                             "continue an interrupted download (mpegts)")
+    parser.add_argument("--checkpoint-every", default=None,
+                        help=f"Seconds of footage between --resume checkpoints "
+                             f"(default {DEFAULT_CHECKPOINT_S})")
+    parser.add_argument("--manifest", default=None,
+                        help="Batch export: JSON array / JSON Lines of "
+                             "{deviceId, positionMs, durationMs, format, out} jobs")
+    parser.add_argument("--workers", default=DEFAULT_WORKERS, type=int,
+                        help=f"Concurrent downloads with --manifest (default {DEFAULT_WORKERS})")
     parser.add_argument("--env-file", default=".env", help="Path to a .env file")
     parser.add_argument("--insecure", action="store_true",
                         help="Skip TLS verification (usually needed for local servers)")
@@ -497,12 +734,54 @@ def main(argv=None):
         return 2
 
     missing = missing_fields(config)
+    if args.manifest:
+        # Device ids come from the manifest, not from --device-id.
+        missing = [name for name in missing if name != "device_id"]
     if missing:
         print("Missing config: " + ", ".join(missing) +
               ".\nProvide via flags or .env (copy .env.example). See the README.",
               file=sys.stderr)
         return 2
 
+    if args.manifest:
+        if args.segments != 1 or args.resume or args.checkpoint_every is not None:
+            print("--segments, --resume and --checkpoint-every apply to a single "
+                  "clip, not to --manifest.", file=sys.stderr)
+            return 2
+        return _main_batch(args, config)
+
+    if args.segments < 1:
+        print("--segments must be at least 1.", file=sys.stderr)
+        return 2
+    if args.segments > 1 and config["position_ms"] is None:
+        print("--segments only applies to archive clips; add --pos.", file=sys.stderr)
+        return 2
+    if args.segments > 1 and config["format"] not in CONCATENABLE_FORMATS:
+        print(f"--segments needs --format {' or '.join(CONCATENABLE_FORMATS)} "
+              "(the only containers that can be stitched).", file=sys.stderr)
+        return 2
+
+    if args.resume:
+        if args.segments > 1:
+            print("Use either --resume or --segments, not both.", file=sys.stderr)
+            return 2
+        if config["position_ms"] is None or not config["out"]:
+            print("--resume needs --pos (archive) and a fixed --out file to "
+                  "resume into.", file=sys.stderr)
+            return 2
+        if config["format"] not in CONCATENABLE_FORMATS:
+            print(f"--resume needs --format {' or '.join(CONCATENABLE_FORMATS)} "
+                  "(the only containers that can be appended).", file=sys.stderr)
+            return 2
+        try:
+            checkpoint_ms = (DEFAULT_CHECKPOINT_S * 1000
+                             if args.checkpoint_every is None
+                             else duration_to_ms(args.checkpoint_every))
+        except ApiError:
+            print("--checkpoint-every must be a positive number of seconds "
+                  f'(got "{args.checkpoint_every}").', file=sys.stderr)
+            return 2
+
     out_path = config["out"] or default_out_name(config["device_id"], config["format"])
 
     client = NxMediaClient(
@@ -510,6 +789,7 @@ def main(argv=None):
         server_host=config["server_host"], cloud_host=config["cloud_host"],
         site_id=config["site_id"], mfa_code=config["mfa_code"],
         verify_tls=not args.insecure,
+        session=build_session(args.segments) if args.segments > 1 else None,
     )
 
     live_or_archive = ("live" if config["position_ms"] is None
@@ -518,9 +798,26 @@ def main(argv=None):
         client.login()
         print(f"Saving {config['duration_ms'] / 1000}s {live_or_archive} clip of "
               f"device {config['device_id']} ({config['format']}) to {out_path} ...")
-        bytes_written = client.save_clip(
-            file_sink(out_path), config["device_id"], config["format"],
-            position_ms=config["position_ms"], duration_ms=config["duration_ms"])
+        if args.resume:
+            state = load_checkpoint(checkpoint_path(out_path))
+            if state:
+                print(f"Resuming at {state['reachedMs']}ms "
+                      f"({state['bytesWritten']} bytes already saved)")
+            bytes_written = client.save_clip_resumable(
+                out_path, config["device_id"], config["format"],
+                config["position_ms"], config["duration_ms"], checkpoint_ms,
+                on_segment=lambda st: print(
+                    f"  {st['completedSegments']}/{st['segments']} "
+                    f"(reached {st['reachedMs']}ms, {st['bytesWritten']} bytes)"))
+        elif args.segments > 1:
+            bytes_written = client.save_clip_segmented(
+                file_sink(out_path), config["device_id"], config["format"],
+                config["position_ms"], config["duration_ms"], args.segments)
+        else:
+            bytes_written = client.save_clip(
+                file_sink(out_path), config["device_id"], config["format"],
+                position_ms=config["position_ms"],
+                duration_ms=config["duration_ms"])
         print(f"Done. Wrote {bytes_written} bytes to {out_path}")
         return 0
     except AuthError as exc:
@@ -533,5 +830,54 @@ def main(argv=None):
         client.logout()
 
 
+def _main_batch(args, config):
+    """--manifest: one login, every job downloaded concurrently."""
+    try:
+        jobs = parse_manifest(load_manifest(args.manifest), config["format"],
+                              config["duration_ms"])
+    except ApiError as exc:
+        print(f"{exc}", file=sys.stderr)
+        return 2
+    if args.workers < 1:
+        print("--workers must be at least 1.", file=sys.stderr)
+        return 2
+
+    client = NxMediaClient(
+        config["mode"], config["user"], config["password"],
+        server_host=config["server_host"], cloud_host=config["cloud_host"],
+        site_id=config["site_id"], mfa_code=config["mfa_code"],
+        verify_tls=not args.insecure, session=build_session(args.workers),
+    )
+
+    def report(result):
+        if result["error"]:
+            print(f"  FAILED {result['device_id']} -> {result['out']}: "
+                  f"{result['error']}", file=sys.stderr)
+        else:
+            print(f"  {result['device_id']} -> {result['out']}: "
+                  f"{result['bytes']} bytes in {result['seconds']:.1f}s "
+                  f"({result['bytes_per_s'] / 1024:.0f} KiB/s)")
+
+    try:
+        client.login()
+        print(f"Exporting {len(jobs)} clip(s) with {args.workers} worker(s) ...")
+        started = time.perf_counter()
+        results = export_batch(client, jobs, workers=args.workers,
+                               on_result=report)
+        failed = sum(1 for r in results if r["error"])
+        total = sum(r["bytes"] for r in results)
+        print(f"Done. {len(results) - failed}/{len(results)} clip(s), "
+              f"{total} bytes in {time.perf_counter() - started:.1f}s")
+        return 1 if failed else 0
+    except AuthError as exc:
+        print(f"Login failed: {exc}", file=sys.stderr)
+        return 1
+    except ApiError as exc:
+        print(f"Error: {exc}", file=sys.stderr)
+        return 1
+    finally:
+        client.logout()
+
+
 if __name__ == "__main__":
     sys.exit(main())
@@ -76,6 +76,9 @@ class FakeSession:
     def get(self, url, headers=None, timeout=None, allow_redirects=None, stream=None):
         return self._record("GET", url, headers=headers)
 
+    def request(self, method, url, **kwargs):
+        return getattr(self, method.lower())(url, **kwargs)
+
     def delete(self, url, headers=None, timeout=None):
         return self._record("DELETE", url, headers=headers)
 
@@ -430,6 +433,44 @@ def test_too_many_redirects_raises_apierror():
         client.save_clip(counting_sink, "cam1", "webm", duration_ms=1000)
 
 
+def _relay_handler(node_fails=False):
+    """Relay 307s to node-7; node-7 serves the clip (or 502s when told to)."""
+    def handler(call, idx):
+        if ".relay.vmsproxy.com" in call.url and call.url.startswith(f"https://{SITE}"):
+            node = call.url.replace(f"{SITE}.relay", "node-7.relay")
+            return FakeResponse(status_code=307, headers={"Location": node})
+        if node_fails and not handler.failed:
+            handler.failed = True
+            return FakeResponse(status_code=502)
+        return FakeResponse(body=CHUNKS)
+    handler.failed = False
+    return handler
+
+
+def test_second_clip_goes_straight_to_the_cached_node():
+    client, session = cloud_client(_relay_handler())
+    client.token = "t"
+    client.save_clip(counting_sink, "cam1", "webm", duration_ms=1000)
+    client.save_clip(counting_sink, "cam2", "webm", duration_ms=1000)
+    hosts = [call.url.split("/")[2] for call in session.calls]
+    assert hosts == [f"{SITE}.relay.vmsproxy.com", "node-7.relay.vmsproxy.com",
+                     "node-7.relay.vmsproxy.com"]
+    assert "/devices/cam2/" in session.calls[2].url
+    assert session.calls[2].headers["Authorization"] == "Bearer t"
+
+
+def test_failing_cached_node_is_dropped_and_the_relay_asked_again():
+    client, session = cloud_client(_relay_handler(node_fails=True))
+    client.token = "t"
+    client.redirect_cache.remember(
+        f"https://{SITE}.relay.vmsproxy.com/x", "https://node-7.relay.vmsproxy.com/x")
+    n = client.save_clip(counting_sink, "cam1", "webm", duration_ms=1000)
+    assert n == 6
+    hosts = [call.url.split("/")[2] for call in session.calls]
+    assert hosts == ["node-7.relay.vmsproxy.com", f"{SITE}.relay.vmsproxy.com",
+                     "node-7.relay.vmsproxy.com"]
+
+
 def test_save_clip_safety_stop_aborts_endless_stream(monkeypatch):
     # The deadline is computed at t=0; the clock then jumps far past it, so the
     # first wall-clock check inside the chunk loop stops reading.
@@ -473,6 +514,282 @@ def test_file_sink_writes_exact_bytes_to_a_file(tmp_path):
     assert out.read_bytes() == b"\x01\x02\x03\x04\x05\x06"
 
 
+# ---------------------------------------------------------------------------
+# Batch export: manifest parsing + bounded concurrent downloads
+# ---------------------------------------------------------------------------
+
+def test_parse_manifest_fills_defaults_and_parses_positions():
+    jobs = sample.parse_manifest([
+        {"deviceId": "cam1", "positionMs": "2026-06-15T12:00:00Z",
+         "durationMs": 5000, "format": "mkv", "out": "a.mkv"},
+        {"device_id": "cam2"},
+    ], default_format="mp4", default_duration_ms=7000)
+    assert jobs[0]["device_id"] == "cam1"
+    assert jobs[0]["format"] == "mkv"
+    assert jobs[0]["position_ms"] == sample.parse_position_ms("2026-06-15T12:00:00Z")
+    assert jobs[0]["out"] == "a.mkv"
+    assert jobs[1]["format"] == "mp4"
+    assert jobs[1]["position_ms"] is None  # live
+    assert jobs[1]["duration_ms"] == 7000
+    assert jobs[1]["out"].startswith("clip-cam2-") and jobs[1]["out"].endswith(".mp4")
+
+
+def test_parse_manifest_rejects_bad_jobs():
+    with pytest.raises(sample.ApiError):
+        sample.parse_manifest({"deviceId": "cam1"})  # not an array
+    with pytest.raises(sample.ApiError):
+        sample.parse_manifest([{"positionMs": 1}])  # no deviceId
+    with pytest.raises(sample.ApiError):
+        sample.parse_manifest([{"deviceId": "cam1", "durationMs": 0}])
+    with pytest.raises(sample.ApiError):
+        sample.parse_manifest([{"deviceId": "cam1", "format": "avi"}])
+
+
+def test_parse_manifest_never_gives_two_jobs_one_output_file():
+    jobs = sample.parse_manifest([{"deviceId": "cam1", "positionMs": 1000},
+                                  {"deviceId": "cam1", "positionMs": 9000}])
+    assert jobs[0]["out"] != jobs[1]["out"]
+    assert jobs[1]["out"].endswith("-job2.webm")
+    with pytest.raises(sample.ApiError, match="jobs 1 and 3"):
+        sample.parse_manifest([{"deviceId": "cam1", "out": "x.mkv"},
+                               {"deviceId": "cam2", "out": "y.mkv"},
+                               {"deviceId": "cam3", "out": "./x.mkv"}])
+
+
+def test_main_refuses_single_clip_options_with_manifest(tmp_path, capsys):
+    manifest = tmp_path / "jobs.json"
+    manifest.write_text('[{"deviceId": "cam1"}]')
+    base = ["--env-file", str(tmp_path / "none.env"), "--server-host", SERVER,
+            "--user", "admin", "--password", "pw", "--manifest", str(manifest)]
+    for extra in (["--segments", "2"], ["--resume"]):
+        assert sample.main(base + extra) == 2
+        assert "not to --manifest" in capsys.readouterr().err
+
+
+def test_load_manifest_reads_json_array_and_json_lines(tmp_path):
+    array = tmp_path / "jobs.json"
+    array.write_text('[{"deviceId": "cam1"}, {"deviceId": "cam2"}]')
+    lines = tmp_path / "jobs.jsonl"
+    lines.write_text('{"deviceId": "cam1"}\n\n{"deviceId": "cam2"}\n')
+    assert sample.load_manifest(str(array)) == sample.load_manifest(str(lines))
+    bad = tmp_path / "bad.json"
+    bad.write_text("{nope")
+    with pytest.raises(sample.ApiError):
+        sample.load_manifest(str(bad))
+
+
+def test_export_batch_shares_one_token_and_reports_each_job(tmp_path):
+    def handler(call, idx):
+        if "/cam-missing/" in call.url:
+            return FakeResponse(status_code=404, text="no such device")
+        return FakeResponse(body=CHUNKS)
+
+    client, session = direct_client(handler)
+    client.token = "srv-tok"
+    jobs = sample.parse_manifest([
+        {"deviceId": "cam1", "positionMs": 1700000000000, "out": str(tmp_path / "1.webm")},
+        {"deviceId": "cam-missing", "out": str(tmp_path / "2.webm")},
+        {"deviceId": "cam3", "out": str(tmp_path / "3.webm")},
+    ])
+    seen = []
+    results = sample.export_batch(client, jobs, workers=2, on_result=seen.append)
+
+    # Results come back in manifest order, whatever order the workers finished.
+    assert [r["device_id"] for r in results] == ["cam1", "cam-missing", "cam3"]
+    assert [r["bytes"] for r in results] == [6, 0, 6]
+    assert results[1]["error"] and "404" in results[1]["error"]
+    assert results[0]["error"] is None
+    assert len(seen) == 3
+    assert (tmp_path / "3.webm").read_bytes() == b"\x01\x02\x03\x04\x05\x06"
+    # No login per job: every GET reuses the one bearer token.
+    assert all(c.method == "GET" for c in session.calls)
+    assert all(c.headers["Authorization"] == "Bearer srv-tok" for c in session.calls)
+
+
+def test_export_batch_rejects_zero_workers():
+    client, _ = direct_client(lambda call, idx: FakeResponse(body=CHUNKS))
+    with pytest.raises(sample.ApiError):
+        sample.export_batch(client, [], workers=0)
+
+
+# ---------------------------------------------------------------------------
+# Segmented archive download: split, parallel fetch, in-order stitch
+# ---------------------------------------------------------------------------
+
+def test_split_window_covers_the_window_exactly():
+    windows = sample.split_window(1000, 10, 3)
+    assert windows == [(1000, 4), (1004, 3), (1007, 3)]
+    assert sample.split_window(0, 2, 5) == [(0, 1), (1, 1)]  # never empty
+    with pytest.raises(sample.ApiError):
+        sample.split_window(0, 10, 0)
+
+
+def test_save_clip_segmented_fetches_sub_windows_and_stitches_in_order(tmp_path):
+    from urllib.parse import parse_qs, urlparse
+
+    def handler(call, idx):
+        query = parse_qs(urlparse(call.url).query)
+        start = int(query["positionMs"][0])
+        # Each sub-window answers with its own start time as the payload.
+        return FakeResponse(body=[f"[{start}]".encode()])
+
+    client, session = direct_client(handler)
+    client.token = "t"
+    out = tmp_path / "long.mpegts"
+    n = client.save_clip_segmented(sample.file_sink(str(out)), "cam1", "mpegts",
+                                   position_ms=1000, duration_ms=9000, segments=3)
+    assert out.read_bytes() == b"[1000][4000][7000]"
+    assert n == len(b"[1000][4000][7000]")
+    durations = sorted(parse_qs(urlparse(c.url).query)["durationMs"][0]
+                       for c in session.calls)
+    assert durations == ["3000", "3000", "3000"]
+
+
+def test_save_clip_segmented_rejects_non_concatenable_or_live():
+    client, _ = direct_client(lambda call, idx: FakeResponse(body=CHUNKS))
+    client.token = "t"
+    with pytest.raises(sample.ApiError):
+        client.save_clip_segmented(counting_sink, "cam1", "mp4", 1000, 9000, 3)
+    with pytest.raises(sample.ApiError):
+        client.save_clip_segmented(counting_sink, "cam1", "mpegts", None, 9000, 3)
+
+
+def test_save_clip_segmented_fails_when_any_segment_fails():
+    def handler(call, idx):
+        if "positionMs=4000" in call.url:
+            return FakeResponse(status_code=500, text="node restarted")
+        return FakeResponse(body=CHUNKS)
+
+    client, _ = direct_client(handler)
+    client.token = "t"
+    with pytest.raises(sample.ApiError):
+        client.save_clip_segmented(counting_sink, "cam1", "mpegts", 1000, 9000, 3)
+
+
+def test_save_clip_segmented_fails_when_a_segment_hits_the_deadline(monkeypatch):
+    # The first segment's deadline is set at 0; every later read is past it.
+    reads = {"n": 0}
+
+    def fake_now():
+        reads["n"] += 1
+        return 0 if reads["n"] == 1 else 10**12
+
+    monkeypatch.setattr(sample, "_now_ms", fake_now)
+    client, _ = direct_client(lambda call, idx: FakeResponse(body=CHUNKS))
+    client.token = "t"
+    stitched = []
+    with pytest.raises(sample.ApiError, match="still streaming"):
+        client.save_clip_segmented(lambda chunks: stitched.append(list(chunks)),
+                                   "cam1", "mpegts", 1000, 9000, 3, workers=1)
+    assert stitched == []                       # no file with a hole in it
+
+
+# ---------------------------------------------------------------------------
+# Resumable archive download: sidecar checkpoint + shifted positionMs
+# ---------------------------------------------------------------------------
+
+def _window_handler(fail_at=None):
+    """Answer each sub-window with its start time; 503 the one at `fail_at`."""
+    from urllib.parse import parse_qs, urlparse
+
+    def handler(call, idx):
+        start = int(parse_qs(urlparse(call.url).query)["positionMs"][0])
+        if start == fail_at:
+            return FakeResponse(status_code=503, text="node restarting")
+        return FakeResponse(body=[f"[{start}]".encode()])
+    return handler
+
+
+def test_save_clip_resumable_checkpoints_and_removes_sidecar_when_done(tmp_path):
+    out = tmp_path / "clip.mpegts"
+    client, session = direct_client(_window_handler())
+    client.token = "t"
+    seen = []
+    n = client.save_clip_resumable(str(out), "cam1", "mpegts", 1000, 3000,
+                                   segment_ms=1000, on_segment=seen.append)
+    assert out.read_bytes() == b"[1000][2000][3000]"
+    assert n == 18
+    assert [s["completedSegments"] for s in seen] == [1, 2, 3]
+    assert seen[-1]["reachedMs"] == 4000
+    assert not (tmp_path / "clip.mpegts.checkpoint.json").exists()
+    assert len(session.calls) == 3
+
+
+def test_save_clip_resumable_continues_from_last_completed_segment(tmp_path):
+    out = tmp_path / "clip.mpegts"
+    sidecar = tmp_path / "clip.mpegts.checkpoint.json"
+
+    first, _ = direct_client(_window_handler(fail_at=3000))
+    first.token = "t"
+    with pytest.raises(sample.ApiError):
+        first.save_clip_resumable(str(out), "cam1", "mpegts", 1000, 4000,
+                                  segment_ms=1000)
+    state = sample.load_checkpoint(str(sidecar))
+    assert state["completedSegments"] == 2
+    assert state["reachedMs"] == 3000
+    assert state["bytesWritten"] == 12
+
+    # Simulate a half-written segment left behind by the crash.
+    with open(out, "ab") as handle:
+        handle.write(b"[30")
+
+    second, session = direct_client(_window_handler())
+    second.token = "t"
+    second.save_clip_resumable(str(out), "cam1", "mpegts", 1000, 4000,
+                               segment_ms=1000)
+    assert out.read_bytes() == b"[1000][2000][3000][4000]"
+    # Only the two missing sub-windows were fetched, at shifted positions.
+    assert [c.url.split("positionMs=")[1].split("&")[0]
+            for c in session.calls] == ["3000", "4000"]
+    assert not sidecar.exists()
+
+
+def test_save_clip_resumable_never_checkpoints_a_window_cut_at_the_deadline(
+        tmp_path, monkeypatch):
+    out = tmp_path / "clip.mpegts"
+    calls = {"n": 0}
+
+    def fake_now():
+        # Two clock reads per window: the deadline, then the first chunk. The
+        # second window's first chunk arrives long after its deadline.
+        calls["n"] += 1
+        return 10**12 if calls["n"] == 4 else 0
+
+    monkeypatch.setattr(sample, "_now_ms", fake_now)
+    client, _ = direct_client(_window_handler())
+    client.token = "t"
+    with pytest.raises(sample.ApiError, match="still streaming"):
+        client.save_clip_resumable(str(out), "cam1", "mpegts", 1000, 3000,
+                                   segment_ms=1000)
+
+    state = sample.load_checkpoint(str(tmp_path / "clip.mpegts.checkpoint.json"))
+    assert state["completedSegments"] == 1 and state["reachedMs"] == 2000
+
+
+def test_save_clip_resumable_refuses_a_checkpoint_for_another_clip(tmp_path):
+    out = tmp_path / "clip.mpegts"
+    out.write_bytes(b"")
+    sample.save_checkpoint(str(tmp_path / "clip.mpegts.checkpoint.json"), {
+        "deviceId": "other-cam", "format": "mpegts", "positionMs": 1000,
+        "durationMs": 4000, "segments": 4, "completedSegments": 0,
+        "bytesWritten": 0, "reachedMs": 1000})
+    client, session = direct_client(_window_handler())
+    client.token = "t"
+    with pytest.raises(sample.ApiError):
+        client.save_clip_resumable(str(out), "cam1", "mpegts", 1000, 4000,
+                                   segment_ms=1000)
+    assert session.calls == []
+
+
+def test_save_clip_resumable_rejects_non_concatenable_or_live(tmp_path):
+    client, _ = direct_client(_window_handler())
+    client.token = "t"
+    with pytest.raises(sample.ApiError):
+        client.save_clip_resumable(str(tmp_path / "x.mp4"), "cam1", "mp4", 1000, 4000)
+    with pytest.raises(sample.ApiError):
+        client.save_clip_resumable(str(tmp_path / "x.ts"), "cam1", "mpegts", None, 4000)
+
+
 # ---------------------------------------------------------------------------
 # logout
 # ---------------------------------------------------------------------------
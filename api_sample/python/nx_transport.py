@@ -0,0 +1,551 @@
+#!/usr/bin/env python3
+# Copyright 2018-present Network Optix, Inc. Licensed under MPL 2.0: www.mozilla.org/MPL/2.0/
+"""
+The HTTP transport shared by the Python Nx API samples.
+
+Every sample's client plugs into this module for the parts that are the same
+everywhere, so they are written (and fixed) once:
+
+  - build_session()             A pooled, retrying requests.Session. Pass ONE
+                                to every client (session=...) when scripting
+                                many servers: keep-alive connections and TLS
+                                handshakes are then reused per host.
+  - login_local() / login_cloud()
+                                POST /rest/v4/login/sessions, or a cloud token
+                                (site-scoped with cloudSystemId, or cloud-wide).
+  - revoke_token()              Best-effort logout.
+  - send_following_redirects()  Follow the relay's 307 BY HAND, re-attaching
+                                the bearer, with a RedirectCache so later
+                                requests go straight to the serving node.
+  - check_response()            HTTP status -> AuthError / ApiError.
+  - iter_json_array()           Items of a JSON list body as its bytes arrive.
+  - crawl_sites() / write_inventory()
+                                The fleet crawl (many servers or sites, one
+                                run) and its JSON Lines / CSV inventory.
+  - AsyncClient                 The asyncio front end of every sample client
+                                (a thread-pool wrapper, not native async I/O).
+  - shared_async_executor()     The thread pool behind it.
+
+The samples import it from the folder above their own (see the sys.path line
+at the top of each sample), so each sample folder still needs only `requests`
+(with urllib3 1.26+, for Retry(allowed_methods=...)).
+"""
+
+import asyncio
+import codecs
+import concurrent.futures
+import csv
+import functools
+import itertools
+import json
+import threading
+import time
+from urllib.parse import urljoin, urlsplit, urlunsplit
+
+import requests
+from urllib3.util.retry import Retry
+
+
+CLIENT_ID = "3rdParty"
+RELAY_SUFFIX = ".relay.vmsproxy.com"
+API = "/rest/v4"
+
+# Default session (build_session): keep-alive pools for up to POOL_HOSTS hosts,
+# POOL_SIZE connections each, and retries with backoff for idempotent requests.
+POOL_HOSTS = 100
+POOL_SIZE = 10
+RETRIES = 3
+RETRY_BACKOFF_S = 0.5
+RETRY_STATUSES = (502, 503, 504)
+RETRY_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+# Most redirects followed when chasing the relay 307.
+MAX_REDIRECTS = 5
+# How long a followed relay 307 is reused before asking the relay again (s).
+REDIRECT_CACHE_TTL_S = 300
+# A cached node's answer that sends a request back through the relay: a
+# redirect, or a gateway status saying the node itself is gone. Any other
+# answer is the node's real reply and is returned as is, never replayed.
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+NODE_GONE_STATUSES = (502, 503, 504)
+# Threads shared by every AsyncClient in the process (shared_async_executor):
+# requests is blocking, so this is the most calls they have in flight at once.
+ASYNC_CONCURRENCY = 32
+# Threads used by a fleet crawl (crawl_sites) when no worker count is given.
+CRAWL_WORKERS = 8
+# Columns of the fleet inventory, in output order.
+INVENTORY_FIELDS = ["site", "id", "name", "status", "model"]
+INVENTORY_FORMATS = ["jsonl", "csv"]
+
+
+# ---------------------------------------------------------------------------
+# Errors
+# ---------------------------------------------------------------------------
+
+class AuthError(Exception):
+    """Raised when login or the bearer token is rejected."""
+
+
+class ApiError(Exception):
+    """Raised for any other unexpected API/network failure."""
+
+
+def check_response(response, what, rejected=None):
+    """Raise AuthError on 401/403 and ApiError on any other non-2xx.
+
+    `rejected` replaces the AuthError message (e.g. a hint about token scope).
+    Returns `response`, so a caller can go on to parse it.
+    """
+    if response.status_code in (401, 403):
+        raise AuthError(rejected or
+                        f"{what} unauthorized (HTTP {response.status_code}).")
+    if not response.ok:
+        raise ApiError(f"{what} failed: HTTP {response.status_code} "
+                       f"{response.text[:200]}")
+    return response
+
+
+# ---------------------------------------------------------------------------
+# Session
+# ---------------------------------------------------------------------------
+
+def build_session(pool_size=POOL_SIZE, retries=RETRIES, backoff_s=RETRY_BACKOFF_S,
+                  retry_methods=RETRY_METHODS):
+    """A requests.Session with a sized keep-alive pool and idempotent retries.
+
+    Connections are kept for up to POOL_HOSTS hosts, `pool_size` each. Size
+    it to the number of requests you keep in flight (e.g. --workers), or the
+    extra connections are opened and thrown away on every call. Connection
+    errors and 502/503/504 are retried with exponential backoff, for
+    `retry_methods` only -- a login POST is never replayed. Redirects are
+    left alone; the relay 307 is followed by hand.
+    """
+    retry = Retry(total=retries, backoff_factor=backoff_s,
+                  status_forcelist=RETRY_STATUSES, allowed_methods=retry_methods,
+                  raise_on_status=False)
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=POOL_HOSTS, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+# ---------------------------------------------------------------------------
+# Login / logout
+# ---------------------------------------------------------------------------
+
+def _post_for_token(session, url, body, timeout, key, what, rejected):
+    """POST `body` to `url` and return data[`key`]; `what` names the exchange."""
+    try:
+        response = session.post(url, json=body, timeout=timeout)
+    except requests.exceptions.RequestException as exc:
+        raise ApiError(f"Could not reach {url}: {exc}") from exc
+    if response.status_code in (401, 403):
+        raise AuthError(f"Login rejected (HTTP {response.status_code}). {rejected}")
+    check_response(response, f"{what} request")
+    try:
+        data = response.json()
+    except ValueError as exc:
+        raise ApiError(f"{what} response was not valid JSON.") from exc
+    token = data.get(key) if isinstance(data, dict) else None
+    if not token:
+        raise ApiError(f"{what} response did not contain {key!r}.")
+    return token
+
+
+def login_local(session, server_host, user, password, timeout=15,
+                rejected="Check the username/password, and that it is a LOCAL "
+                         "server account."):
+    """POST {server}/rest/v4/login/sessions -> the session's bearer token."""
+    url = f"{server_host.rstrip('/')}{API}/login/sessions"
+    body = {"username": user, "password": password, "setCookie": False}
+    return _post_for_token(session, url, body, timeout, "token", "Login", rejected)
+
+
+def login_cloud(session, cloud_host, user, password, site_id=None, mfa_code=None,
+                timeout=15,
+                rejected="Check the cloud email/password, the site id, and that "
+                         "the account has access to that site. Add --mfa-code "
+                         "for 2FA."):
+    """POST {cloud}/cdb/oauth2/token -> a cloud bearer token.
+
+    With `site_id` the token is scoped with cloudSystemId, which is what makes
+    it usable against that site (through its relay); without, it is a
+    cloud-wide token, good for account calls such as listing sites only.
+    """
+    url = f"{cloud_host.rstrip('/')}/cdb/oauth2/token"
+    body = {
+        "grant_type": "password",
+        "response_type": "token",
+        "client_id": CLIENT_ID,
+        "username": user,
+        "password": password,
+    }
+    if site_id:
+        body["scope"] = f"cloudSystemId={site_id}"
+    if mfa_code:
+        body["mfaCode"] = mfa_code
+    return _post_for_token(session, url, body, timeout, "access_token", "Token",
+                           rejected)
+
+
+def local_logout_url(server_host, token):
+    """Where a local session is deleted (DELETE revokes the token)."""
+    return f"{server_host.rstrip('/')}{API}/login/sessions/{token}"
+
+
+def cloud_logout_url(cloud_host, token):
+    """Where a cloud token is deleted (DELETE revokes it)."""
+    return f"{cloud_host.rstrip('/')}/cdb/oauth2/token/{token}"
+
+
+def revoke_token(session, url, token, timeout=15):
+    """DELETE `url` with the bearer `token`. Best-effort: never raises."""
+    try:
+        session.delete(url, headers={"Authorization": f"Bearer {token}"},
+                       timeout=timeout)
+    except requests.exceptions.RequestException:
+        pass  # logout is cleanup; never let it crash the program
+
+
+# ---------------------------------------------------------------------------
+# Relay redirects
+# ---------------------------------------------------------------------------
+
+class RedirectCache:
+    """Remembers which node the relay 307 sends each origin to, for `ttl_s`.
+
+    Every relay request is otherwise two round trips: the 307 from
+    <site>.relay.vmsproxy.com, then the real request to the serving node. Only
+    host-swapping redirects (same path) are cached, so an entry applies to
+    any URL on that origin. Callers drop an entry as soon as the cached node
+    is unreachable or gone, and fall back to asking the relay again.
+    Thread-safe, so one cache can be shared by several clients.
+    """
+
+    def __init__(self, ttl_s=REDIRECT_CACHE_TTL_S, clock=time.monotonic):
+        self.ttl_s = ttl_s
+        self._clock = clock
+        self._targets = {}  # origin -> (target origin, expiry)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _split(url):
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}".lower(), parts
+
+    def lookup(self, url):
+        """`url` re-pointed at the cached node, or None if nothing is cached."""
+        origin, parts = self._split(url)
+        with self._lock:
+            entry = self._targets.get(origin)
+            if entry and entry[1] <= self._clock():
+                del self._targets[origin]
+                entry = None
+        if not entry:
+            return None
+        target = urlsplit(entry[0])
+        return urlunsplit((target.scheme, target.netloc, parts.path,
+                           parts.query, parts.fragment))
+
+    def remember(self, url, final_url):
+        """Record that `url` ended up at `final_url` after the redirects."""
+        origin, parts = self._split(url)
+        target, final = self._split(final_url)
+        if origin == target or parts.path != final.path:
+            return  # no host hop, or the path changed: not safe to reuse
+        with self._lock:
+            self._targets[origin] = (target, self._clock() + self.ttl_s)
+
+    def invalidate(self, url):
+        """Forget the cached node for `url`'s origin."""
+        origin, _ = self._split(url)
+        with self._lock:
+            self._targets.pop(origin, None)
+
+
+def send_following_redirects(session, method, url, headers, redirect_cache=None,
+                             timeout=15, params=None, json=None, stream=False):
+    """Send a request, following redirects BY HAND; return the final response.
+
+    The Cloud relay answers with a 307 pointing at the node that serves the
+    request. requests drops the Authorization header on a cross-host
+    redirect, so allow_redirects=False is used and every hop is re-sent with
+    the same method, `headers` and `json` body (a 307 keeps both). `params`
+    go on the first hop only; the Location carries them on. Works for a
+    direct server too (it just won't redirect).
+
+    With a `redirect_cache`, a followed 307 sends later requests straight to
+    the serving node. If that node can't be reached, redirects, or is gone
+    (502/503/504), the entry is dropped and the relay is asked again --
+    though a request outside RETRY_METHODS (a POST, a PATCH) the node
+    answered is never sent twice. Any other answer, an error included, is
+    the node's own reply and is returned as is; a 5xx still drops the entry.
+    """
+    def send(target, with_params):
+        kwargs = {"headers": headers, "timeout": timeout, "allow_redirects": False}
+        if with_params and params is not None:
+            kwargs["params"] = params
+        if json is not None:
+            kwargs["json"] = json
+        if stream:
+            kwargs["stream"] = True
+        return session.request(method, target, **kwargs)
+
+    cached = redirect_cache.lookup(url) if redirect_cache else None
+    if cached:
+        try:
+            response = send(cached, True)
+        except requests.exceptions.RequestException:
+            response = None  # node unreachable: ask the relay again
+        if response is not None and (
+                response.status_code not in REDIRECT_STATUSES + NODE_GONE_STATUSES
+                or (response.status_code in NODE_GONE_STATUSES
+                    and method not in RETRY_METHODS)):
+            if response.status_code >= 500:
+                redirect_cache.invalidate(url)
+            return response
+        if response is not None:
+            response.close()
+        redirect_cache.invalidate(url)
+
+    current = url
+    for hop in range(MAX_REDIRECTS + 1):
+        try:
+            response = send(current, hop == 0)
+        except requests.exceptions.RequestException as exc:
+            raise ApiError(f"Could not reach {current}: {exc}") from exc
+        if response.status_code in REDIRECT_STATUSES:
+            location = response.headers.get("Location")
+            if not location:
+                raise ApiError(f"Redirect {response.status_code} without a "
+                               "Location header.")
+            response.close()
+            current = urljoin(current, location)
+            continue  # re-issue with the SAME method/body/headers
+        if redirect_cache and response.status_code < 400:
+            redirect_cache.remember(url, current)
+        return response
+    raise ApiError(f"Too many redirects (>{MAX_REDIRECTS}) chasing the relay.")
+
+
+# ---------------------------------------------------------------------------
+# Streaming JSON
+# ---------------------------------------------------------------------------
+
+def iter_json_array(chunks):
+    """Yield the items of a JSON array as its bytes arrive in `chunks`.
+
+    Only the current item is ever held in memory, so a huge device list or
+    event log can be processed while it is still downloading. A body that is not an
+    array -- e.g. the {"reply": [...]} envelope of some versions -- is parsed
+    whole and the list inside it yielded. Raises ValueError on bad or
+    truncated JSON.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    chunks = iter(chunks)
+    buf, pos = "", 0
+
+    def more():
+        # Drop what has been consumed and append the next chunk.
+        nonlocal buf, pos
+        chunk = next(chunks, None)
+        if chunk is None:
+            return False
+        buf, pos = buf[pos:] + utf8.decode(chunk), 0
+        return True
+
+    def skip_space():
+        # Advance to the next non-blank character; False at end of body.
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos].isspace():
+                pos += 1
+            if pos < len(buf) or not more():
+                return pos < len(buf)
+
+    if not skip_space():
+        return
+    if buf[pos] != "[":
+        while more():
+            pass
+        data = json.loads(buf[pos:])
+        if isinstance(data, dict) and isinstance(data.get("reply"), list):
+            data = data["reply"]
+        yield from data if isinstance(data, list) else []
+        return
+    pos += 1
+    while True:
+        if not skip_space():
+            raise ValueError("JSON array is truncated.")
+        if buf[pos] == "]":
+            return
+        if buf[pos] == ",":
+            pos += 1
+            continue
+        try:
+            item, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if more():
+                continue  # the item is split across chunks
+            raise
+        if end == len(buf) and more():
+            continue  # a number/literal may go on in the next chunk
+        pos = end
+        yield item
+
+
+# ---------------------------------------------------------------------------
+# Fleet crawl: many servers or sites, one run
+# ---------------------------------------------------------------------------
+
+def load_list_file(path):
+    """One entry (server URL, Site ID) per line; blank lines and # comments
+    are skipped."""
+    with open(path, "r", encoding="utf-8") as handle:
+        return [line.strip() for line in handle
+                if line.strip() and not line.lstrip().startswith("#")]
+
+
+def crawl_sites(sites, list_site, workers=CRAWL_WORKERS):
+    """Call list_site(site) for every site on `workers` threads and yield
+    {site, cameras, seconds, error} as each one finishes (completion order).
+
+    At most 2 * workers sites are in the pool at a time and every result is
+    handed on as soon as it is ready, so memory stays flat no matter how
+    many sites are crawled. A failing site is reported in its result; the
+    crawl carries on.
+    """
+    if workers < 1:
+        raise ValueError("workers must be at least 1.")
+
+    def run(site):
+        started = time.monotonic()
+        try:
+            cameras, error = list_site(site), None
+        except (AuthError, ApiError) as exc:
+            cameras, error = [], str(exc)
+        return {"site": site, "cameras": cameras,
+                "seconds": time.monotonic() - started, "error": error}
+
+    queued = iter(sites)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        running = {pool.submit(run, site)
+                   for site in itertools.islice(queued, 2 * workers)}
+        while running:
+            done, running = concurrent.futures.wait(
+                running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                for site in itertools.islice(queued, 1):
+                    running.add(pool.submit(run, site))
+                yield future.result()
+
+
+def inventory_rows(result, seen):
+    """One row per camera of a crawl result, skipping device ids in `seen`
+    (and adding the new ones). Device ids are unique within a site, so a
+    camera reported twice -- e.g. by two servers of one site -- is kept once.
+    A camera without an id can't be matched to another, so each is kept.
+    """
+    for cam in result["cameras"]:
+        device_id = str(cam.get("id") or "")
+        if device_id:
+            if device_id in seen:
+                continue
+            seen.add(device_id)
+        yield {
+            "site": result["site"],
+            "id": device_id,
+            "name": str(cam.get("name", "")),
+            "status": str(cam.get("status", "")),
+            "model": str(cam.get("model", "")),
+        }
+
+
+def write_inventory(results, out, fmt="jsonl", log=None):
+    """Write crawl results to `out` as JSON Lines or CSV, flushing each site's
+    rows as soon as that site finishes. One timing line per site goes to
+    `log`. Returns (sites, cameras written, failed sites).
+    """
+    if fmt not in INVENTORY_FORMATS:
+        raise ValueError(f"Unknown inventory format {fmt!r}.")
+    writer = csv.DictWriter(out, fieldnames=INVENTORY_FIELDS) if fmt == "csv" else None
+    if writer:
+        writer.writeheader()
+    seen = set()
+    sites = written = failed = 0
+    for result in results:
+        sites += 1
+        for row in inventory_rows(result, seen):
+            if writer:
+                writer.writerow(row)
+            else:
+                out.write(json.dumps(row) + "\n")
+            written += 1
+        out.flush()
+        if result["error"]:
+            failed += 1
+            status = f"FAILED: {result['error']}"
+        else:
+            status = f"{len(result['cameras'])} cameras"
+        if log:
+            print(f"{result['site']}: {status} in {result['seconds']:.2f}s", file=log)
+    return sites, written, failed
+
+
+# ---------------------------------------------------------------------------
+# asyncio support
+# ---------------------------------------------------------------------------
+
+_async_executor = None
+_async_executor_lock = threading.Lock()
+
+
+def shared_async_executor():
+    """The ASYNC_CONCURRENCY-thread pool every AsyncClient uses by default.
+
+    One pool for the whole process, so its limit holds across clients, samples
+    and event loops (the loop's default executor is sized by CPU count instead).
+    """
+    global _async_executor
+    with _async_executor_lock:
+        if _async_executor is None:
+            _async_executor = concurrent.futures.ThreadPoolExecutor(
+                ASYNC_CONCURRENCY, thread_name_prefix="nx-async")
+        return _async_executor
+
+
+class AsyncClient:
+    """asyncio front end of a sample's blocking client: subclasses set
+    `sync_class` and expose its methods as coroutines via _run().
+
+    This is not native async I/O. `requests` is blocking and the samples add
+    no async HTTP dependency, so every call holds an executor thread until its
+    response is in. By default that is one of the ASYNC_CONCURRENCY (32)
+    threads of shared_async_executor(), shared by every client in the
+    process: at most 32 calls are in flight at once, however many clients
+    there are, and the rest wait for a thread. For more, pass a larger
+    `executor` and a build_session(pool_size=...) to match; `limiter` (one
+    asyncio.Semaphore given to a group of clients) caps a group below it.
+    Constructor arguments other than those two go to `sync_class`.
+    """
+
+    sync_class = None
+
+    def __init__(self, *args, limiter=None, executor=None, **kwargs):
+        self.sync = self.sync_class(*args, **kwargs)
+        self.limiter = limiter
+        self.executor = executor or shared_async_executor()
+
+    @property
+    def token(self):
+        return self.sync.token
+
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        call = functools.partial(func, *args, **kwargs)
+        if self.limiter is None:
+            return await loop.run_in_executor(self.executor, call)
+        async with self.limiter:
+            return await loop.run_in_executor(self.executor, call)
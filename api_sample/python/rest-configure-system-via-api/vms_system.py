@@ -11,12 +11,20 @@ auto-discovery, camera optimization, and statistics reporting.
 import configparser
 import json
 import logging
+import os
 import requests
+import sys
 import time
 import urllib3
 from dataclasses import dataclass, asdict
 from typing import Dict, Any, List, Optional, Callable, Union
 
+# nx_transport.py, one folder up, is the HTTP layer every Python sample shares.
+# Only its pooled, retrying session is used here: this module's logins log and
+# return None instead of raising, and pass verify=False per call.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from nx_transport import build_session  # noqa: E402
+
 # Disable InsecureRequestWarning: Not recommended for production
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
@@ -50,7 +58,6 @@ CDB_OAUTH_TOKEN_PATH = "/cdb/oauth2/token"
 PARTNERS_API_V4_CLOUD_SYSTEMS_PATH = "/partners/api/v4/cloud_systems/"
 CDB_SYSTEMS_BIND_PATH = "/cdb/systems/bind"
 
-
 @dataclass
 class VmsSystemSettings:
     """Dataclass to hold VMS system settings."""
@@ -74,7 +81,7 @@ class VmsSystem:
             session: An existing requests.Session to use (e.g. a fake one in
                 tests, or one pre-configured with a custom proxy/TLS adapter).
                 Each VmsSystem still gets its own isolated session by default
-                (a new one is created per instance) -- pass one in only when
+                (a new build_session() per instance) -- pass one in only when
                 you specifically want to override that for this one system.
 
         Raises:
@@ -156,7 +163,7 @@ class VmsSystem:
                 cameraSettingsOptimization=True,
                 statisticsAllowed=True
             )
-            self.session = session or requests.Session()
+            self.session = session or build_session()
             self.http_timeout: int = 5 # Default timeout in seconds
 
         except (FileNotFoundError, configparser.Error, KeyError) as e:
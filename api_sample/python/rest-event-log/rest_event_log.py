@@ -34,20 +34,63 @@ Reference: /rest/v4/events/log in the Nx v4 REST API spec.
 """
 
 import argparse
+import array
+import collections
+import concurrent.futures
 import datetime as dt
+import hashlib
+import heapq
+import itertools
+import json
+import operator
 import os
+import queue
 import re
+import sqlite3
 import sys
+import threading
 import time
 
 import requests
 
+# nx_transport.py, one folder up, is the HTTP layer every Python sample
+# shares: pooled sessions, logins, the relay 307, the error types and the
+# streaming JSON parser.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from nx_transport import (  # noqa: E402
+    POOL_SIZE, RELAY_SUFFIX, ApiError, AsyncClient, AuthError, RedirectCache,
+    build_session, check_response, cloud_logout_url, iter_json_array,
+    login_cloud, revoke_token, send_following_redirects)
 
-CLIENT_ID = "3rdParty"
-RELAY_SUFFIX = ".relay.vmsproxy.com"
 EVENTS_PATH = "/rest/v4/events/log"
+SYSTEMS_PATH = "/cdb/systems"
 MANIFEST_PATH = "/rest/v4/events/manifest/events"
-MAX_REDIRECTS = 5
+# How long a cached event manifest (--manifest-cache) is used as is; after
+# that it is revalidated with If-None-Match (a 304 costs no body).
+MANIFEST_CACHE_TTL_S = 24 * 3600
+STREAM_CHUNK_SIZE = 64 * 1024  # Size of the reads while streaming the log.
+# Complete exports (--all) walk the window in slices of adaptive width: a
+# slice that fills a page of PAGE_LIMIT records is halved (down to
+# MIN_SLICE_MS), one that comes back less than half full is doubled.
+PAGE_LIMIT = 1000
+FIRST_SLICE_MS = 3_600_000
+MIN_SLICE_MS = 1000
+# --all splits the window into workers * PARTS_PER_WORKER parts that are
+# walked concurrently (`--workers`), and streamed out in time order.
+DEFAULT_WORKERS = 4
+PARTS_PER_WORKER = 4
+# --all-sites reads this many sites at once unless --workers is given.
+FANOUT_WORKERS = 16
+# --follow polls every FOLLOW_POLL_S, doubling the pause while the site is
+# quiet (up to FOLLOW_MAX_POLL_S). Each poll re-reads the last FOLLOW_LAG_MS
+# so events that reach the log late are still picked up (and de-duplicated).
+FOLLOW_POLL_S = 2.0
+FOLLOW_MAX_POLL_S = 60.0
+FOLLOW_LAG_MS = 30_000
+# --store never marks the last STORE_SETTLE_MS before "now" as complete:
+# late events may still land there, so the next run reads it again.
+STORE_SETTLE_MS = 60_000
+STORE_BATCH = 500  # records per insert transaction
 
 
 # ---------------------------------------------------------------------------
@@ -89,18 +132,6 @@ def resolve_config(cli_args, env_file_values):
     }
 
 
-# ---------------------------------------------------------------------------
-# Errors
-# ---------------------------------------------------------------------------
-
-class AuthError(Exception):
-    """Raised when login or the scoped token is rejected."""
-
-
-class ApiError(Exception):
-    """Raised for any other unexpected API/network failure."""
-
-
 # ---------------------------------------------------------------------------
 # Parsing helpers (pure functions = easy to test)
 # ---------------------------------------------------------------------------
@@ -187,33 +218,94 @@ def _first(d, *keys):
     return ""
 
 
+class EventRecord:
+    """One normalized event, kept small: what normalize_event() returns.
+
+    __slots__ instead of a dict per event, the raw timestampMs integer
+    instead of a formatted string, and interned type / resource strings (a
+    log repeats the same few thousand values), so a large export costs a
+    fraction of the memory. The readable time is formatted only when
+    asked for. Reads like the dict it replaces: ev["time"],
+    ev.get("event_type"), as_dict().
+    """
+
+    __slots__ = ("timestamp_ms", "event_type", "action_type", "resource")
+    KEYS = ("time", "event_type", "resource", "action_type")
+
+    def __init__(self, timestamp_ms, event_type="", action_type="", resource=""):
+        self.timestamp_ms = timestamp_ms
+        self.event_type = _intern(event_type)
+        self.action_type = _intern(action_type)
+        self.resource = _intern(resource)
+
+    @property
+    def time(self):
+        """The event time as a readable UTC string (formatted on demand)."""
+        return _ms_to_iso(self.timestamp_ms)
+
+    def __getitem__(self, key):
+        if key not in self.KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        return self[key] if key in self.KEYS else default
+
+    def as_dict(self):
+        return {key: self[key] for key in self.KEYS}
+
+    def __eq__(self, other):
+        if not isinstance(other, EventRecord):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name)
+                   for name in self.__slots__)
+
+    def __repr__(self):
+        return f"EventRecord({self.timestamp_ms!r}, {self.event_type!r}, " \
+               f"{self.action_type!r}, {self.resource!r})"
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
 def normalize_event(record):
-    """Flatten one v4 event-log record into a simple dict for display.
+    """Flatten one v4 event-log record into an EventRecord for display.
 
     A record is { timestampMs, eventData{}, actionData{}, ruleId, flags }.
     eventData / actionData are maps keyed by manifest field names, so we look
     up the common keys defensively.
     """
+    event_type, action_type, resource = _event_fields(record)
+    return EventRecord(record.get("timestampMs"), event_type, action_type,
+                       resource)
+
+
+def _event_fields(record):
+    """(event type, action type, resource) of a raw record."""
     event_data = record.get("eventData", {}) if isinstance(record, dict) else {}
     action_data = record.get("actionData", {}) if isinstance(record, dict) else {}
-    return {
-        "time": _ms_to_iso(record.get("timestampMs")),
-        "event_type": _first(event_data, "eventType", "type"),
-        "resource": _first(event_data, "caption", "resourceName",
-                           "eventResourceId", "source"),
-        "action_type": _first(action_data, "actionType", "type"),
-    }
+    return (_first(event_data, "eventType", "type"),
+            _first(action_data, "actionType", "type"),
+            _first(event_data, "caption", "resourceName", "eventResourceId",
+                   "source"))
+
 
+def format_events_table(events, manifest=None):
+    """Build a plain-text table of normalized events.
 
-def format_events_table(events):
-    """Build a plain-text table of normalized events."""
+    With a `manifest` ({id: displayName}, see parse_event_manifest) event
+    types are shown by display name; unknown ids are shown as is.
+    """
     if not events:
         return "No events in this time range."
+    manifest = manifest or {}
     rows = [("TIME (UTC)", "EVENT", "ACTION", "RESOURCE")]
     for ev in events:
+        event_type = str(ev.get("event_type", ""))
         rows.append((
             str(ev.get("time", "")),
-            str(ev.get("event_type", "")),
+            manifest.get(event_type) or event_type,
             str(ev.get("action_type", "")),
             str(ev.get("resource", "")),
         ))
@@ -224,6 +316,12 @@ def format_events_table(events):
     )
 
 
+def format_event_line(event):
+    """One normalized event as a single line, for --follow."""
+    return "  ".join(str(event.get(key, "")) for key in
+                     ("time", "event_type", "action_type", "resource"))
+
+
 def parse_event_manifest(data):
     """Flatten the v4 event-type manifest into an {id: displayName} dict.
 
@@ -275,6 +373,224 @@ def build_event_params(start_ms, duration_ms, event_type=None, action_type=None,
     return params
 
 
+# ---------------------------------------------------------------------------
+# Complete exports: adaptive time slices
+# ---------------------------------------------------------------------------
+# One request returns at most `limit` records, so a busy window is silently
+# cut short. walk_event_window() reads it all: it asks for one slice of the
+# window at a time, halves the slice when a page comes back full and
+# doubles it when a page is sparse. A full page is not wasted either -- its
+# records are kept up to the last timestamp it reached, and the next slice
+# starts there (a timestamp cursor). Slices share their edges, so records
+# on an edge are de-duplicated by event_key().
+
+def event_key(record):
+    """Identity of a record: (timestampMs, ruleId, hash of eventData)."""
+    event_data = json.dumps(record.get("eventData"), sort_keys=True,
+                            separators=(",", ":"), default=str)
+    digest = hashlib.sha1(event_data.encode("utf-8")).hexdigest()[:16]
+    return (_timestamp(record), record.get("ruleId") or "", digest)
+
+
+def _timestamp(record):
+    try:
+        return int(record.get("timestampMs") or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def walk_event_window(fetch_page, start_ms, duration_ms, order="asc",
+                      page_limit=PAGE_LIMIT, slice_ms=FIRST_SLICE_MS,
+                      min_slice_ms=MIN_SLICE_MS):
+    """Yield every record in the window start_ms + duration_ms, in `order`.
+
+    `fetch_page(start_ms, duration_ms, limit)` returns the records of one
+    slice, sorted in `order`; limit 0 means "no limit" (the v4 contract).
+    Memory is one page plus the keys of the records on the current edge.
+    If a full page is all one millisecond, that millisecond is re-read with
+    limit 0 so nothing is lost. `page_limit` must be at least 1.
+    """
+    if page_limit < 1:
+        raise ValueError("page_limit must be at least 1.")
+    descending = order == "desc"
+    lo, hi = start_ms, start_ms + duration_ms
+    width = max(min_slice_ms, slice_ms)
+    edge = {}  # key -> timestamp of yielded records a later slice may repeat
+
+    while lo < hi:
+        width = min(width, hi - lo)
+        page_start = hi - width if descending else lo
+        page = fetch_page(page_start, width, page_limit)
+        times = [_timestamp(record) for record in page]
+        cut = None  # records at/after the cut come again in the next slice
+        if len(page) < page_limit:
+            if descending:
+                hi = page_start
+            else:
+                lo = page_start + width
+            if len(page) < page_limit // 2:
+                width *= 2
+        elif min(times) == max(times):
+            # The whole page is one millisecond: read it without a limit.
+            reached = times[0]
+            page = fetch_page(reached, 1, 0)
+            if descending:
+                hi = reached
+            else:
+                lo = reached + 1
+            width = max(min_slice_ms, width // 2)
+        else:
+            # Keep what is complete; the next slice resumes at the cut.
+            if descending:
+                cut = min(times)
+                hi = cut + 1
+            else:
+                cut = max(times)
+                lo = cut
+            width = max(min_slice_ms, width // 2)
+
+        for record in page:
+            ts = _timestamp(record)
+            key = event_key(record)
+            if key in edge or (cut is not None
+                               and (ts <= cut if descending else ts >= cut)):
+                continue
+            edge[key] = ts
+            yield record
+        edge = {key: ts for key, ts in edge.items() if lo <= ts <= hi}
+
+
+def split_window(start_ms, duration_ms, parts, min_part_ms=MIN_SLICE_MS):
+    """Cut a window into up to `parts` adjacent (start_ms, duration_ms) parts."""
+    parts = max(1, min(parts, duration_ms // max(1, min_part_ms)))
+    bounds = [start_ms + duration_ms * i // parts for i in range(parts + 1)]
+    return [(lo, hi - lo) for lo, hi in zip(bounds, bounds[1:])]
+
+
+def walk_event_window_parallel(fetch_page, start_ms, duration_ms, order="asc",
+                               page_limit=PAGE_LIMIT, workers=DEFAULT_WORKERS):
+    """walk_event_window() over independent parts of the window, in parallel.
+
+    The window is split into workers * PARTS_PER_WORKER parts, each walked
+    on its own thread (`fetch_page` must be thread-safe). Records are
+    yielded part by part, oldest part first (newest first for
+    order="desc"), so the output is in the same order as a single walk. At
+    most `workers` parts are read at once, and each streams through a queue
+    of at most `page_limit` records: a part that runs ahead of the one being
+    yielded waits once its queue is full. Memory is therefore about
+    2 * workers pages, however long the window. A record on the edge
+    between two parts belongs to the later part only. Closing the generator
+    early cancels the parts not started and stops the others at their next
+    record (a request in flight is finished first).
+    """
+    if page_limit < 1:
+        raise ValueError("page_limit must be at least 1.")
+    parts = split_window(start_ms, duration_ms, workers * PARTS_PER_WORKER)
+    last_end = start_ms + duration_ms
+    stop = threading.Event()
+    done = object()  # end-of-part marker
+
+    def put(out, item):
+        # Block while the part's queue is full, but give up once closed.
+        while not stop.is_set():
+            try:
+                out.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def read_part(part, out):
+        part_start, part_duration = part
+        end = part_start + part_duration
+        try:
+            for record in walk_event_window(fetch_page, part_start, part_duration,
+                                            order, page_limit):
+                if ((end == last_end or _timestamp(record) < end)
+                        and not put(out, record)):
+                    return
+        finally:
+            put(out, done)  # an error is raised by future.result()
+
+    if order == "desc":
+        parts.reverse()
+    pending = iter(parts)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        ahead = collections.deque()
+
+        def start(part):
+            out = queue.Queue(maxsize=page_limit)
+            ahead.append((pool.submit(read_part, part, out), out))
+
+        for part in itertools.islice(pending, workers):
+            start(part)
+        try:
+            while ahead:
+                future, out = ahead[0]
+                for record in iter(out.get, done):
+                    yield record
+                future.result()
+                ahead.popleft()
+                for part in itertools.islice(pending, 1):
+                    start(part)
+        finally:
+            stop.set()
+            for future, _ in ahead:
+                future.cancel()
+
+
+# ---------------------------------------------------------------------------
+# Event manifest cache (--manifest-cache)
+# ---------------------------------------------------------------------------
+
+class ManifestCache:
+    """Per-site event manifests ({id: displayName}) kept in one JSON file.
+
+    An entry younger than `ttl_s` is used without asking the site. An older
+    one is revalidated: the site is asked with If-None-Match: <its ETag>
+    and a 304 keeps the entry for another `ttl_s`. The file is rewritten
+    atomically (temp file + rename) on every change.
+    """
+
+    def __init__(self, path, ttl_s=MANIFEST_CACHE_TTL_S, clock=time.time):
+        self.path = path
+        self.ttl_s = ttl_s
+        self._clock = clock
+        self._sites = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as handle:
+                    data = json.load(handle)
+            except (OSError, ValueError):
+                data = None  # unreadable: start over, it's only a cache
+            if isinstance(data, dict):
+                self._sites = data
+
+    def get(self, site_id):
+        """The entry {manifest, etag, fetchedAt} for a site, or None."""
+        entry = self._sites.get(site_id)
+        return entry if isinstance(entry, dict) and "manifest" in entry else None
+
+    def is_fresh(self, entry):
+        return self._clock() - entry.get("fetchedAt", 0) < self.ttl_s
+
+    def put(self, site_id, manifest, etag=None):
+        self._sites[site_id] = {"manifest": manifest, "etag": etag,
+                                "fetchedAt": self._clock()}
+        self._save()
+
+    def touch(self, site_id):
+        """The site said 304 Not Modified: keep the entry for another TTL."""
+        self._sites[site_id]["fetchedAt"] = self._clock()
+        self._save()
+
+    def _save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as handle:
+            json.dump(self._sites, handle, separators=(",", ":"))
+        os.replace(tmp_path, self.path)
+
+
 # ---------------------------------------------------------------------------
 # Client
 # ---------------------------------------------------------------------------
@@ -283,12 +599,13 @@ class NxCloudEventLogClient:
     """Gets a site-scoped cloud token, then reads the event log via the relay."""
 
     def __init__(self, cloud_host, site_id, verify_tls=True,
-                 session=None, timeout=15):
+                 session=None, timeout=15, redirect_cache=None):
         self.cloud_host = (cloud_host or "").rstrip("/")
         self.site_id = site_id
         self.timeout = timeout
-        self.session = session or requests.Session()
+        self.session = session or build_session()
         self.session.verify = verify_tls
+        self.redirect_cache = redirect_cache or RedirectCache()
         self.token = None
         self.last_raw = None
 
@@ -298,103 +615,130 @@ class NxCloudEventLogClient:
 
     def login(self, user, password, mfa_code=None):
         """Get a token from the cloud SCOPED to this site."""
-        url = f"{self.cloud_host}/cdb/oauth2/token"
-        body = {
-            "grant_type": "password",
-            "response_type": "token",
-            "client_id": CLIENT_ID,
-            "username": user,
-            "password": password,
-            "scope": f"cloudSystemId={self.site_id}",
-        }
-        if mfa_code:
-            body["mfaCode"] = mfa_code
-        try:
-            response = self.session.post(url, json=body, timeout=self.timeout)
-        except requests.exceptions.RequestException as exc:
-            raise ApiError(f"Could not reach {url}: {exc}") from exc
-        if response.status_code in (401, 403):
-            raise AuthError(
-                f"Login rejected (HTTP {response.status_code}). Check credentials, "
-                "the site id, and access; add --mfa-code for a 2FA account.")
-        if not response.ok:
-            raise ApiError(f"Token request failed: HTTP {response.status_code} "
-                           f"{response.text[:200]}")
-        try:
-            self.token = response.json().get("access_token")
-        except ValueError as exc:
-            raise ApiError("Token response was not valid JSON.") from exc
-        if not self.token:
-            raise ApiError("Token response did not contain an access_token.")
+        self.token = login_cloud(
+            self.session, self.cloud_host, user, password, site_id=self.site_id,
+            mfa_code=mfa_code, timeout=self.timeout,
+            rejected="Check credentials, the site id, and access; add "
+                     "--mfa-code for a 2FA account.")
         return self.token
 
     def use_token(self, token):
         """Use a scoped bearer token obtained elsewhere."""
         self.token = token
 
+    def logout(self):
+        """Delete the scoped token on the cloud. Best-effort cleanup."""
+        if not self.token:
+            return
+        revoke_token(self.session, cloud_logout_url(self.cloud_host, self.token),
+                     self.token, timeout=self.timeout)
+        self.token = None
+
     def _auth_header(self):
         if not self.token:
             raise ApiError("No token. Call login() or use_token() first.")
         return {"Authorization": f"Bearer {self.token}"}
 
-    def _get_following_redirects(self, url, params):
-        """GET that follows 307 redirects MANUALLY, re-attaching the bearer.
+    def _get_following_redirects(self, url, params, stream=False, headers=None):
+        """GET that follows the relay 307 BY HAND, re-attaching the bearer.
 
-        The relay replies 307 pointing at the serving node. requests would strip
-        the Authorization header across hosts, so we resend it ourselves. Params
-        only need to go on the first request; the redirect Location carries them.
+        Params go on the first request only; the redirect Location carries
+        them. self.redirect_cache sends later requests straight to the
+        serving node (see nx_transport.send_following_redirects).
+        """
+        return send_following_redirects(
+            self.session, "GET", url, dict(headers or {}, **self._auth_header()),
+            redirect_cache=self.redirect_cache, timeout=self.timeout,
+            params=params, stream=stream)
+
+    def iter_event_records(self, start_ms, duration_ms, event_type=None,
+                           action_type=None, order="desc", limit=50):
+        """Yield raw v4 event-log records as the response streams in.
+
+        The records array is parsed one record at a time, so memory stays
+        flat however large `limit` is. The request is sent on the first
+        next(); close the generator to abandon the rest of the body.
         """
-        headers = self._auth_header()
-        for hop in range(MAX_REDIRECTS + 1):
-            try:
-                response = self.session.get(
-                    url, headers=headers, params=params if hop == 0 else None,
-                    timeout=self.timeout, allow_redirects=False)
-            except requests.exceptions.RequestException as exc:
-                raise ApiError(f"Could not reach {url}: {exc}") from exc
-            # 301/302/303/307/308 -> follow with the bearer header preserved.
-            if response.status_code in (301, 302, 303, 307, 308):
-                location = response.headers.get("Location")
-                if not location:
-                    raise ApiError(f"Redirect {response.status_code} without a "
-                                   "Location header.")
-                url = location
-                continue
-            return response
-        raise ApiError("Too many redirects from the relay.")
-
-    def get_event_log(self, start_ms, duration_ms, event_type=None,
-                      action_type=None, order="desc", limit=50):
-        """Read the event log through the relay; returns normalized events."""
         url = f"{self.relay_url}{EVENTS_PATH}"
         params = build_event_params(start_ms, duration_ms, event_type,
                                     action_type, order, limit)
-        response = self._get_following_redirects(url, params)
-
-        if response.status_code in (401, 403):
-            raise AuthError(
-                "The site rejected the token. Make sure it was scoped with "
-                "cloudSystemId for THIS site.")
-        if not response.ok:
-            raise ApiError(f"Reading events failed: HTTP {response.status_code} "
-                           f"{response.text[:200]}")
+        response = self._get_following_redirects(url, params, stream=True)
         try:
-            data = response.json()
+            if response.status_code in (401, 403):
+                raise AuthError(
+                    "The site rejected the token. Make sure it was scoped with "
+                    "cloudSystemId for THIS site.")
+            if not response.ok:
+                raise ApiError(f"Reading events failed: HTTP {response.status_code} "
+                               f"{response.text[:200]}")
+            yield from iter_json_array(response.iter_content(STREAM_CHUNK_SIZE))
+        except requests.exceptions.RequestException as exc:
+            # The body streams after the request returned: a reset mid-body
+            # surfaces here, and callers handle ApiError, not requests errors.
+            raise ApiError(f"Reading events failed mid-response: {exc}") from exc
         except ValueError as exc:
             raise ApiError("Events response was not valid JSON.") from exc
+        finally:
+            response.close()
 
-        self.last_raw = data
-        records = data if isinstance(data, list) else []
-        return [normalize_event(r) for r in records]
+    def iter_event_log(self, *args, **kwargs):
+        """Like iter_event_records(), but yields normalized events."""
+        for record in self.iter_event_records(*args, **kwargs):
+            yield normalize_event(record)
 
-    def get_event_manifest(self):
+    def get_event_log(self, start_ms, duration_ms, event_type=None,
+                      action_type=None, order="desc", limit=50, keep_raw=False):
+        """Read the event log through the relay; returns normalized events.
+
+        With keep_raw=True the raw records are also kept on self.last_raw
+        (for --debug); otherwise only the normalized list is built.
+        """
+        records = self.iter_event_records(start_ms, duration_ms, event_type,
+                                          action_type, order, limit)
+        if not keep_raw:
+            return [normalize_event(r) for r in records]
+        self.last_raw = list(records)
+        return [normalize_event(r) for r in self.last_raw]
+
+    def export_event_log(self, start_ms, duration_ms, event_type=None,
+                         action_type=None, order="asc", page_limit=PAGE_LIMIT,
+                         workers=1):
+        """Yield EVERY raw record in the window, however many there are.
+
+        Walks the window in adaptive slices (see walk_event_window), one
+        request of at most `page_limit` records each, so nothing is cut off
+        at a fixed limit and memory stays at one page. With workers > 1,
+        parts of the window are walked concurrently over this client's
+        session (see walk_event_window_parallel); size its pool to match.
+        """
+        def fetch_page(slice_start_ms, slice_duration_ms, limit):
+            return list(self.iter_event_records(
+                slice_start_ms, slice_duration_ms, event_type, action_type,
+                order, limit))
+
+        if workers > 1:
+            return walk_event_window_parallel(fetch_page, start_ms, duration_ms,
+                                              order, page_limit, workers)
+        return walk_event_window(fetch_page, start_ms, duration_ms, order,
+                                 page_limit)
+
+    def get_event_manifest(self, cache=None):
         """Read the site's event-type manifest; returns {id: displayName}.
 
         Uses the same relay / 307 / scoped-token plumbing as the event log.
+        With a ManifestCache, a fresh entry is returned without a request
+        and a stale one is revalidated with its ETag (304 = still valid).
         """
+        entry = cache.get(self.site_id) if cache else None
+        if entry and cache.is_fresh(entry):
+            return entry["manifest"]
+        headers = {"If-None-Match": entry["etag"]} if entry and entry.get("etag") else None
         url = f"{self.relay_url}{MANIFEST_PATH}"
-        response = self._get_following_redirects(url, None)
+        response = self._get_following_redirects(url, None, headers=headers)
 
+        if response.status_code == 304 and entry:
+            cache.touch(self.site_id)
+            return entry["manifest"]
         if response.status_code in (401, 403):
             raise AuthError(
                 "The site rejected the token. Make sure it was scoped with "
@@ -408,7 +752,602 @@ class NxCloudEventLogClient:
             raise ApiError("Manifest response was not valid JSON.") from exc
 
         self.last_raw = data
-        return parse_event_manifest(data)
+        manifest = parse_event_manifest(data)
+        if cache:
+            cache.put(self.site_id, manifest, response.headers.get("ETag"))
+        return manifest
+
+
+# ---------------------------------------------------------------------------
+# Local event store (--store)
+# ---------------------------------------------------------------------------
+
+def merge_ranges(ranges):
+    """Merge overlapping or touching (start, end) ranges; returns a sorted list."""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def missing_ranges(covered, start, end):
+    """The parts of [start, end) that the sorted, merged `covered` lacks."""
+    gaps, cursor = [], start
+    for lo, hi in covered:
+        if hi <= cursor:
+            continue
+        if lo >= end:
+            break
+        if lo > cursor:
+            gaps.append((cursor, lo))
+        cursor = max(cursor, hi)
+    if cursor < end:
+        gaps.append((cursor, end))
+    return gaps
+
+
+def filter_signature(event_type=None, action_type=None):
+    """A stable name for a filter combination; "" = no filter."""
+    parts = []
+    if event_type:
+        parts.append("eventType=" + ",".join(sorted(event_type)))
+    if action_type:
+        parts.append("actionType=" + ",".join(sorted(action_type)))
+    return "&".join(parts)
+
+
+class EventStore:
+    """Append-only SQLite copy of event logs, indexed for offline queries.
+
+    Records are kept whole (as JSON) next to indexed columns: timestampMs,
+    event type, action type and resource, per site. A second table records
+    which time ranges were read COMPLETELY, per site and filter, so a
+    later run fetches only the gaps (missing()) and answers the rest from
+    disk (query()). A range read unfiltered covers every filter.
+    """
+
+    def __init__(self, path):
+        self.db = sqlite3.connect(path)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS events (
+                site_id TEXT NOT NULL, timestamp_ms INTEGER NOT NULL,
+                rule_id TEXT NOT NULL, data_hash TEXT NOT NULL,
+                event_type TEXT, action_type TEXT, resource TEXT,
+                record TEXT NOT NULL,
+                PRIMARY KEY (site_id, timestamp_ms, rule_id, data_hash));
+            CREATE INDEX IF NOT EXISTS events_by_type
+                ON events (site_id, event_type, timestamp_ms);
+            CREATE INDEX IF NOT EXISTS events_by_resource
+                ON events (site_id, resource, timestamp_ms);
+            CREATE TABLE IF NOT EXISTS coverage (
+                site_id TEXT NOT NULL, filter TEXT NOT NULL,
+                start_ms INTEGER NOT NULL, end_ms INTEGER NOT NULL);
+        """)
+
+    def close(self):
+        self.db.close()
+
+    def add(self, site_id, records):
+        """Store records (duplicates are ignored); returns how many were new."""
+        records = iter(records)
+        added = 0
+        for batch in iter(lambda: list(itertools.islice(records, STORE_BATCH)), []):
+            rows = []
+            for record in batch:
+                timestamp_ms, rule_id, data_hash = event_key(record)
+                event_type, action_type, resource = _event_fields(record)
+                rows.append((site_id, timestamp_ms, rule_id, data_hash,
+                             event_type, action_type, resource,
+                             json.dumps(record)))
+            with self.db:
+                before = self.db.total_changes
+                self.db.executemany(
+                    "INSERT OR IGNORE INTO events VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows)
+                added += self.db.total_changes - before
+        return added
+
+    def _covered(self, site_id, signature):
+        rows = self.db.execute(
+            "SELECT start_ms, end_ms FROM coverage "
+            "WHERE site_id = ? AND filter IN ('', ?)", (site_id, signature))
+        return merge_ranges(rows.fetchall())
+
+    def missing(self, site_id, start_ms, end_ms, event_type=None, action_type=None):
+        """The (start, end) ranges of [start_ms, end_ms) not yet read in full."""
+        signature = filter_signature(event_type, action_type)
+        return missing_ranges(self._covered(site_id, signature), start_ms, end_ms)
+
+    def mark_covered(self, site_id, start_ms, end_ms, event_type=None,
+                     action_type=None):
+        """Record that [start_ms, end_ms) has been read in full."""
+        signature = filter_signature(event_type, action_type)
+        with self.db:
+            rows = self.db.execute(
+                "SELECT start_ms, end_ms FROM coverage "
+                "WHERE site_id = ? AND filter = ?", (site_id, signature)).fetchall()
+            self.db.execute("DELETE FROM coverage WHERE site_id = ? AND filter = ?",
+                            (site_id, signature))
+            self.db.executemany(
+                "INSERT INTO coverage VALUES (?, ?, ?, ?)",
+                [(site_id, signature, lo, hi)
+                 for lo, hi in merge_ranges(rows + [(start_ms, end_ms)])])
+
+    def query(self, site_id, start_ms, end_ms, event_type=None, action_type=None,
+              order="desc", limit=None):
+        """Yield stored raw records in [start_ms, end_ms), in `order`."""
+        sql = ["SELECT record FROM events WHERE site_id = ?",
+               "AND timestamp_ms >= ? AND timestamp_ms < ?"]
+        args = [site_id, start_ms, end_ms]
+        for column, values in (("event_type", event_type),
+                               ("action_type", action_type)):
+            if values:
+                sql.append(f"AND {column} IN ({', '.join('?' * len(values))})")
+                args.extend(values)
+        sql.append("ORDER BY timestamp_ms " + ("DESC" if order == "desc" else "ASC"))
+        if limit:
+            sql.append("LIMIT ?")
+            args.append(limit)
+        for (record,) in self.db.execute(" ".join(sql), args):
+            yield json.loads(record)
+
+
+def fill_event_store(store, client, start_ms, end_ms, event_type=None,
+                     action_type=None, workers=1, now_ms=None):
+    """Read only the missing ranges of [start_ms, end_ms) into `store`.
+
+    Returns (ranges fetched, records added). Nothing is fetched -- not even
+    a login is needed -- if the store already covers the window. The last
+    STORE_SETTLE_MS before `now_ms` is stored but not marked complete.
+    """
+    now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+    gaps = store.missing(client.site_id, start_ms, end_ms, event_type, action_type)
+    added = 0
+    for lo, hi in gaps:
+        records = client.export_event_log(lo, hi - lo, event_type, action_type,
+                                          "asc", workers=workers)
+        added += store.add(client.site_id, records)
+        settled = min(hi, now_ms - STORE_SETTLE_MS)
+        if settled > lo:
+            store.mark_covered(client.site_id, lo, settled, event_type, action_type)
+    return len(gaps), added
+
+
+# ---------------------------------------------------------------------------
+# Aggregations (--aggregate)
+# ---------------------------------------------------------------------------
+# A month of events is easily a million records; a dict per record (or even
+# a normalized row) is far too much to keep. EventColumns keeps one
+# integer per record and column instead -- timestamps in an array('q'),
+# strings as codes into a per-column table. Filling the columns is still a
+# Python loop per record (EventColumns.add), but the reports are counted
+# with map()/zip()/Counter over whole columns, which run in C.
+
+AGGREGATE_DIMENSIONS = ("event_type", "action_type", "resource", "rule")
+
+
+class EventColumns:
+    """Event-log records as parallel arrays, for counting."""
+
+    def __init__(self):
+        self.timestamps = array.array("q")
+        self.codes = {dim: array.array("l") for dim in AGGREGATE_DIMENSIONS}
+        self.names = {dim: [] for dim in AGGREGATE_DIMENSIONS}
+        self._index = {dim: {} for dim in AGGREGATE_DIMENSIONS}
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def _code(self, dim, value):
+        code = self._index[dim].get(value)
+        if code is None:
+            code = self._index[dim][value] = len(self.names[dim])
+            self.names[dim].append(value)
+        return code
+
+    def add(self, record):
+        event_type, action_type, resource = _event_fields(record)
+        self.timestamps.append(_timestamp(record))
+        for dim, value in (("event_type", event_type),
+                           ("action_type", action_type),
+                           ("resource", resource),
+                           ("rule", record.get("ruleId") or "")):
+            self.codes[dim].append(self._code(dim, value))
+
+    def extend(self, records):
+        for record in records:
+            self.add(record)
+        return self
+
+    def counts(self, dim):
+        """Counter {value: events} over one column."""
+        names = self.names[dim]
+        return collections.Counter(
+            {names[code]: n for code, n in collections.Counter(self.codes[dim]).items()})
+
+    def bucket_counts(self, dim, bucket_ms):
+        """{bucket start ms: Counter {value: events}}, buckets in time order."""
+        buckets = map(operator.floordiv, self.timestamps,
+                      itertools.repeat(bucket_ms))
+        pairs = collections.Counter(zip(buckets, self.codes[dim]))
+        names = self.names[dim]
+        out = {}
+        for (bucket, code), n in sorted(pairs.items()):
+            out.setdefault(bucket * bucket_ms, collections.Counter())[names[code]] = n
+        return out
+
+    def inter_arrival(self):
+        """Histogram of the gaps between consecutive events, in power-of-two bins.
+
+        Returns [(upper bound ms, count)]: a gap g falls in the bin whose
+        bound is the smallest power of two above it (0 ms gaps: bound 0).
+        """
+        times = sorted(self.timestamps)
+        gaps = map(operator.sub, itertools.islice(times, 1, None), times)
+        bins = collections.Counter(map(int.bit_length, gaps))
+        return [((1 << bits) if bits else 0, bins[bits]) for bits in sorted(bins)]
+
+
+def aggregate_report(columns, bucket_ms, top=10, group_by="event_type"):
+    """The --aggregate report as plain data (what --output jsonl prints)."""
+    return {
+        "events": len(columns),
+        "bucketMs": bucket_ms,
+        "groupBy": group_by,
+        "top": {dim: columns.counts(dim).most_common(top)
+                for dim in AGGREGATE_DIMENSIONS},
+        "buckets": [{"startMs": start, "counts": dict(counts.most_common())}
+                    for start, counts in columns.bucket_counts(group_by,
+                                                               bucket_ms).items()],
+        "interArrivalMs": columns.inter_arrival(),
+    }
+
+
+def _plain_table(rows):
+    widths = [max(len(row[col]) for row in rows) for col in range(len(rows[0]))]
+    return "\n".join(
+        "  ".join(cell.ljust(widths[col]) for col, cell in enumerate(row)).rstrip()
+        for row in rows
+    )
+
+
+def format_aggregate_report(report, manifest=None):
+    """Render aggregate_report() as plain-text tables."""
+    if not report["events"]:
+        return "No events in this time range."
+    manifest = manifest or {}
+
+    def label(dim, value):
+        if dim == "event_type":
+            value = manifest.get(value) or value
+        return str(value) or "(none)"
+
+    sections = []
+    for dim in AGGREGATE_DIMENSIONS:
+        rows = [(f"TOP {dim.replace('_', ' ').upper()}", "EVENTS")]
+        rows += [(label(dim, value), str(n)) for value, n in report["top"][dim]]
+        sections.append(_plain_table(rows))
+    rows = [("BUCKET (UTC)", report["groupBy"].replace("_", " ").upper(), "EVENTS")]
+    for bucket in report["buckets"]:
+        for value, n in bucket["counts"].items():
+            rows.append((_ms_to_iso(bucket["startMs"]),
+                         label(report["groupBy"], value), str(n)))
+    sections.append(_plain_table(rows))
+    rows = [("GAP UP TO", "EVENTS", "")]
+    peak = max(n for _, n in report["interArrivalMs"]) if report["interArrivalMs"] else 1
+    for bound, n in report["interArrivalMs"]:
+        rows.append((f"{bound} ms", str(n), "#" * max(1, 40 * n // peak)))
+    sections.append(_plain_table(rows))
+    return "\n\n".join(sections)
+
+
+# ---------------------------------------------------------------------------
+# Live tail (--follow)
+# ---------------------------------------------------------------------------
+
+def follow_event_log(client, start_ms, event_type=None, action_type=None,
+                     poll_s=FOLLOW_POLL_S, max_poll_s=FOLLOW_MAX_POLL_S,
+                     lag_ms=FOLLOW_LAG_MS, relogin=None, log=None,
+                     clock=time.time, sleep=time.sleep):
+    """Yield raw records from start_ms on, as they appear; never returns.
+
+    Each poll reads [mark, now] oldest first with export_event_log(), so a
+    burst is never cut at a page limit. The mark then moves up to
+    now - lag_ms: only the last few seconds are read twice, and records
+    seen before are dropped by event_key(). The pause between polls starts
+    at poll_s and doubles after every poll with nothing new, up to
+    max_poll_s. The same client -- token, session, relay node -- is used
+    throughout. If the token is rejected, `relogin()` (when given) gets a
+    new one, once per rejection; other API errors are reported to `log`
+    and retried after the next pause.
+    """
+    mark = start_ms
+    seen = {}  # key -> timestamp of records at or after the mark
+    pause = poll_s
+    relogged = False
+    while True:
+        now_ms = int(clock() * 1000)
+        fresh = 0
+        try:
+            for record in client.export_event_log(
+                    mark, max(0, now_ms - mark), event_type, action_type, "asc"):
+                key = event_key(record)
+                if key not in seen:
+                    seen[key] = _timestamp(record)
+                    fresh += 1
+                    yield record
+        except AuthError:
+            if relogin is None or relogged:
+                raise
+            relogin()
+            relogged = True
+            continue
+        except ApiError as exc:
+            if log:
+                log(f"Poll failed, retrying in {pause:g}s: {exc}")
+        else:
+            relogged = False
+            mark = max(mark, now_ms - lag_ms)
+            seen = {key: ts for key, ts in seen.items() if ts >= mark}
+        pause = poll_s if fresh else min(pause * 2, max_poll_s)
+        sleep(pause)
+
+
+# ---------------------------------------------------------------------------
+# Multi-site fan-out (--all-sites)
+# ---------------------------------------------------------------------------
+
+# The CDB may wrap the site list in an object; these are the keys tried.
+_SYSTEM_LIST_KEYS = ("sites", "reply", "results", "items", "data")
+
+
+def extract_systems(data):
+    """Pull the list of sites out of a /cdb/systems response, whatever its shape.
+
+    Accepts a bare JSON array, or an object that wraps the array under a key
+    such as "sites" / "reply" / "data". Falls back to the first list-of-objects
+    value found in the object. Returns [] only when there is genuinely no list.
+    """
+    if isinstance(data, list):
+        return data
+    if isinstance(data, dict):
+        for key in _SYSTEM_LIST_KEYS:
+            value = data.get(key)
+            if isinstance(value, list):
+                return value
+            if isinstance(value, dict):
+                nested = extract_systems(value)
+                if nested:
+                    return nested
+        for value in data.values():
+            if isinstance(value, list) and (not value or isinstance(value[0], dict)):
+                return value
+    return []
+
+
+class NxCloudAccountClient:
+    """Lists the sites of a cloud account, with an UNSCOPED (cdb) token.
+
+    The counterpart of NxCloudEventLogClient for account-level calls: its
+    token is good for /cdb/systems but not for any site, so each site read
+    still needs its own site-scoped login.
+    """
+
+    def __init__(self, cloud_host, verify_tls=True, session=None, timeout=15):
+        self.cloud_host = (cloud_host or "").rstrip("/")
+        self.timeout = timeout
+        self.session = session or build_session()
+        self.session.verify = verify_tls
+        self.token = None
+
+    def login(self, user, password, mfa_code=None):
+        """Get a cloud-wide token (no scope)."""
+        self.token = login_cloud(
+            self.session, self.cloud_host, user, password, mfa_code=mfa_code,
+            timeout=self.timeout,
+            rejected="Check credentials; add --mfa-code for a 2FA account.")
+        return self.token
+
+    def list_sites(self):
+        """Return the account's sites (dicts with at least `id` and `name`)."""
+        if not self.token:
+            raise ApiError("No token. Call login() first.")
+        url = f"{self.cloud_host}{SYSTEMS_PATH}"
+        try:
+            response = self.session.get(
+                url, headers={"Authorization": f"Bearer {self.token}"},
+                timeout=self.timeout)
+        except requests.exceptions.RequestException as exc:
+            raise ApiError(f"Could not reach {url}: {exc}") from exc
+        check_response(response, "Listing sites",
+                       rejected="The cloud rejected the account token.")
+        try:
+            return extract_systems(response.json())
+        except ValueError as exc:
+            raise ApiError("Sites response was not valid JSON.") from exc
+
+    def logout(self):
+        """Delete the account token on the cloud. Best-effort cleanup."""
+        if not self.token:
+            return
+        revoke_token(self.session, cloud_logout_url(self.cloud_host, self.token),
+                     self.token, timeout=self.timeout)
+        self.token = None
+
+
+class _SiteFeed:
+    """One site's records for stream_site_events(), read a chunk at a time.
+
+    fill() runs on a pool thread and reads the next chunk (opening the site
+    first); records() runs on the consumer's thread, hands the chunks over
+    and keeps one more being read ahead. A site never holds more than two
+    chunks, and no pool thread ever waits for the consumer.
+    """
+
+    def __init__(self, site_id, open_site, chunk, submit):
+        self.site_id = site_id
+        self._open_site = open_site
+        self._chunk = chunk
+        self._submit = submit
+        self._records = None
+        self._chunks = collections.deque()
+        self._ready = threading.Condition()
+        self._reading = False
+        self.finished = False
+        self.count = 0
+        self.error = None
+        self.started = None
+        self.seconds = 0.0
+
+    def read_ahead(self):
+        """Queue the next fill() unless one is queued or the site is done."""
+        with self._ready:
+            if not (self._reading or self.finished):
+                self._reading = True
+                self._submit(self.fill)
+
+    def fill(self):
+        if self.started is None:
+            self.started = time.monotonic()
+        # Anything that escapes, whatever its type, ends this site only:
+        # records() must always be woken, or the merge waits forever.
+        records, finished, error = [], True, None
+        try:
+            if self._records is None:
+                self._records = iter(self._open_site(self.site_id))
+            records = list(itertools.islice(self._records, self._chunk))
+            finished = len(records) < self._chunk
+        except (AuthError, ApiError) as exc:
+            error = str(exc)
+        except Exception as exc:
+            error = f"{type(exc).__name__}: {exc}"
+        finally:
+            with self._ready:
+                self.count += len(records)
+                if records:
+                    self._chunks.append(records)
+                if finished:
+                    self.finished, self.error = True, error
+                    self.seconds = time.monotonic() - self.started
+                self._reading = False
+                self._ready.notify_all()
+
+    def close(self):
+        """Close the site's record iterator if it has a close() (a generator
+        then runs its finally blocks, e.g. a logout). Only call it once no
+        fill() can be running."""
+        close = getattr(self._records, "close", None)
+        if close is not None:
+            close()
+
+    def records(self, report):
+        """Yield the site's records, tagged with "siteId"; call report(self)
+        once the whole site has been read."""
+        while True:
+            with self._ready:
+                while not (self._chunks or self.finished):
+                    self.read_ahead()
+                    self._ready.wait()
+                chunk = self._chunks.popleft() if self._chunks else None
+                self.read_ahead()
+                done = self.finished and not self._chunks
+            if done:
+                report(self)
+            if chunk is None:
+                return
+            for record in chunk:
+                record["siteId"] = self.site_id
+                yield record
+            if done:
+                return
+
+
+def stream_site_events(site_ids, open_site, order="desc", workers=FANOUT_WORKERS,
+                       chunk=PAGE_LIMIT, report=None):
+    """One timestamp-ordered stream of every site's records, each tagged with
+    its "siteId", yielded while the sites are still being read.
+
+    open_site(site_id) returns an iterator of that site's records, already
+    in `order`; it is called on one of `workers` threads, and the records
+    are pulled from it there, `chunk` at a time, with one chunk read ahead.
+    The sites are merged with heapq.merge, so the first record is out once
+    every site has sent its first chunk -- not when the slowest site is
+    done -- and memory stays at about 2 * chunk records per site.
+    report(feed) is called as each site is fully read, with its site_id,
+    count, seconds and error (a failing site is reported; the rest carry
+    on). Closing the stream early cancels the reads not yet started and,
+    once the running ones are done, closes every site's iterator.
+    """
+    if workers < 1:
+        raise ValueError("workers must be at least 1.")
+    if chunk < 1:
+        raise ValueError("chunk must be at least 1.")
+    report = report or (lambda feed: None)
+    feeds = []
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = []
+
+            def submit(fill):
+                futures[:] = [future for future in futures if not future.done()]
+                futures.append(pool.submit(fill))
+
+            feeds = [_SiteFeed(site_id, open_site, chunk, submit)
+                     for site_id in site_ids]
+            try:
+                for feed in feeds:
+                    feed.read_ahead()  # every site's first chunk, workers at a time
+                yield from heapq.merge(*(feed.records(report) for feed in feeds),
+                                       key=_timestamp, reverse=order == "desc")
+            finally:
+                for future in futures:
+                    future.cancel()
+    finally:
+        for feed in feeds:  # the pool has shut down: no fill() is running
+            feed.close()
+
+
+def format_site_events_table(records, site_names=None):
+    """Plain-text table of merged multi-site records (a SITE column first)."""
+    if not records:
+        return "No events in this time range."
+    site_names = site_names or {}
+    rows = [("SITE", "TIME (UTC)", "EVENT", "ACTION", "RESOURCE")]
+    for record in records:
+        event = normalize_event(record)
+        rows.append((str(site_names.get(record.get("siteId")) or record.get("siteId")),
+                     event.time, str(event.event_type), str(event.action_type),
+                     str(event.resource)))
+    return _plain_table(rows)
+
+
+# ---------------------------------------------------------------------------
+# asyncio front end
+# ---------------------------------------------------------------------------
+
+class AsyncNxCloudEventLogClient(AsyncClient):
+    """asyncio counterpart of NxCloudEventLogClient: same methods, as coroutines.
+    Each call holds a thread of the shared pool; see AsyncClient."""
+
+    sync_class = NxCloudEventLogClient
+
+    def use_token(self, token):
+        self.sync.use_token(token)
+
+    async def login(self, user, password, mfa_code=None):
+        return await self._run(self.sync.login, user, password, mfa_code)
+
+    async def get_event_log(self, *args, **kwargs):
+        return await self._run(self.sync.get_event_log, *args, **kwargs)
+
+    async def get_event_manifest(self):
+        return await self._run(self.sync.get_event_manifest)
+
+    async def logout(self):
+        return await self._run(self.sync.logout)
 
 
 # ---------------------------------------------------------------------------
@@ -444,6 +1383,43 @@ def build_arg_parser():
     parser.add_argument("--order", choices=("asc", "desc"), default="desc",
                         help="Sort order (default desc)")
     parser.add_argument("--limit", type=int, default=50, help="Max records (default 50)")
+    parser.add_argument("--all", action="store_true",
+                        help="Read EVERY event in the window, in adaptive time "
+                             "slices (ignores --limit)")
+    parser.add_argument("--page-size", type=int, default=PAGE_LIMIT,
+                        help=f"Records per request with --all (default {PAGE_LIMIT})")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Parts of the window read at once with --all "
+                             f"(default {DEFAULT_WORKERS}; 1 = one after another), "
+                             f"or sites with --all-sites (default {FANOUT_WORKERS})")
+    parser.add_argument("--all-sites", action="store_true",
+                        help="Read every site of the cloud account (via "
+                             "/cdb/systems) and print one merged, time-ordered "
+                             "stream tagged with the site id")
+    parser.add_argument("--follow", action="store_true",
+                        help="After the window, keep polling and print new "
+                             "events as they appear (Ctrl+C to stop)")
+    parser.add_argument("--store", default=None, metavar="PATH",
+                        help="Keep events in this SQLite file: fetch only the "
+                             "time ranges it lacks, answer the query from it")
+    parser.add_argument("--manifest-cache", default=None, metavar="PATH",
+                        help="Cache event type names in this JSON file "
+                             "(revalidated daily) and show them in the table")
+    parser.add_argument("--aggregate", action="store_true",
+                        help="Print counts (top types/actions/resources/rules, "
+                             "per time bucket, inter-arrival gaps) of EVERY "
+                             "event in the window instead of the events "
+                             "(implies --all)")
+    parser.add_argument("--bucket", default="1h",
+                        help="Time bucket for --aggregate (default 1h)")
+    parser.add_argument("--group-by", choices=AGGREGATE_DIMENSIONS,
+                        default="event_type",
+                        help="What --aggregate counts per bucket (default event_type)")
+    parser.add_argument("--top", type=int, default=10,
+                        help="Rows in each --aggregate top list (default 10)")
+    parser.add_argument("--output", choices=("table", "jsonl"), default="table",
+                        help="table (default) or jsonl: one raw record per line, "
+                             "written as it is read")
     parser.add_argument("--env-file", default=".env", help="Path to a .env file")
     parser.add_argument("--insecure", action="store_true",
                         help="Skip TLS verification (lab use only)")
@@ -452,18 +1428,243 @@ def build_arg_parser():
     return parser
 
 
+def _authenticate(client, config):
+    """Use --token, or log in with --user/--password. False if neither is set."""
+    if config["token"]:
+        client.use_token(config["token"])
+    elif config["user"] and config["password"]:
+        client.login(config["user"], config["password"], config["mfa_code"])
+    else:
+        print("Provide --user/--password to log in, or --token.", file=sys.stderr)
+        return False
+    return True
+
+
+def _table_manifest(args, client):
+    """--manifest-cache: event type display names for the table, or None.
+
+    Never fails the run: if the site can't be asked, a stale cached entry
+    is used, and without one the table shows the ids.
+    """
+    if not args.manifest_cache:
+        return None
+    cache = ManifestCache(args.manifest_cache)
+    try:
+        return client.get_event_manifest(cache=cache)
+    except (AuthError, ApiError, OSError) as exc:
+        entry = cache.get(client.site_id)
+        if entry:
+            return entry["manifest"]
+        print(f"Event type names unavailable ({exc}); showing ids.",
+              file=sys.stderr)
+        return None
+
+
+def _print_records(args, config, client, records, start_ms, duration_ms,
+                   normalized=False):
+    """Write raw records as JSON lines (--output jsonl) or as the table."""
+    if args.aggregate:
+        report = aggregate_report(EventColumns().extend(records),
+                                  parse_duration(args.bucket), args.top,
+                                  args.group_by)
+        if args.output == "jsonl":
+            print(json.dumps(report, separators=(",", ":")))
+            return 0
+        print(f"Event summary for {config['site_id']}\n"
+              f"window: {_ms_to_iso(start_ms)} -> {_ms_to_iso(start_ms + duration_ms)} UTC"
+              f"   ({report['events']} events, {args.bucket} buckets)\n")
+        print(format_aggregate_report(report, _table_manifest(args, client)))
+        return 0
+    if args.output == "jsonl":
+        count = 0
+        for record in records:
+            print(json.dumps(record, separators=(",", ":")))
+            count += 1
+        print(f"{count} events written.", file=sys.stderr)
+        return 0
+    events = records if normalized else [normalize_event(r) for r in records]
+    print(f"Events for {config['site_id']}\n"
+          f"window: {_ms_to_iso(start_ms)} -> {_ms_to_iso(start_ms + duration_ms)} UTC"
+          f"   ({len(events)} events)\n")
+    print(format_events_table(events, _table_manifest(args, client)))
+    return 0
+
+
+def _main_store(args, config, client, start_ms, duration_ms):
+    """--store: fetch only what the local store lacks, answer from it."""
+    end_ms = start_ms + duration_ms
+    try:
+        store = EventStore(args.store)
+    except sqlite3.Error as exc:
+        print(f"Could not open the store {args.store}: {exc}", file=sys.stderr)
+        return 2
+    try:
+        if store.missing(config["site_id"], start_ms, end_ms,
+                         args.event_type, args.action_type):
+            if not _authenticate(client, config):
+                return 2
+            fetched, added = fill_event_store(
+                store, client, start_ms, end_ms, args.event_type,
+                args.action_type, workers=args.workers)
+            print(f"Store: read {fetched} missing range(s), {added} new events.",
+                  file=sys.stderr)
+        else:
+            print("Store: window already complete locally; nothing fetched.",
+                  file=sys.stderr)
+        records = store.query(config["site_id"], start_ms, end_ms,
+                              args.event_type, args.action_type, args.order,
+                              limit=None if args.all else args.limit)
+        return _print_records(args, config, client, records, start_ms, duration_ms)
+    finally:
+        store.close()
+
+
+def _main_all_sites(args, config, start_ms, duration_ms):
+    """--all-sites: read every site of the account, print one merged stream."""
+    if not (config["user"] and config["password"]):
+        print("--all-sites logs in to every site: provide --user/--password.",
+              file=sys.stderr)
+        return 2
+    if config["mfa_code"]:
+        print("--all-sites needs one login per site, which a one-time 2FA code "
+              "can't cover.", file=sys.stderr)
+        return 2
+    # One pooled session and one relay cache, shared by every site client.
+    session = build_session(pool_size=max(POOL_SIZE, args.workers))
+    redirect_cache = RedirectCache()
+    account = NxCloudAccountClient(config["cloud_host"],
+                                   verify_tls=not args.insecure, session=session)
+    account.login(config["user"], config["password"])
+    try:
+        sites = [site for site in account.list_sites() if site.get("id")]
+    finally:
+        account.logout()  # the account token is only needed for the list
+    names = {site["id"]: site.get("name") for site in sites}
+    print(f"Reading {len(sites)} sites, {args.workers} at a time...", file=sys.stderr)
+
+    def open_site(site_id):
+        client = NxCloudEventLogClient(config["cloud_host"], site_id,
+                                       verify_tls=not args.insecure,
+                                       session=session, redirect_cache=redirect_cache)
+        # The site token is revoked once the site is drained, fails, or the
+        # merge is closed early (stream_site_events() closes this generator).
+        try:
+            client.login(config["user"], config["password"])
+            if args.all:
+                yield from client.export_event_log(
+                    start_ms, duration_ms, args.event_type, args.action_type,
+                    args.order, page_limit=args.page_size)
+            else:
+                # The newest (or oldest) --limit of each site hold the --limit
+                # overall.
+                yield from client.iter_event_records(
+                    start_ms, duration_ms, args.event_type, args.action_type,
+                    args.order, args.limit)
+        finally:
+            client.logout()
+
+    failed = []
+
+    def report(feed):
+        status = f"FAILED: {feed.error}" if feed.error else f"{feed.count} events"
+        print(f"{names.get(feed.site_id) or feed.site_id}: {status} "
+              f"in {feed.seconds:.2f}s", file=sys.stderr)
+        if feed.error:
+            failed.append(feed.site_id)
+
+    stream = stream_site_events([site["id"] for site in sites], open_site,
+                                args.order, args.workers, args.page_size, report)
+    merged = stream if args.all else itertools.islice(stream, args.limit)
+    try:
+        if args.output == "jsonl":
+            count = 0
+            for record in merged:
+                print(json.dumps(record, separators=(",", ":")))
+                count += 1
+            print(f"{count} events written.", file=sys.stderr)
+        else:
+            records = list(merged)
+            print(f"Events for {len(sites)} sites\n"
+                  f"window: {_ms_to_iso(start_ms)} -> "
+                  f"{_ms_to_iso(start_ms + duration_ms)} UTC"
+                  f"   ({len(records)} events)\n")
+            print(format_site_events_table(records, names))
+    finally:
+        stream.close()  # logs out of the sites cut off by --limit
+    return 1 if failed and len(failed) == len(sites) else 0
+
+
+def _main_follow(args, config, client, start_ms):
+    """--follow: print the window, then new events as they arrive."""
+    relogin = None
+    if not config["token"]:
+        def relogin():
+            client.login(config["user"], config["password"], config["mfa_code"])
+
+    def log(message):
+        print(message, file=sys.stderr)
+
+    print(f"Following events for {config['site_id']} from "
+          f"{_ms_to_iso(start_ms)} UTC (Ctrl+C to stop)", file=sys.stderr)
+    try:
+        for record in follow_event_log(client, start_ms, args.event_type,
+                                       args.action_type, relogin=relogin, log=log):
+            if args.output == "jsonl":
+                print(json.dumps(record, separators=(",", ":")), flush=True)
+            else:
+                print(format_event_line(normalize_event(record)), flush=True)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
 def main(argv=None):
     args = build_arg_parser().parse_args(argv)
     config = resolve_config(args, load_env_file(args.env_file))
 
-    for name in ("cloud_host", "site_id"):
+    for name in ("cloud_host",) if args.all_sites else ("cloud_host", "site_id"):
         if not config[name]:
             print(f"Missing config: {name}. See the README.", file=sys.stderr)
             return 2
 
-    client = NxCloudEventLogClient(cloud_host=config["cloud_host"],
-                                   site_id=config["site_id"],
-                                   verify_tls=not args.insecure)
+    if args.workers is None:
+        args.workers = FANOUT_WORKERS if args.all_sites else DEFAULT_WORKERS
+    if args.workers < 1:
+        print("--workers must be at least 1.", file=sys.stderr)
+        return 2
+    if args.page_size < 1:
+        print("--page-size must be at least 1.", file=sys.stderr)
+        return 2
+    if args.all_sites and (args.follow or args.store or args.aggregate
+                           or args.list_event_types):
+        print("--all-sites can't be combined with --follow, --store, "
+              "--aggregate or --list-event-types.", file=sys.stderr)
+        return 2
+    if args.follow and args.end:
+        print("--follow reads up to now; drop --end.", file=sys.stderr)
+        return 2
+    if args.aggregate:
+        if args.follow:
+            print("--aggregate summarizes a fixed window; it can't be used "
+                  "with --follow.", file=sys.stderr)
+            return 2
+        try:
+            if parse_duration(args.bucket) <= 0:
+                raise ValueError("it must be longer than 0.")
+        except ValueError as exc:
+            print(f"Error: --bucket: {exc}", file=sys.stderr)
+            return 2
+        # Counts over the first --limit records would pass for the window's.
+        args.all = True
+    if args.follow and args.store:
+        print("--store answers fixed windows; it can't be used with --follow.",
+              file=sys.stderr)
+        return 2
+    # --all --workers N reads N parts at once: one pooled connection each.
+    client = NxCloudEventLogClient(
+        cloud_host=config["cloud_host"], site_id=config["site_id"],
+        verify_tls=not args.insecure,
+        session=build_session(pool_size=max(POOL_SIZE, args.workers)))
 
     now_ms = int(time.time() * 1000)
     if not args.list_event_types:
@@ -475,19 +1676,18 @@ def main(argv=None):
             return 2
 
     try:
-        if config["token"]:
-            client.use_token(config["token"])
-        elif config["user"] and config["password"]:
-            client.login(config["user"], config["password"], config["mfa_code"])
-        else:
-            print("Provide --user/--password to log in, or --token.", file=sys.stderr)
+        if args.all_sites:
+            return _main_all_sites(args, config, start_ms, duration_ms)
+        if args.store and not args.list_event_types:
+            return _main_store(args, config, client, start_ms, duration_ms)
+        if not _authenticate(client, config):
             return 2
 
         if args.list_event_types:
-            manifest = client.get_event_manifest()
+            cache = ManifestCache(args.manifest_cache) if args.manifest_cache else None
+            manifest = client.get_event_manifest(cache=cache)
 
             if args.debug:
-                import json
                 print("--- raw manifest response (truncated) ---", file=sys.stderr)
                 print(json.dumps(client.last_raw, indent=2)[:4000], file=sys.stderr)
                 print("--- end raw ---", file=sys.stderr)
@@ -497,21 +1697,34 @@ def main(argv=None):
             print(format_manifest_table(manifest))
             return 0
 
+        if args.follow:
+            return _main_follow(args, config, client, start_ms)
+
+        if args.all:
+            records = client.export_event_log(
+                start_ms, duration_ms, event_type=args.event_type,
+                action_type=args.action_type, order=args.order,
+                page_limit=args.page_size, workers=args.workers)
+        elif args.output == "jsonl":
+            records = client.iter_event_records(
+                start_ms, duration_ms, event_type=args.event_type,
+                action_type=args.action_type, order=args.order, limit=args.limit)
+
+        if args.all or args.output == "jsonl":
+            return _print_records(args, config, client, records, start_ms, duration_ms)
+
         events = client.get_event_log(
             start_ms, duration_ms, event_type=args.event_type,
-            action_type=args.action_type, order=args.order, limit=args.limit)
+            action_type=args.action_type, order=args.order, limit=args.limit,
+            keep_raw=args.debug)
 
         if args.debug:
-            import json
             print("--- raw events response (truncated) ---", file=sys.stderr)
             print(json.dumps(client.last_raw, indent=2)[:4000], file=sys.stderr)
             print("--- end raw ---", file=sys.stderr)
 
-        print(f"Events for {config['site_id']}\n"
-              f"window: {_ms_to_iso(start_ms)} -> {_ms_to_iso(start_ms + duration_ms)} UTC"
-              f"   ({len(events)} events)\n")
-        print(format_events_table(events))
-        return 0
+        return _print_records(args, config, client, events, start_ms, duration_ms,
+                              normalized=True)
     except AuthError as exc:
         print(f"Auth failed: {exc}", file=sys.stderr)
         return 1
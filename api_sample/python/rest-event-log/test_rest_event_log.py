@@ -10,10 +10,16 @@ Run from this folder:  pytest -v
 """
 
 import argparse
+import asyncio
+import json
+import threading
+import time
 
 import pytest
+import requests
 
 import rest_event_log as sample
+import nx_transport  # on sys.path once the sample is imported
 
 
 SYS = "11111111-2222-3333-4444-555555555555"
@@ -39,6 +45,15 @@ class FakeResponse:
             raise ValueError("no json")
         return self._json
 
+    def iter_content(self, chunk_size=None):
+        # Small chunks on purpose: records get split across chunk boundaries.
+        body = json.dumps(self._json).encode("utf-8") if self._json is not None else b""
+        for start in range(0, len(body), 7):
+            yield body[start:start + 7]
+
+    def close(self):
+        self.closed = True
+
 
 class FakeSession:
     """Serves queued GET responses in order; records each GET (url, headers, params)."""
@@ -49,15 +64,27 @@ class FakeSession:
         self._gets = list(gets or [])
         self.post_url = self.post_json = None
         self.get_calls = []  # (url, headers, params, allow_redirects)
+        self.delete_url = None
 
     def post(self, url, json=None, timeout=None):
         self.post_url, self.post_json = url, json
         return self._post
 
-    def get(self, url, headers=None, params=None, timeout=None, allow_redirects=None):
+    def get(self, url, headers=None, params=None, timeout=None, allow_redirects=None,
+            stream=None):
         self.get_calls.append((url, headers, params, allow_redirects))
         return self._gets.pop(0)
 
+    def delete(self, url, headers=None, timeout=None):
+        self.delete_url = url
+        return None
+
+    def request(self, method, url, **kwargs):
+        return getattr(self, method.lower())(url, **kwargs)
+
+    def mount(self, prefix, adapter):
+        pass  # build_session() mounts its pooled adapter; nothing to do here
+
 
 # A v4 record: details live inside eventData / actionData; timestamp in ms.
 RAW_RECORD = {
@@ -93,6 +120,21 @@ def test_normalize_handles_missing_data():
     assert out["action_type"] == ""
 
 
+def test_normalized_event_is_compact_and_formats_time_lazily():
+    other = dict(RAW_RECORD, timestampMs=RAW_RECORD["timestampMs"] + 1)
+    a, b = sample.normalize_event(RAW_RECORD), sample.normalize_event(other)
+
+    assert isinstance(a, sample.EventRecord)
+    assert not hasattr(a, "__dict__")                     # __slots__ only
+    assert a.timestamp_ms == RAW_RECORD["timestampMs"]    # raw int is kept
+    assert a.event_type is b.event_type                   # interned, shared
+    assert a.get("nope", "-") == "-"
+    assert a.as_dict() == {"time": a.time, "event_type": "cameraDisconnectEvent",
+                           "resource": "Lobby Cam", "action_type": "sendMailAction"}
+    with pytest.raises(KeyError):
+        a["flags"]
+
+
 def test_build_event_params_uses_start_and_duration():
     params = sample.build_event_params(1000, 2000)
     assert params["startTimeMs"] == "1000"
@@ -205,6 +247,109 @@ def test_307_redirect_is_followed_with_bearer_preserved():
     assert events[0]["resource"] == "Lobby Cam"
 
 
+def test_followed_redirect_is_cached_and_reused_for_the_manifest():
+    node = "https://node7.relay.vmsproxy.com/rest/v4/events/log"
+    client, session = make_client(gets=[
+        FakeResponse(307, headers={"Location": node}),
+        FakeResponse(200, [RAW_RECORD]),
+        FakeResponse(200, RAW_MANIFEST),
+    ])
+    client.use_token("nxcdb-t")
+
+    client.get_event_log(1000, 2000)
+    client.get_event_manifest()
+
+    # Third GET skipped the relay and went straight to node7, bearer attached.
+    assert len(session.get_calls) == 3
+    url, headers, _params, _ = session.get_calls[2]
+    assert url == "https://node7.relay.vmsproxy.com/rest/v4/events/manifest/events"
+    assert headers["Authorization"] == "Bearer nxcdb-t"
+
+
+def test_cached_node_error_invalidates_and_falls_back_to_relay():
+    relay = f"https://{SYS}.relay.vmsproxy.com/rest/v4/events/log"
+    node = "https://node7.relay.vmsproxy.com/rest/v4/events/log"
+    client, session = make_client(gets=[
+        FakeResponse(503, text="gone"),
+        FakeResponse(307, headers={"Location": node}),
+        FakeResponse(200, [RAW_RECORD]),
+    ])
+    client.use_token("t")
+    client.redirect_cache.remember(relay, "https://node3.relay.vmsproxy.com/rest/v4/events/log")
+
+    events = client.get_event_log(1000, 2000)
+
+    assert [call[0] for call in session.get_calls] == [
+        "https://node3.relay.vmsproxy.com/rest/v4/events/log", relay, node]
+    assert session.get_calls[1][2]["startTimeMs"] == "1000"   # params resent
+    assert events[0]["resource"] == "Lobby Cam"
+    assert client.redirect_cache.lookup(relay) == node
+
+
+def test_cached_node_client_error_is_returned_without_asking_the_relay():
+    relay = f"https://{SYS}.relay.vmsproxy.com/rest/v4/events/log"
+    node = "https://node3.relay.vmsproxy.com/rest/v4/events/log"
+    client, session = make_client(gets=[FakeResponse(400, text="bad filter")])
+    client.use_token("t")
+    client.redirect_cache.remember(relay, node)
+
+    with pytest.raises(sample.ApiError):
+        client.get_event_log(1000, 2000)
+
+    assert [call[0] for call in session.get_calls] == [node]
+    assert client.redirect_cache.lookup(relay) == node
+
+
+def test_iter_event_log_streams_normalized_records_and_closes_the_response():
+    records = [dict(RAW_RECORD, timestampMs=RAW_RECORD["timestampMs"] + i)
+               for i in range(5)]
+    response = FakeResponse(200, records)
+    client, _ = make_client(gets=[response])
+    client.use_token("t")
+
+    events = client.iter_event_log(1000, 2000, limit=5000)
+    first = next(events)
+    events.close()                       # abandon the rest of the body
+
+    assert first["event_type"] == "cameraDisconnectEvent"
+    assert response.closed
+
+
+def test_get_event_log_keeps_raw_records_only_when_asked():
+    client, _ = make_client(gets=[FakeResponse(200, [RAW_RECORD]),
+                                  FakeResponse(200, [RAW_RECORD])])
+    client.use_token("t")
+
+    client.get_event_log(1000, 2000)
+    assert client.last_raw is None
+    events = client.get_event_log(1000, 2000, keep_raw=True)
+    assert client.last_raw == [RAW_RECORD]
+    assert events[0]["resource"] == "Lobby Cam"
+
+
+def test_truncated_event_log_raises_api_error():
+    class Truncated(FakeResponse):
+        def iter_content(self, chunk_size=None):
+            yield b'[{"timestampMs": 1}, {"timesta'
+
+    client, _ = make_client(gets=[Truncated(200)])
+    client.use_token("t")
+    with pytest.raises(sample.ApiError):
+        client.get_event_log(1, 2)
+
+
+def test_connection_reset_mid_body_raises_api_error():
+    class Reset(FakeResponse):
+        def iter_content(self, chunk_size=None):
+            yield b'[{"timestampMs": 1}, '
+            raise requests.exceptions.ChunkedEncodingError("connection reset")
+
+    client, _ = make_client(gets=[Reset(200)])
+    client.use_token("t")
+    with pytest.raises(sample.ApiError, match="connection reset"):
+        client.get_event_log(1, 2)
+
+
 def test_redirect_without_location_raises():
     client, session = make_client(gets=[FakeResponse(307, headers={})])
     client.use_token("t")
@@ -265,6 +410,81 @@ def test_get_event_manifest_token_rejected_raises():
         client.get_event_manifest()
 
 
+# ---------------------------------------------------------------------------
+# Event manifest cache (--manifest-cache)
+# ---------------------------------------------------------------------------
+
+def test_fresh_cached_manifest_needs_no_request(tmp_path):
+    path = str(tmp_path / "manifest.json")
+    client, session = make_client(gets=[
+        FakeResponse(200, RAW_MANIFEST, headers={"ETag": '"v1"'})])
+    client.use_token("t")
+
+    first = client.get_event_manifest(cache=sample.ManifestCache(path))
+    again = client.get_event_manifest(cache=sample.ManifestCache(path))  # re-read file
+
+    assert first == again == sample.parse_event_manifest(RAW_MANIFEST)
+    assert len(session.get_calls) == 1
+
+
+def test_stale_cached_manifest_is_revalidated_with_its_etag(tmp_path):
+    now = [1000.0]
+    cache = sample.ManifestCache(str(tmp_path / "manifest.json"), ttl_s=60,
+                                 clock=lambda: now[0])
+    cache.put(SYS, {"cameraMotionEvent": "Motion"}, etag='"v1"')
+    client, session = make_client(gets=[
+        FakeResponse(304),
+        FakeResponse(200, RAW_MANIFEST, headers={"ETag": '"v2"'}),
+    ])
+    client.use_token("t")
+
+    now[0] += 61
+    assert client.get_event_manifest(cache=cache) == {"cameraMotionEvent": "Motion"}
+    assert session.get_calls[0][1]["If-None-Match"] == '"v1"'
+    assert client.get_event_manifest(cache=cache) == {"cameraMotionEvent": "Motion"}
+    assert len(session.get_calls) == 1          # the 304 renewed the TTL
+
+    now[0] += 61
+    assert client.get_event_manifest(cache=cache)["cameraMotionEvent"] == "Motion Detected"
+    assert cache.get(SYS)["etag"] == '"v2"'
+
+
+def test_format_table_uses_manifest_display_names():
+    events = [sample.normalize_event(RAW_RECORD),
+              sample.normalize_event({"eventData": {"eventType": "customEvent"}})]
+    out = sample.format_events_table(events, sample.parse_event_manifest(RAW_MANIFEST))
+    assert "Camera Disconnected" in out and "cameraDisconnectEvent" not in out
+    assert "customEvent" in out                 # unknown ids are shown as is
+
+
+def test_main_table_shows_names_and_survives_a_failed_manifest(monkeypatch, tmp_path,
+                                                                capsys):
+    session = FakeSession(gets=[FakeResponse(200, [RAW_RECORD]),
+                                FakeResponse(500, text="boom")])
+    monkeypatch.setattr(sample, "build_session", lambda **kwargs: session)
+    argv = ["--cloud-host", "https://nxvms.com", "--site-id", SYS, "--token", "t",
+            "--manifest-cache", str(tmp_path / "manifest.json")]
+
+    assert sample.main(argv) == 0
+    captured = capsys.readouterr()
+    assert "cameraDisconnectEvent" in captured.out
+    assert "showing ids" in captured.err
+
+    sample.ManifestCache(str(tmp_path / "manifest.json")).put(
+        SYS, sample.parse_event_manifest(RAW_MANIFEST))
+    session._gets.append(FakeResponse(200, [RAW_RECORD]))
+    assert sample.main(argv) == 0
+    assert "Camera Disconnected" in capsys.readouterr().out
+    assert len(session.get_calls) == 3          # the cached names cost no request
+
+
+
+def test_main_rejects_a_page_size_below_one(capsys):
+    argv = ["--cloud-host", "https://nxvms.com", "--site-id", SYS, "--token", "t",
+            "--all", "--page-size", "0"]
+    assert sample.main(argv) == 2
+    assert "--page-size must be at least 1" in capsys.readouterr().err
+
 # ---------------------------------------------------------------------------
 # Time window (--since / --start / --end), converted to startTimeMs/durationMs
 # ---------------------------------------------------------------------------
@@ -321,6 +541,596 @@ def test_resolve_window_end_before_start_raises():
         sample.resolve_window(0, start="2000", end="1000")
 
 
+# ---------------------------------------------------------------------------
+# Complete exports: adaptive time slices
+# ---------------------------------------------------------------------------
+
+class FakeLog:
+    """A server-side event log: serves slices the way /rest/v4/events/log does."""
+
+    def __init__(self, times, inclusive_end=False):
+        self.records = [{"timestampMs": ts, "eventData": {"n": n}, "ruleId": "r"}
+                        for n, ts in enumerate(times)]
+        self.inclusive_end = inclusive_end
+        self.calls = []  # (start, duration, limit)
+
+    def fetch_page(self, order):
+        def fetch(start_ms, duration_ms, limit):
+            self.calls.append((start_ms, duration_ms, limit))
+            end = start_ms + duration_ms
+            page = [r for r in self.records if start_ms <= r["timestampMs"] < end
+                    or (self.inclusive_end and r["timestampMs"] == end)]
+            page.sort(key=lambda r: r["timestampMs"], reverse=order == "desc")
+            return page[:limit] if limit else page
+        return fetch
+
+
+def _walk(log, order="asc", **kwargs):
+    return list(sample.walk_event_window(log.fetch_page(order), 0, 100_000,
+                                         order=order, **kwargs))
+
+
+def test_walk_reads_every_record_of_a_busy_window_in_order():
+    # A quiet hour with a burst of 50 events in one second in the middle.
+    times = [1000, 90_000] + list(range(40_000, 41_000, 20))
+    log = FakeLog(times)
+
+    out = _walk(log, page_limit=10, slice_ms=30_000, min_slice_ms=100)
+
+    assert [r["timestampMs"] for r in out] == sorted(times)
+    assert len({sample.event_key(r) for r in out}) == len(times)
+    assert min(call[1] for call in log.calls) < 30_000       # slices shrank
+    assert all(call[2] == 10 for call in log.calls)          # never unlimited
+
+
+def test_walk_rejects_a_page_limit_below_one():
+    with pytest.raises(ValueError):
+        _walk(FakeLog([1000]), page_limit=0)
+
+
+def test_walk_descending_with_inclusive_edges_yields_no_duplicates():
+    times = list(range(0, 100_000, 500))
+    log = FakeLog(times, inclusive_end=True)
+
+    out = _walk(log, order="desc", page_limit=7, slice_ms=5000, min_slice_ms=100)
+
+    assert [r["timestampMs"] for r in out] == sorted(times, reverse=True)
+
+
+def test_walk_reads_an_overfull_millisecond_without_a_limit():
+    times = [5000] * 25 + [6000, 7000]
+    log = FakeLog(times)
+
+    out = _walk(log, page_limit=10, min_slice_ms=1)
+
+    assert len(out) == 27
+    assert (5000, 1, 0) in log.calls
+
+
+def test_walk_grows_slices_over_sparse_stretches():
+    log = FakeLog([50_000])
+    _walk(log, page_limit=10, slice_ms=1000, min_slice_ms=100)
+    widths = [call[1] for call in log.calls]
+    assert widths[:4] == [1000, 2000, 4000, 8000]
+
+
+def test_split_window_covers_the_window_without_gaps():
+    parts = sample.split_window(1000, 10_001, 4)
+    assert parts[0][0] == 1000
+    assert all(a[0] + a[1] == b[0] for a, b in zip(parts, parts[1:]))
+    assert sum(duration for _, duration in parts) == 10_001
+    assert sample.split_window(0, 1500, 16) == [(0, 1500)]   # >= MIN_SLICE_MS each
+
+
+@pytest.mark.parametrize("order", ["asc", "desc"])
+def test_parallel_walk_matches_a_single_walk(order):
+    times = list(range(0, 100_000, 37)) + [25_000] * 12   # incl. a part edge
+    log = FakeLog(times, inclusive_end=True)
+
+    out = list(sample.walk_event_window_parallel(
+        log.fetch_page(order), 0, 100_000, order=order, page_limit=20, workers=3))
+
+    assert [r["timestampMs"] for r in out] == sorted(times, reverse=order == "desc")
+    assert len({sample.event_key(r) for r in out}) == len(times)
+
+
+def test_parallel_walk_reads_ahead_a_bounded_amount_and_stops_when_closed():
+    log = FakeLog(range(0, 100_000, 10), inclusive_end=True)   # 10,000 records
+    walk = sample.walk_event_window_parallel(
+        log.fetch_page("asc"), 0, 100_000, page_limit=20, workers=2)
+
+    assert next(walk)["timestampMs"] == 0
+    time.sleep(0.2)                  # let the readers run as far ahead as they can
+    assert len(log.calls) < 20       # a full read takes 500+ pages
+    walk.close()
+    calls = len(log.calls)
+    time.sleep(0.2)
+    assert len(log.calls) == calls   # every reader has stopped
+
+
+def test_parallel_walk_raises_a_failing_part():
+    def fetch(start_ms, duration_ms, limit):
+        raise sample.ApiError("slice failed")
+
+    with pytest.raises(sample.ApiError, match="slice failed"):
+        list(sample.walk_event_window_parallel(fetch, 0, 100_000, workers=2))
+
+
+def test_event_key_tells_same_millisecond_events_apart():
+    a = dict(RAW_RECORD)
+    b = dict(RAW_RECORD, eventData={"eventType": "cameraMotionEvent"})
+    assert sample.event_key(a) == sample.event_key(dict(RAW_RECORD))
+    assert sample.event_key(a) != sample.event_key(b)
+
+
+def test_main_all_streams_jsonl_with_slice_params(monkeypatch, capsys):
+    session = FakeSession(gets=[FakeResponse(200, [RAW_RECORD])])
+    monkeypatch.setattr(sample, "build_session", lambda **kwargs: session)
+
+    rc = sample.main([
+        "--cloud-host", "https://nxvms.com", "--site-id", SYS, "--token", "t",
+        "--start", "1781247900000", "--end", "1781248000000",
+        "--all", "--order", "asc", "--output", "jsonl", "--workers", "1",
+    ])
+
+    assert rc == 0
+    lines = capsys.readouterr().out.splitlines()
+    assert [json.loads(line) for line in lines] == [RAW_RECORD]
+    params = session.get_calls[0][2]
+    assert params["limit"] == str(sample.PAGE_LIMIT)
+    assert params["order"] == "asc"
+    assert params["durationMs"] == "100000"
+
+
+# ---------------------------------------------------------------------------
+# Local event store (--store)
+# ---------------------------------------------------------------------------
+
+def test_merge_and_missing_ranges():
+    covered = sample.merge_ranges([(50, 60), (0, 10), (10, 20), (55, 70)])
+    assert covered == [(0, 20), (50, 70)]
+    assert sample.missing_ranges(covered, 5, 100) == [(20, 50), (70, 100)]
+    assert sample.missing_ranges(covered, 0, 20) == []
+    assert sample.missing_ranges([], 3, 4) == [(3, 4)]
+
+
+def _typed(ts, event_type, n=0):
+    return {"timestampMs": ts, "ruleId": "r",
+            "eventData": {"eventType": event_type, "caption": f"cam{n}"}}
+
+
+def test_store_ignores_duplicates_and_answers_filtered_queries(tmp_path):
+    store = sample.EventStore(str(tmp_path / "events.db"))
+    records = [_typed(1000, "cameraMotionEvent"), _typed(2000, "cameraDisconnectEvent"),
+               _typed(3000, "cameraMotionEvent", 1)]
+
+    assert store.add(SYS, records) == 3
+    assert store.add(SYS, records[:2]) == 0              # append-only, no dupes
+
+    motion = list(store.query(SYS, 0, 10_000, event_type=["cameraMotionEvent"]))
+    assert [r["timestampMs"] for r in motion] == [3000, 1000]     # desc default
+    oldest = list(store.query(SYS, 0, 10_000, order="asc", limit=1))
+    assert oldest == [records[0]]
+    assert list(store.query("other-site", 0, 10_000)) == []
+
+
+def test_store_coverage_is_per_filter_but_unfiltered_covers_all(tmp_path):
+    store = sample.EventStore(str(tmp_path / "events.db"))
+    store.mark_covered(SYS, 0, 100, event_type=["cameraMotionEvent"])
+    store.mark_covered(SYS, 100, 200)
+
+    assert store.missing(SYS, 0, 300, event_type=["cameraMotionEvent"]) == [(200, 300)]
+    assert store.missing(SYS, 0, 300) == [(0, 100), (200, 300)]
+
+
+class StoreClient:
+    """export_event_log() over a FakeLog, recording the windows asked for."""
+
+    site_id = SYS
+
+    def __init__(self, log):
+        self.log = log
+        self.windows = []
+
+    def export_event_log(self, start_ms, duration_ms, event_type, action_type,
+                         order, workers=1):
+        self.windows.append((start_ms, duration_ms))
+        return iter(self.log.fetch_page(order)(start_ms, duration_ms, 0))
+
+
+def test_fill_event_store_fetches_only_gaps_and_leaves_the_recent_edge_open(tmp_path):
+    store = sample.EventStore(str(tmp_path / "events.db"))
+    client = StoreClient(FakeLog(range(0, 1_000_000, 1000)))
+    store.mark_covered(SYS, 200_000, 400_000)
+
+    fetched, added = sample.fill_event_store(store, client, 0, 1_000_000,
+                                             now_ms=1_000_000)
+
+    assert client.windows == [(0, 200_000), (400_000, 600_000)]
+    assert (fetched, added) == (2, 800)
+    # The last STORE_SETTLE_MS is stored but will be read again next time.
+    assert store.missing(SYS, 0, 1_000_000) == [
+        (1_000_000 - sample.STORE_SETTLE_MS, 1_000_000)]
+
+
+def test_main_store_second_run_makes_no_requests(monkeypatch, tmp_path, capsys):
+    db = str(tmp_path / "events.db")
+    session = FakeSession(gets=[FakeResponse(200, [RAW_RECORD])])
+    monkeypatch.setattr(sample, "build_session", lambda **kwargs: session)
+    argv = ["--cloud-host", "https://nxvms.com", "--site-id", SYS,
+            "--start", "1781247900000", "--end", "1781248000000",
+            "--store", db, "--workers", "1"]
+
+    assert sample.main(argv + ["--token", "t"]) == 0
+    assert len(session.get_calls) == 1
+    capsys.readouterr()
+
+    assert sample.main(argv) == 0          # no token or login needed either
+    assert len(session.get_calls) == 1
+    captured = capsys.readouterr()
+    assert "nothing fetched" in captured.err
+    assert "cameraDisconnectEvent" in captured.out
+
+
+# ---------------------------------------------------------------------------
+# Aggregations (--aggregate)
+# ---------------------------------------------------------------------------
+
+def _columns():
+    hour = 3_600_000
+    records = [_typed(0, "cameraMotionEvent", 1), _typed(1000, "cameraMotionEvent", 1),
+               _typed(1000, "cameraDisconnectEvent", 2),
+               _typed(hour + 5, "cameraMotionEvent", 1)]
+    records[2]["ruleId"] = "r2"
+    return sample.EventColumns().extend(records)
+
+
+def test_event_columns_store_codes_not_strings():
+    columns = _columns()
+    assert len(columns) == 4
+    assert columns.names["event_type"] == ["cameraMotionEvent", "cameraDisconnectEvent"]
+    assert list(columns.codes["event_type"]) == [0, 0, 1, 0]
+    assert columns.counts("resource") == {"cam1": 3, "cam2": 1}
+    assert columns.counts("rule").most_common(1) == [("r", 3)]
+
+
+def test_event_columns_bucket_counts_and_inter_arrival():
+    columns = _columns()
+    assert columns.bucket_counts("event_type", 3_600_000) == {
+        0: {"cameraMotionEvent": 2, "cameraDisconnectEvent": 1},
+        3_600_000: {"cameraMotionEvent": 1}}
+    # Gaps 1000, 0 and 3_599_005 ms -> bins 0, 1024 and 4_194_304.
+    assert columns.inter_arrival() == [(0, 1), (1024, 1), (4_194_304, 1)]
+
+
+def test_aggregate_report_and_table():
+    report = sample.aggregate_report(_columns(), 3_600_000, top=1)
+    assert report["events"] == 4
+    assert report["top"]["event_type"] == [("cameraMotionEvent", 3)]
+    assert [b["startMs"] for b in report["buckets"]] == [0, 3_600_000]
+
+    out = sample.format_aggregate_report(report, {"cameraMotionEvent": "Motion"})
+    assert "TOP EVENT TYPE" in out and "Motion" in out and "GAP UP TO" in out
+    assert "No events" in sample.format_aggregate_report(
+        sample.aggregate_report(sample.EventColumns(), 1000))
+
+
+def test_main_aggregate_counts_the_whole_window(monkeypatch, capsys):
+    class WindowSession(FakeSession):
+        """One page holding both records, then empty slices to the window's end."""
+
+        def get(self, url, headers=None, params=None, timeout=None,
+                allow_redirects=None, stream=None):
+            if not self._gets:
+                self._gets.append(FakeResponse(200, []))
+            return super().get(url, headers, params, timeout, allow_redirects, stream)
+
+    later = dict(RAW_RECORD, timestampMs=RAW_RECORD["timestampMs"] + 1)
+    session = WindowSession(gets=[FakeResponse(200, [RAW_RECORD, later])])
+    monkeypatch.setattr(sample, "build_session", lambda **kwargs: session)
+
+    rc = sample.main(["--cloud-host", "https://nxvms.com", "--site-id", SYS,
+                      "--token", "t", "--aggregate", "--bucket", "1d",
+                      "--output", "jsonl", "--workers", "1", "--limit", "1"])
+
+    assert rc == 0
+    assert all(call[2]["limit"] == str(sample.PAGE_LIMIT) for call in session.get_calls)
+    report = json.loads(capsys.readouterr().out)
+    assert report["events"] == 2
+    assert report["bucketMs"] == 86_400_000
+    assert report["top"]["resource"] == [["Lobby Cam", 2]]
+
+
+# ---------------------------------------------------------------------------
+# Live tail (--follow)
+# ---------------------------------------------------------------------------
+
+class PollsDone(Exception):
+    """Raised by FollowClient once its scripted polls run out."""
+
+
+class FollowClient:
+    """Answers each export_event_log() poll from a script (a list, or an exception)."""
+
+    def __init__(self, polls):
+        self.polls = list(polls)
+        self.windows = []  # (start_ms, duration_ms) of every poll
+
+    def export_event_log(self, start_ms, duration_ms, event_type, action_type, order):
+        self.windows.append((start_ms, duration_ms))
+        if not self.polls:
+            raise PollsDone()
+        poll = self.polls.pop(0)
+        if isinstance(poll, Exception):
+            raise poll
+        return iter(poll)
+
+
+def _event(ts, n=0):
+    return {"timestampMs": ts, "eventData": {"n": n}, "ruleId": "r"}
+
+
+def _follow(client, clock_s=100.0, **kwargs):
+    now = [clock_s]
+    pauses = []
+
+    def sleep(seconds):
+        pauses.append(seconds)
+        now[0] += seconds
+
+    out = []
+    with pytest.raises(PollsDone):
+        for record in sample.follow_event_log(
+                client, 90_000, poll_s=1, max_poll_s=4, lag_ms=5000,
+                clock=lambda: now[0], sleep=sleep, **kwargs):
+            out.append(record)
+    return out, pauses
+
+
+def test_follow_yields_only_new_records_and_moves_the_mark():
+    client = FollowClient([
+        [_event(95_000), _event(99_000)],
+        [_event(99_000), _event(100_500)],       # 99_000 is re-read (lag), not re-yielded
+        [],
+        [],
+        [],
+        [_event(104_000, 1)],
+    ])
+
+    out, pauses = _follow(client)
+
+    assert [r["timestampMs"] for r in out] == [95_000, 99_000, 100_500, 104_000]
+    assert client.windows[0] == (90_000, 10_000)
+    assert client.windows[1] == (95_000, 6_000)   # mark = previous now - lag
+    assert pauses == [1, 1, 2, 4, 4, 1]            # backs off while quiet, resets
+
+
+def test_follow_relogs_in_once_and_survives_api_errors():
+    logins, logged = [], []
+    client = FollowClient([
+        sample.AuthError("expired"),
+        [_event(95_000)],
+        sample.ApiError("relay hiccup"),
+        [_event(95_000), _event(96_000)],
+    ])
+
+    out, _ = _follow(client, relogin=lambda: logins.append(1), log=logged.append)
+
+    assert [r["timestampMs"] for r in out] == [95_000, 96_000]
+    assert logins == [1]
+    assert "relay hiccup" in logged[0]
+
+
+def test_follow_without_relogin_raises_auth_error():
+    client = FollowClient([sample.AuthError("expired")])
+    with pytest.raises(sample.AuthError):
+        next(sample.follow_event_log(client, 0, sleep=lambda s: None))
+
+
+# ---------------------------------------------------------------------------
+# Multi-site fan-out (--all-sites)
+# ---------------------------------------------------------------------------
+
+SITE_A = "aaaaaaaa-0000-0000-0000-000000000000"
+SITE_B = "bbbbbbbb-0000-0000-0000-000000000000"
+SITE_C = "cccccccc-0000-0000-0000-000000000000"
+
+
+def test_extract_systems_handles_bare_and_wrapped_lists():
+    assert sample.extract_systems([{"id": "a"}]) == [{"id": "a"}]
+    assert sample.extract_systems({"reply": {"sites": [{"id": "b"}]}}) == [{"id": "b"}]
+    assert sample.extract_systems({"whatever": [{"id": "c"}]}) == [{"id": "c"}]
+    assert sample.extract_systems("nope") == []
+
+
+def test_account_client_uses_an_unscoped_token_to_list_sites():
+    session = FakeSession(post=FakeResponse(200, {"access_token": "cdb-t"}),
+                          gets=[FakeResponse(200, {"sites": [{"id": SITE_A}]})])
+    account = sample.NxCloudAccountClient("https://nxvms.com", session=session)
+
+    account.login("me@x.com", "pw")
+    sites = account.list_sites()
+
+    assert "scope" not in session.post_json
+    assert session.get_calls[0][0] == "https://nxvms.com/cdb/systems"
+    assert session.get_calls[0][1]["Authorization"] == "Bearer cdb-t"
+    assert sites == [{"id": SITE_A}]
+
+
+def test_stream_site_events_tags_orders_and_reports_every_site():
+    logs = {"a": [_event(300), _event(100)], "b": [_event(200)], "c": []}
+
+    def open_site(site_id):
+        if site_id == "bad":
+            raise sample.AuthError("no access")
+        return iter(logs[site_id])
+
+    reports = {}
+    merged = list(sample.stream_site_events(
+        ["a", "bad", "b", "c"], open_site, order="desc", workers=2, chunk=1,
+        report=lambda feed: reports.update({feed.site_id: (feed.count, feed.error)})))
+
+    assert [(r["siteId"], r["timestampMs"]) for r in merged] == [
+        ("a", 300), ("b", 200), ("a", 100)]
+    assert reports == {"a": (2, None), "b": (1, None), "c": (0, None),
+                       "bad": (0, "no access")}
+
+
+def test_stream_site_events_reports_any_site_failure_and_never_hangs():
+    def broken_site():
+        yield _event(300)
+        raise requests.exceptions.ChunkedEncodingError("connection reset")
+
+    def open_site(site_id):
+        return broken_site() if site_id == "broken" else iter([_event(200)])
+
+    reports = {}
+    merged = list(sample.stream_site_events(
+        ["broken", "ok"], open_site, workers=2, chunk=1,
+        report=lambda feed: reports.update({feed.site_id: feed.error})))
+
+    assert [(r["siteId"], r["timestampMs"]) for r in merged] == [
+        ("broken", 300), ("ok", 200)]
+    assert "ChunkedEncodingError" in reports["broken"] and reports["ok"] is None
+
+
+def test_stream_site_events_starts_before_the_slowest_site_is_read():
+    slow_done = threading.Event()
+
+    def slow_site():
+        yield _event(500)
+        slow_done.wait(5)      # the rest of this site is still being read ...
+        yield _event(100)
+
+    def open_site(site_id):
+        return slow_site() if site_id == "slow" else iter([_event(400)])
+
+    stream = sample.stream_site_events(["slow", "fast"], open_site, workers=2, chunk=1)
+
+    assert next(stream)["timestampMs"] == 500
+    assert not slow_done.is_set()                   # ... yet the newest is out
+    slow_done.set()
+    assert [r["timestampMs"] for r in stream] == [400, 100]
+
+
+class CloudSession(FakeSession):
+    """Routes by URL, thread-safely: the fan-out reads sites concurrently."""
+
+    def __init__(self, logs):
+        super().__init__()
+        self.logs = logs            # site id -> records (or an HTTP status)
+        self.scopes = []
+        self.revoked = []
+        self.lock = threading.Lock()
+
+    def post(self, url, json=None, timeout=None):
+        with self.lock:
+            self.scopes.append(json.get("scope"))
+        return FakeResponse(200, {"access_token": json.get("scope") or "cdb"})
+
+    def get(self, url, headers=None, params=None, timeout=None, allow_redirects=None,
+            stream=None):
+        with self.lock:
+            self.get_calls.append((url, headers, params, allow_redirects))
+        if url.endswith("/cdb/systems"):
+            return FakeResponse(200, [{"id": site, "name": f"Site {site[0]}"}
+                                      for site in self.logs])
+        site = url.split("//")[1].split(".")[0]
+        assert headers["Authorization"] == f"Bearer cloudSystemId={site}"
+        logs = self.logs[site]
+        return FakeResponse(logs, text="no") if isinstance(logs, int) \
+            else FakeResponse(200, logs)
+
+    def delete(self, url, headers=None, timeout=None):
+        with self.lock:
+            self.revoked.append(headers["Authorization"][len("Bearer "):])
+
+
+def test_main_all_sites_merges_every_site_newest_first(monkeypatch, capsys):
+    session = CloudSession({SITE_A: [_event(3000), _event(1000)],
+                            SITE_B: [_event(2000)],
+                            SITE_C: 403})
+    monkeypatch.setattr(sample, "build_session", lambda **kwargs: session)
+
+    rc = sample.main(["--cloud-host", "https://nxvms.com", "--user", "me@x.com",
+                      "--password", "pw", "--all-sites", "--limit", "2",
+                      "--output", "jsonl", "--workers", "3"])
+
+    assert rc == 0
+    captured = capsys.readouterr()
+    lines = [json.loads(line) for line in captured.out.splitlines()]
+    assert [(r["siteId"], r["timestampMs"]) for r in lines] == [
+        (SITE_A, 3000), (SITE_B, 2000)]               # merged, cut at --limit
+    assert "Site c: FAILED" in captured.err
+    assert sorted(filter(None, session.scopes)) == [
+        f"cloudSystemId={site}" for site in (SITE_A, SITE_B, SITE_C)]
+
+
+def test_main_all_sites_revokes_every_site_token_and_the_account_token(monkeypatch):
+    # SITE_A has more than --limit records left unread, SITE_C fails.
+    session = CloudSession({SITE_A: [_event(3000 - i) for i in range(5)],
+                            SITE_B: [_event(1000)],
+                            SITE_C: 403})
+    monkeypatch.setattr(sample, "build_session", lambda **kwargs: session)
+
+    sample.main(["--cloud-host", "https://nxvms.com", "--user", "me@x.com",
+                 "--password", "pw", "--all-sites", "--limit", "1",
+                 "--output", "jsonl", "--workers", "3", "--page-size", "1"])
+
+    assert sorted(session.revoked) == sorted(
+        ["cdb"] + [f"cloudSystemId={site}" for site in (SITE_A, SITE_B, SITE_C)])
+
+
+def test_closing_the_stream_early_closes_every_opened_site():
+    closed = []
+
+    def site(site_id):
+        try:
+            yield from (_event(t) for t in (300, 200, 100))
+        finally:
+            closed.append(site_id)
+
+    stream = sample.stream_site_events(["a", "b"], site, workers=2, chunk=1)
+    next(stream)
+    stream.close()
+    assert sorted(closed) == ["a", "b"]
+
+
+# ---------------------------------------------------------------------------
+# asyncio front end
+# ---------------------------------------------------------------------------
+
+def test_async_client_reads_log_and_manifest():
+    session = FakeSession(gets=[FakeResponse(200, [RAW_RECORD]),
+                                FakeResponse(200, RAW_MANIFEST)])
+    client = sample.AsyncNxCloudEventLogClient("https://nxvms.com", SYS,
+                                               session=session)
+    client.use_token("nxcdb-t")
+
+    async def flow():
+        return await asyncio.gather(client.get_event_log(1000, 2000, limit=10),
+                                    client.get_event_manifest())
+
+    events, manifest = asyncio.run(flow())
+    asyncio.run(client.logout())
+
+    assert events[0]["event_type"] == "cameraDisconnectEvent"
+    assert manifest["cameraMotionEvent"] == "Motion Detected"
+    assert all(call[1]["Authorization"] == "Bearer nxcdb-t"
+               for call in session.get_calls)
+    assert session.delete_url == "https://nxvms.com/cdb/oauth2/token/nxcdb-t"
+    assert client.token is None
+
+
+def test_async_clients_share_one_bounded_executor():
+    first = sample.AsyncNxCloudEventLogClient("https://nxvms.com", SYS,
+                                              session=FakeSession())
+    second = sample.AsyncNxCloudEventLogClient("https://nxvms.com", "other",
+                                               session=FakeSession())
+    assert first.executor is second.executor is nx_transport.shared_async_executor()
+    assert first.executor._max_workers == nx_transport.ASYNC_CONCURRENCY
+
+
 # ---------------------------------------------------------------------------
 # config
 # ---------------------------------------------------------------------------
@@ -29,9 +29,20 @@ Reference: https://github.com/networkoptix/nx_open_integrations/blob/master/pyth
 import argparse
 import os
 import sys
+from urllib.parse import urlencode
 
 import requests
 
+# nx_transport.py, one folder up, is the HTTP layer every Python sample
+# shares: pooled sessions, logins, the relay 307, the error types, the
+# streaming JSON parser and the fleet crawl.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from nx_transport import (  # noqa: E402
+    CRAWL_WORKERS, INVENTORY_FORMATS, POOL_SIZE, RELAY_SUFFIX, ApiError,
+    AsyncClient, AuthError, RedirectCache, build_session, check_response,
+    cloud_logout_url, crawl_sites, iter_json_array, load_list_file,
+    login_cloud, revoke_token, send_following_redirects, write_inventory)
+
 
 # ---------------------------------------------------------------------------
 # Configuration (CLI > env > .env)
@@ -71,36 +82,26 @@ def resolve_config(cli_args, env_file_values):
     }
 
 
-# ---------------------------------------------------------------------------
-# Errors
-# ---------------------------------------------------------------------------
-
-class AuthError(Exception):
-    """Raised when login or the scoped token is rejected."""
-
-
-class ApiError(Exception):
-    """Raised for any other unexpected API/network failure."""
-
-
-CLIENT_ID = "3rdParty"
-RELAY_SUFFIX = ".relay.vmsproxy.com"
-MAX_REDIRECTS = 5  # Most redirects we will follow when chasing the relay 307.
+# Device fields the table and the inventory use; the listing asks for only
+# these (v4 `_with`), which shrinks what comes back through the relay.
+CAMERA_FIELDS = ["id", "name", "status", "model"]
+STREAM_CHUNK_SIZE = 64 * 1024  # Size of the reads while streaming the list.
 
 
 class NxCloudSiteClient:
     """Gets a site-scoped cloud token, then talks to that one site."""
 
     def __init__(self, cloud_host, user, password, site_id, mfa_code=None,
-                 verify_tls=True, session=None, timeout=15):
+                 verify_tls=True, session=None, timeout=15, redirect_cache=None):
         self.cloud_host = (cloud_host or "").rstrip("/")
         self.user = user
         self.password = password
         self.site_id = site_id
         self.mfa_code = mfa_code
         self.timeout = timeout
-        self.session = session or requests.Session()
+        self.session = session or build_session()
         self.session.verify = verify_tls
+        self.redirect_cache = redirect_cache or RedirectCache()
         self.token = None  # The SITE-SCOPED token.
 
     @property
@@ -109,42 +110,16 @@ class NxCloudSiteClient:
         return f"https://{self.site_id}{RELAY_SUFFIX}"
 
     def login(self):
-        """Get a token SCOPED to self.site_id from the cloud."""
-        url = f"{self.cloud_host}/cdb/oauth2/token"
-        body = {
-            "grant_type": "password",
-            "response_type": "token",
-            "client_id": CLIENT_ID,
-            "username": self.user,
-            "password": self.password,
-            # THIS scope is what makes the token usable against the site.
-            "scope": f"cloudSystemId={self.site_id}",
-        }
-        if self.mfa_code:
-            body["mfaCode"] = self.mfa_code
+        """Get a token SCOPED to self.site_id from the cloud.
 
-        try:
-            response = self.session.post(url, json=body, timeout=self.timeout)
-        except requests.exceptions.RequestException as exc:
-            raise ApiError(f"Could not reach {url}: {exc}") from exc
-
-        if response.status_code in (401, 403):
-            raise AuthError(
-                f"Login rejected (HTTP {response.status_code}). Check credentials, "
-                "the site id, and that the account has access to that site. "
-                "Add --mfa-code for a 2FA account."
-            )
-        if not response.ok:
-            raise ApiError(
-                f"Token request failed: HTTP {response.status_code} "
-                f"{response.text[:200]}")
-        try:
-            data = response.json()
-        except ValueError as exc:
-            raise ApiError("Token response was not valid JSON.") from exc
-        self.token = data.get("access_token")
-        if not self.token:
-            raise ApiError("Token response did not contain an access_token.")
+        THAT scope (cloudSystemId) is what makes the token usable against
+        the site.
+        """
+        self.token = login_cloud(
+            self.session, self.cloud_host, self.user, self.password, self.site_id,
+            self.mfa_code, timeout=self.timeout,
+            rejected="Check credentials, the site id, and that the account has "
+                     "access to that site. Add --mfa-code for a 2FA account.")
         return self.token
 
     def _auth_header(self):
@@ -152,65 +127,76 @@ class NxCloudSiteClient:
             raise ApiError("Not logged in. Call login() first.")
         return {"Authorization": f"Bearer {self.token}"}
 
-    def _get_following_redirects(self, url):
+    def _get_following_redirects(self, url, stream=False):
         """GET that follows 307 redirects MANUALLY, re-attaching the bearer.
 
         The relay replies 307 pointing at the serving node. requests would
         strip the Authorization header across hosts, so we resend it
-        ourselves.
+        ourselves; self.redirect_cache then sends later requests straight
+        to that node. See nx_transport.send_following_redirects().
         """
-        headers = self._auth_header()
-        for _hop in range(MAX_REDIRECTS + 1):
-            try:
-                response = self.session.get(
-                    url, headers=headers, timeout=self.timeout,
-                    allow_redirects=False)
-            except requests.exceptions.RequestException as exc:
-                raise ApiError(f"Could not reach {url}: {exc}") from exc
-            # 301/302/303/307/308 -> follow with the bearer header preserved.
-            if response.status_code in (301, 302, 303, 307, 308):
-                location = response.headers.get("Location")
-                if not location:
-                    raise ApiError(f"Redirect {response.status_code} without a "
-                                   "Location header.")
-                url = location
-                continue
-            return response
-        raise ApiError(f"Too many redirects (>{MAX_REDIRECTS}) chasing the relay.")
+        return send_following_redirects(self.session, "GET", url,
+                                        self._auth_header(), self.redirect_cache,
+                                        timeout=self.timeout, stream=stream)
 
-    def list_cameras(self):
-        """List the site's cameras through the relay using the scoped token."""
-        url = f"{self.relay_url}/rest/v4/devices"
-        response = self._get_following_redirects(url)
+    def iter_cameras(self, fields=CAMERA_FIELDS):
+        """Yield the site's cameras through the relay as the response streams in.
 
-        if response.status_code in (401, 403):
-            raise AuthError(
-                "The site rejected the token. Make sure it was scoped with "
-                "cloudSystemId for THIS site.")
-        if not response.ok:
-            raise ApiError(
-                f"Listing devices failed: HTTP {response.status_code} "
-                f"{response.text[:200]}")
+        Only `fields` are requested (v4 `_with`; None = full device objects).
+        /rest/v4/devices has no paging, so this is still one request -- but
+        the list is never held in memory as a whole. The request is sent on
+        the first next().
+        """
+        url = f"{self.relay_url}/rest/v4/devices"
+        if fields:
+            # In the URL (not params=) so it survives the 307 and the cache.
+            url += "?" + urlencode({"_with": ",".join(fields)}, safe=",")
+        response = self._get_following_redirects(url, stream=True)
         try:
-            data = response.json()
+            check_response(response, "Listing devices", rejected=(
+                "The site rejected the token. Make sure it was scoped with "
+                "cloudSystemId for THIS site."))
+            yield from iter_json_array(response.iter_content(STREAM_CHUNK_SIZE))
+        except requests.exceptions.RequestException as exc:
+            # The body streams after the request returned, so a reset mid-body
+            # surfaces here; as an ApiError it fails this site, not the crawl.
+            raise ApiError(f"Listing devices failed mid-response: {exc}") from exc
         except ValueError as exc:
             raise ApiError("Devices response was not valid JSON.") from exc
-        if isinstance(data, dict) and isinstance(data.get("reply"), list):
-            return data["reply"]
-        return data if isinstance(data, list) else []
+        finally:
+            response.close()
+
+    def list_cameras(self, fields=CAMERA_FIELDS):
+        """List the site's cameras through the relay using the scoped token."""
+        return list(self.iter_cameras(fields))
 
     def logout(self):
         """Delete the scoped token on the cloud. Best-effort cleanup."""
         if not self.token:
             return
-        url = f"{self.cloud_host}/cdb/oauth2/token/{self.token}"
-        try:
-            self.session.delete(url, headers=self._auth_header(),
-                                timeout=self.timeout)
-        except requests.exceptions.RequestException:
-            pass
-        finally:
-            self.token = None
+        revoke_token(self.session, cloud_logout_url(self.cloud_host, self.token),
+                     self.token, timeout=self.timeout)
+        self.token = None
+
+
+# ---------------------------------------------------------------------------
+# asyncio front end
+# ---------------------------------------------------------------------------
+
+class AsyncNxCloudSiteClient(AsyncClient):
+    """asyncio counterpart of NxCloudSiteClient: same methods, as coroutines.
+    Each call holds a thread of the shared pool; see AsyncClient."""
+
+    sync_class = NxCloudSiteClient
+
+    async def login(self):
+        return await self._run(self.sync.login)
+
+    async def list_cameras(self, fields=CAMERA_FIELDS):
+        return await self._run(self.sync.list_cameras, fields)
+
+    async def logout(self):
+        return await self._run(self.sync.logout)
 
 
 # ---------------------------------------------------------------------------
@@ -253,20 +239,74 @@ def build_arg_parser():
     parser.add_argument("--env-file", default=".env", help="Path to a .env file")
     parser.add_argument("--insecure", action="store_true",
                         help="Skip TLS verification (lab use only)")
+    parser.add_argument("--site-ids-file", default=None,
+                        help="File with one cloud Site ID per line: list the cameras of all of them")
+    parser.add_argument("--workers", type=int, default=CRAWL_WORKERS,
+                        help="Sites crawled at once with --site-ids-file")
+    parser.add_argument("--format", choices=INVENTORY_FORMATS, default="jsonl",
+                        help="Inventory output format with --site-ids-file")
+    parser.add_argument("--out", default=None,
+                        help="Write the --site-ids-file inventory here (default: stdout)")
     return parser
 
 
+def _main_fleet(args, config):
+    """--site-ids-file: crawl every site in the file, stream the inventory."""
+    try:
+        sites = load_list_file(args.site_ids_file)
+    except OSError as exc:
+        print(f"Could not read {args.site_ids_file}: {exc}", file=sys.stderr)
+        return 2
+    if args.workers < 1:
+        print("--workers must be at least 1.", file=sys.stderr)
+        return 2
+    if config["mfa_code"]:
+        print("--site-ids-file needs one login per site, which a one-time 2FA "
+              "code can't cover.", file=sys.stderr)
+        return 2
+    # One pooled session for the whole crawl: connections are reused per host,
+    # and each of the --workers threads can keep one open to a host.
+    session = build_session(pool_size=max(POOL_SIZE, args.workers))
+
+    def list_site(site):
+        client = NxCloudSiteClient(
+            cloud_host=config["cloud_host"], user=config["user"],
+            password=config["password"], site_id=site,
+            verify_tls=not args.insecure, session=session)
+        try:
+            client.login()
+            return client.list_cameras()
+        finally:
+            client.logout()
+
+    out = open(args.out, "w", newline="", encoding="utf-8") if args.out else sys.stdout
+    try:
+        total, written, failed = write_inventory(
+            crawl_sites(sites, list_site, args.workers), out, args.format,
+            log=sys.stderr)
+    finally:
+        if args.out:
+            out.close()
+    print(f"{total} sites, {written} cameras, {failed} failed.", file=sys.stderr)
+    return 1 if failed else 0
+
+
 def main(argv=None):
     args = build_arg_parser().parse_args(argv)
     config = resolve_config(args, load_env_file(args.env_file))
 
     required = ("cloud_host", "user", "password", "site_id")
+    if args.site_ids_file:
+        # The sites come from the file; the token is scoped per site there.
+        required = ("cloud_host", "user", "password")
     missing = [name for name in required if not config[name]]
     if missing:
         print("Missing config: " + ", ".join(missing) +
               ".\nProvide via flags or .env (copy .env.example). See the README.",
               file=sys.stderr)
         return 2
+    if args.site_ids_file:
+        return _main_fleet(args, config)
 
     client = NxCloudSiteClient(
         cloud_host=config["cloud_host"], user=config["user"],
@@ -6,10 +6,14 @@ Run from this folder:  pytest -v
 """
 
 import argparse
+import asyncio
+import json
 
 import pytest
+import requests
 
 import rest_cloud_sample as sample
+import nx_transport  # on sys.path once the sample is imported
 
 
 class FakeResponse:
@@ -28,6 +32,15 @@ class FakeResponse:
             raise ValueError("no json")
         return self._json
 
+    def iter_content(self, chunk_size=None):
+        # Small chunks on purpose: items get split across chunk boundaries.
+        body = json.dumps(self._json).encode("utf-8") if self._json is not None else b""
+        for start in range(0, len(body), 7):
+            yield body[start:start + 7]
+
+    def close(self):
+        pass
+
 
 class FakeSession:
     """Serves queued GET responses in order (for redirect-chasing tests);
@@ -46,7 +59,7 @@ class FakeSession:
         self.post_url, self.post_json = url, json
         return self._post
 
-    def get(self, url, headers=None, timeout=None, allow_redirects=None):
+    def get(self, url, headers=None, timeout=None, allow_redirects=None, stream=None):
         self.get_calls.append((url, headers, allow_redirects))
         return self._gets.pop(0)
 
@@ -55,6 +68,9 @@ class FakeSession:
         self.delete_calls += 1
         return self._delete
 
+    def request(self, method, url, **kwargs):
+        return getattr(self, method.lower())(url, **kwargs)
+
     # -- back-compat helpers used by the pre-existing single-GET tests --
     @property
     def get_url(self):
@@ -124,11 +140,26 @@ def test_list_cameras_uses_relay_and_bearer():
     cams = client.list_cameras()
 
     assert cams[0]["name"] == "Lobby"
-    assert session.get_url == f"https://{SYS}.relay.vmsproxy.com/rest/v4/devices"
+    # Only the fields the table shows are requested (v4 `_with`).
+    assert session.get_url == (f"https://{SYS}.relay.vmsproxy.com/rest/v4/devices"
+                               "?_with=id,name,status,model")
     assert session.get_headers["Authorization"] == "Bearer nxcdb-t"
     assert session.get_kwargs["allow_redirects"] is False
 
 
+def test_iter_cameras_streams_items_and_full_objects_skip_the_projection():
+    payload = [{"id": f"c{i}", "name": f"Cam \u00e9 {i}"} for i in range(50)]
+    session = FakeSession(get=FakeResponse(200, payload))
+    client = make_client(session=session)
+    client.token = "t"
+
+    cams = client.iter_cameras(fields=None)
+    assert session.get_calls == []            # nothing sent until iterated
+    assert next(cams) == payload[0]
+    assert list(cams) == payload[1:]
+    assert session.get_url == f"https://{SYS}.relay.vmsproxy.com/rest/v4/devices"
+
+
 def test_list_cameras_unwraps_reply_envelope():
     session = FakeSession(get=FakeResponse(200, {"reply": [{"id": "c1", "name": "L"}]}))
     client = make_client(session=session)
@@ -136,6 +167,18 @@ def test_list_cameras_unwraps_reply_envelope():
     assert client.list_cameras()[0]["name"] == "L"
 
 
+def test_iter_cameras_turns_a_reset_mid_body_into_api_error():
+    class Reset(FakeResponse):
+        def iter_content(self, chunk_size=None):
+            yield b'[{"id": "c1"}, '
+            raise requests.exceptions.ChunkedEncodingError("connection reset")
+
+    client = make_client(session=FakeSession(get=Reset(200)))
+    client.token = "t"
+    with pytest.raises(sample.ApiError, match="connection reset"):
+        client.list_cameras()
+
+
 def test_list_cameras_without_login_raises():
     with pytest.raises(sample.ApiError):
         make_client(session=FakeSession()).list_cameras()
@@ -161,6 +204,29 @@ def test_list_cameras_follows_307_with_bearer_preserved():
     assert cams[0]["name"] == "Lobby"
 
 
+def test_list_cameras_reuses_cached_node_until_it_fails():
+    query = "?_with=id,name,status,model"
+    relay = f"https://{SYS}.relay.vmsproxy.com/rest/v4/devices" + query
+    node = "https://node7.relay.vmsproxy.com/rest/v4/devices" + query
+    session = FakeSession(gets=[
+        FakeResponse(307, headers={"Location": node}),
+        FakeResponse(200, []),
+        FakeResponse(200, []),                          # cache hit: one hop
+        FakeResponse(502),                              # cached node gone ...
+        FakeResponse(307, headers={"Location": node}),  # ... ask the relay
+        FakeResponse(200, []),
+    ])
+    client = make_client(session=session)
+    client.token = "t"
+
+    for _ in range(3):
+        client.list_cameras()
+
+    assert [call[0] for call in session.get_calls] == [
+        relay, node, node, node, relay, node]
+    assert all(call[1]["Authorization"] == "Bearer t" for call in session.get_calls)
+
+
 def test_list_cameras_redirect_without_location_raises():
     session = FakeSession(gets=[FakeResponse(307, headers={})])
     client = make_client(session=session)
@@ -173,7 +239,7 @@ def test_list_cameras_too_many_redirects_raises():
     node = "https://node7.relay.vmsproxy.com/rest/v4/devices"
     # One more 307 than MAX_REDIRECTS allows -> should give up.
     session = FakeSession(
-        gets=[FakeResponse(307, headers={"Location": node})] * (sample.MAX_REDIRECTS + 1)
+        gets=[FakeResponse(307, headers={"Location": node})] * (nx_transport.MAX_REDIRECTS + 1)
     )
     client = make_client(session=session)
     client.token = "t"
@@ -196,6 +262,86 @@ def test_logout_deletes_token_on_cloud():
     assert client.token is None
 
 
+# ---------------------------------------------------------------------------
+# asyncio front end
+# ---------------------------------------------------------------------------
+
+def test_async_client_logs_in_and_lists_cameras_via_the_relay():
+    node = "https://node7.relay.vmsproxy.com/rest/v4/devices"
+    session = FakeSession(post=FakeResponse(200, {"access_token": "nxcdb-t"}), gets=[
+        FakeResponse(307, headers={"Location": node}),
+        FakeResponse(200, [{"id": "c1", "name": "Lobby"}]),
+    ])
+    client = sample.AsyncNxCloudSiteClient("https://nxvms.com", "me@x.com", "pw",
+                                           SYS, session=session)
+
+    async def flow():
+        await client.login()
+        return await client.list_cameras()
+
+    cams = asyncio.run(flow())
+
+    assert session.post_json["scope"] == f"cloudSystemId={SYS}"
+    assert session.get_calls[1][0] == node
+    assert session.get_calls[1][1]["Authorization"] == "Bearer nxcdb-t"
+    assert cams[0]["name"] == "Lobby"
+
+
+# ---------------------------------------------------------------------------
+# Fleet inventory (--site-ids-file)
+# ---------------------------------------------------------------------------
+
+def test_main_site_ids_file_scopes_a_token_per_site_and_streams_csv(
+        tmp_path, monkeypatch, capsys):
+    ids = tmp_path / "sites.txt"
+    ids.write_text("# two sites\nsite-a\nsite-b\n")
+    scopes = []
+
+    class CrawlSession(FakeSession):
+        def post(self, url, json=None, timeout=None):
+            scopes.append(json["scope"])
+            return FakeResponse(200, {"access_token": "tok-" + json["scope"][-1]})
+
+        def get(self, url, headers=None, timeout=None, allow_redirects=None, stream=None):
+            site = url.split("//")[1].split(".")[0]
+            return FakeResponse(200, [{"id": "cam-" + site, "name": "Lobby"}])
+
+    session = CrawlSession(delete=FakeResponse(204))
+    pool_sizes = []
+
+    def fake_build_session(pool_size=sample.POOL_SIZE):
+        pool_sizes.append(pool_size)
+        return session
+
+    monkeypatch.setattr(sample, "build_session", fake_build_session)
+
+    rc = sample.main(["--site-ids-file", str(ids), "--cloud-host", "https://nxvms.com",
+                      "--user", "me@x.com", "--password", "pw", "--format", "csv",
+                      "--workers", "40", "--env-file", str(tmp_path / "none")])
+
+    assert rc == 0
+    assert sorted(scopes) == ["cloudSystemId=site-a", "cloudSystemId=site-b"]
+    captured = capsys.readouterr()
+    lines = captured.out.splitlines()
+    assert lines[0] == "site,id,name,status,model"
+    assert sorted(lines[1:]) == ["site-a,cam-site-a,Lobby,,", "site-b,cam-site-b,Lobby,,"]
+    assert "2 sites, 2 cameras, 0 failed." in captured.err
+    assert pool_sizes == [40]  # a connection per worker
+
+
+def test_main_site_ids_file_refuses_a_one_time_mfa_code(tmp_path, monkeypatch, capsys):
+    ids = tmp_path / "sites.txt"
+    ids.write_text("site-a\nsite-b\n")
+    monkeypatch.setattr(sample, "build_session", lambda **kwargs: FakeSession())
+
+    rc = sample.main(["--site-ids-file", str(ids), "--cloud-host", "https://nxvms.com",
+                      "--user", "me@x.com", "--password", "pw", "--mfa-code", "123456",
+                      "--env-file", str(tmp_path / "none.env")])
+
+    assert rc == 2
+    assert "2FA" in capsys.readouterr().err
+
+
 # ---------------------------------------------------------------------------
 # config
 # ---------------------------------------------------------------------------
@@ -24,11 +24,23 @@ Reference: https://meta.nxvms.com/doc/developers/api-tool/main?type=1
 """
 
 import argparse
+import hashlib
+import json
 import os
 import sys
 
 import requests
 
+# nx_transport.py, one folder up, is the HTTP layer every Python sample
+# shares: pooled sessions, logins, the error types, the streaming JSON
+# parser and the fleet crawl.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from nx_transport import (  # noqa: E402
+    API, CRAWL_WORKERS, INVENTORY_FORMATS, POOL_SIZE, ApiError, AsyncClient,
+    AuthError, build_session, check_response, crawl_sites, iter_json_array,
+    load_list_file, local_logout_url, login_local, revoke_token,
+    write_inventory)
+
 
 # ---------------------------------------------------------------------------
 # Configuration (CLI > env > .env). Server vars are NX_SERVER_*.
@@ -66,24 +78,19 @@ def resolve_config(cli_args, env_file_values):
     }
 
 
-# ---------------------------------------------------------------------------
-# Errors
-# ---------------------------------------------------------------------------
-
-class AuthError(Exception):
-    """Raised when the server rejects the credentials or token."""
-
-
-class ApiError(Exception):
-    """Raised for any other unexpected API/network failure."""
-
-
 # ---------------------------------------------------------------------------
 # Client
 # ---------------------------------------------------------------------------
 
-# API version path segment. v4 is the latest Nx REST API.
-API = "/rest/v4"
+# Device fields the table and the inventory use; the listing asks for only
+# these (v4 `_with`), which shrinks the response a lot on big sites.
+CAMERA_FIELDS = ["id", "name", "status", "model"]
+# Size of the reads while streaming the device list (bytes).
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Device fields whose change shows up as "changed" in a --snapshot diff.
+SNAPSHOT_FIELDS = ["name", "status", "model", "url"]
+SNAPSHOT_VERSION = 1
 
 
 class NxServerClient:
@@ -94,20 +101,15 @@ class NxServerClient:
         self.user = user
         self.password = password
         self.timeout = timeout
-        self.session = session or requests.Session()
+        self.session = session or build_session()
         self.session.verify = verify_tls
         self.token = None
 
     def _check(self, response, what):
         """Shared response validation -> typed errors + parsed JSON."""
-        if response.status_code in (401, 403):
-            raise AuthError(
-                f"{what} unauthorized (HTTP {response.status_code}). Check the "
-                "username/password, and that you are using a local (not cloud) user."
-            )
-        if not response.ok:
-            raise ApiError(
-                f"{what} failed: HTTP {response.status_code} {response.text[:200]}")
+        check_response(response, what, rejected=(
+            f"{what} unauthorized (HTTP {response.status_code}). Check the "
+            "username/password, and that you are using a local (not cloud) user."))
         try:
             return response.json()
         except ValueError as exc:
@@ -115,16 +117,10 @@ class NxServerClient:
 
     def login(self):
         """POST credentials, receive a bearer token, remember it."""
-        url = f"{self.host}{API}/login/sessions"
-        body = {"username": self.user, "password": self.password, "setCookie": False}
-        try:
-            response = self.session.post(url, json=body, timeout=self.timeout)
-        except requests.exceptions.RequestException as exc:
-            raise ApiError(f"Could not reach {url}: {exc}") from exc
-        data = self._check(response, "Login")
-        self.token = data.get("token")
-        if not self.token:
-            raise ApiError("Login response did not contain a token.")
+        self.token = login_local(
+            self.session, self.host, self.user, self.password, timeout=self.timeout,
+            rejected="Check the username/password, and that you are using a "
+                     "local (not cloud) user.")
         return self.token
 
     def _auth_header(self):
@@ -132,32 +128,68 @@ class NxServerClient:
             raise ApiError("Not logged in. Call login() first.")
         return {"Authorization": f"Bearer {self.token}"}
 
-    def list_cameras(self):
-        """GET the devices (cameras) on this site using the bearer token."""
+    def iter_cameras(self, fields=CAMERA_FIELDS):
+        """Yield the devices (cameras) on this site as the response streams in.
+
+        Only `fields` are requested (v4 `_with`; None = full device objects).
+        /rest/v4/devices has no paging, so this is still one request -- but
+        the list is never held in memory as a whole. The request is sent on
+        the first next().
+        """
         url = f"{self.host}{API}/devices"
+        params = {"_with": ",".join(fields)} if fields else None
         try:
             response = self.session.get(
-                url, headers=self._auth_header(), timeout=self.timeout)
+                url, headers=self._auth_header(), params=params,
+                timeout=self.timeout, stream=True)
         except requests.exceptions.RequestException as exc:
             raise ApiError(f"Could not reach {url}: {exc}") from exc
-        data = self._check(response, "Listing devices")
-        # Some Nx versions wrap the array in a {"reply": [...]} envelope.
-        if isinstance(data, dict) and isinstance(data.get("reply"), list):
-            return data["reply"]
-        return data if isinstance(data, list) else []
+        try:
+            if not response.ok:
+                self._check(response, "Listing devices")
+            # Some Nx versions wrap the array in a {"reply": [...]} envelope;
+            # iter_json_array() unwraps it.
+            yield from iter_json_array(response.iter_content(STREAM_CHUNK_SIZE))
+        except requests.exceptions.RequestException as exc:
+            # The body streams after the request returned, so a reset mid-body
+            # surfaces here; as an ApiError it fails this site, not the crawl.
+            raise ApiError(f"Listing devices failed mid-response: {exc}") from exc
+        except ValueError as exc:
+            raise ApiError("Listing devices: response was not valid JSON.") from exc
+        finally:
+            response.close()
+
+    def list_cameras(self, fields=CAMERA_FIELDS):
+        """GET the devices (cameras) on this site using the bearer token."""
+        return list(self.iter_cameras(fields))
 
     def logout(self):
         """DELETE the session so the token cannot be reused. Best-effort."""
         if not self.token:
             return
-        url = f"{self.host}{API}/login/sessions/{self.token}"
-        try:
-            self.session.delete(url, headers=self._auth_header(), timeout=self.timeout)
-        except requests.exceptions.RequestException:
-            # Logout is cleanup; never let it crash the program.
-            pass
-        finally:
-            self.token = None
+        revoke_token(self.session, local_logout_url(self.host, self.token),
+                     self.token, timeout=self.timeout)
+        self.token = None
+
+
+# ---------------------------------------------------------------------------
+# asyncio front end
+# ---------------------------------------------------------------------------
+
+class AsyncNxServerClient(AsyncClient):
+    """asyncio counterpart of NxServerClient: same methods, as coroutines.
+    Each call holds a thread of the shared pool; see AsyncClient."""
+
+    sync_class = NxServerClient
+
+    async def login(self):
+        return await self._run(self.sync.login)
+
+    async def list_cameras(self, fields=CAMERA_FIELDS):
+        return await self._run(self.sync.list_cameras, fields)
+
+    async def logout(self):
+        return await self._run(self.sync.logout)
 
 
 # ---------------------------------------------------------------------------
@@ -183,6 +215,91 @@ def format_cameras_table(cameras):
     )
 
 
+# ---------------------------------------------------------------------------
+# Snapshot diff (--snapshot): what changed since the last run
+# ---------------------------------------------------------------------------
+
+def camera_fingerprint(cam, fields=SNAPSHOT_FIELDS):
+    """Short content hash of the tracked fields of one device."""
+    picked = json.dumps([cam.get(field) for field in fields], default=str)
+    return hashlib.sha1(picked.encode("utf-8")).hexdigest()[:16]
+
+
+def snapshot_entries(site, cameras):
+    """Yield (device id, [fingerprint, name, site]) for each camera with an id."""
+    for cam in cameras:
+        device_id = cam.get("id")
+        if device_id:
+            yield str(device_id), [camera_fingerprint(cam), str(cam.get("name", "")), site]
+
+
+def load_snapshot(path):
+    """The {id: [fingerprint, name, site]} index from save_snapshot(), or {}
+    on the first run. Raises ValueError for a file this sample didn't write
+    (or wrote while tracking other fields)."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as handle:
+        data = json.load(handle)
+    if (not isinstance(data, dict) or data.get("version") != SNAPSHOT_VERSION
+            or data.get("fields") != SNAPSHOT_FIELDS
+            or not isinstance(data.get("cameras"), dict)):
+        raise ValueError(f"{path} is not a camera snapshot of this sample "
+                         "version; delete it to start a new one.")
+    return data["cameras"]
+
+
+def save_snapshot(path, cameras):
+    """Write the index atomically (temp file + rename): a crash mid-write
+    leaves the previous snapshot intact."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as handle:
+        json.dump({"version": SNAPSHOT_VERSION, "fields": SNAPSHOT_FIELDS,
+                   "cameras": cameras}, handle, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+def diff_snapshots(old, new, unreachable=()):
+    """Yield ("added" | "removed" | "changed", id, entry) between two indexes.
+
+    Only differences are yielded. Cameras of sites in `unreachable` (they
+    failed this run) are copied from `old` into `new` instead of being
+    reported as removed, so the next snapshot still knows about them.
+    """
+    unreachable = set(unreachable)
+    for device_id, entry in old.items():
+        if device_id in new:
+            continue
+        if entry[2] in unreachable:
+            new[device_id] = entry
+        else:
+            yield "removed", device_id, entry
+    for device_id, entry in new.items():
+        before = old.get(device_id)
+        if before is None:
+            yield "added", device_id, entry
+        elif before[0] != entry[0]:
+            yield "changed", device_id, entry
+
+
+def format_diff_line(kind, device_id, entry):
+    """One line per change: '+' added, '-' removed, '~' changed."""
+    mark = {"added": "+", "removed": "-", "changed": "~"}[kind]
+    return f"{mark} {device_id}  {entry[1]}  ({entry[2]})"
+
+
+def report_snapshot_diff(path, old, new, unreachable=(), out=None):
+    """Print the diff against `old`, save `new` as the next snapshot, and
+    return {added, removed, changed} counts."""
+    out = out or sys.stdout
+    counts = {"added": 0, "removed": 0, "changed": 0}
+    for kind, device_id, entry in diff_snapshots(old, new, unreachable):
+        counts[kind] += 1
+        print(format_diff_line(kind, device_id, entry), file=out)
+    save_snapshot(path, new)
+    return counts
+
+
 # ---------------------------------------------------------------------------
 # CLI
 # ---------------------------------------------------------------------------
@@ -197,19 +314,114 @@ def build_arg_parser():
     parser.add_argument("--env-file", default=".env", help="Path to a .env file")
     parser.add_argument("--insecure", action="store_true",
                         help="Skip TLS verification (usually needed for local servers)")
+    parser.add_argument("--hosts-file", default=None,
+                        help="File with one server URL per line: list the cameras of all of them")
+    parser.add_argument("--workers", type=int, default=CRAWL_WORKERS,
+                        help="Sites crawled at once with --hosts-file")
+    parser.add_argument("--format", choices=INVENTORY_FORMATS, default="jsonl",
+                        help="Inventory output format with --hosts-file")
+    parser.add_argument("--out", default=None,
+                        help="Write the --hosts-file inventory here (default: stdout)")
+    parser.add_argument("--snapshot", default=None,
+                        help="Snapshot file: print only cameras added/removed/changed "
+                             "since the last run, then update it")
     return parser
 
 
+def _load_snapshot_arg(args):
+    """The previous --snapshot index, or None (after printing why) if unusable."""
+    try:
+        return load_snapshot(args.snapshot)
+    except (OSError, ValueError) as exc:
+        print(f"Cannot use snapshot {args.snapshot}: {exc}", file=sys.stderr)
+        return None
+
+
+def _listing_fields(args):
+    """Device fields to request: the table's, plus the tracked ones for --snapshot."""
+    if not args.snapshot:
+        return CAMERA_FIELDS
+    return CAMERA_FIELDS + [f for f in SNAPSHOT_FIELDS if f not in CAMERA_FIELDS]
+
+
+def _print_diff_summary(counts, total):
+    print(f"{counts['added']} added, {counts['removed']} removed, "
+          f"{counts['changed']} changed ({total} cameras).", file=sys.stderr)
+
+
+def _main_fleet(args, config):
+    """--hosts-file: crawl every server in the file, stream the inventory."""
+    try:
+        sites = load_list_file(args.hosts_file)
+    except OSError as exc:
+        print(f"Could not read {args.hosts_file}: {exc}", file=sys.stderr)
+        return 2
+    if args.workers < 1:
+        print("--workers must be at least 1.", file=sys.stderr)
+        return 2
+    previous = _load_snapshot_arg(args) if args.snapshot else {}
+    if previous is None:
+        return 2
+    # One pooled session for the whole crawl: connections are reused per host,
+    # and each of the --workers threads can keep one open to a host.
+    session = build_session(pool_size=max(POOL_SIZE, args.workers))
+
+    def list_site(site):
+        client = NxServerClient(site, config["user"], config["password"],
+                                verify_tls=not args.insecure, session=session)
+        try:
+            client.login()
+            return client.list_cameras(_listing_fields(args))
+        finally:
+            client.logout()
+
+    current, unreachable = {}, set()
+
+    def tracked(results):
+        # Feed the snapshot index as each site's result streams past.
+        for result in results:
+            if result["error"]:
+                unreachable.add(result["site"])
+            else:
+                current.update(snapshot_entries(result["site"], result["cameras"]))
+            yield result
+
+    # With --snapshot, stdout carries the diff; the inventory only goes to --out.
+    if args.out:
+        out = open(args.out, "w", newline="", encoding="utf-8")
+    else:
+        out = open(os.devnull, "w") if args.snapshot else sys.stdout
+    try:
+        total, written, failed = write_inventory(
+            tracked(crawl_sites(sites, list_site, args.workers)), out, args.format,
+            log=sys.stderr)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f"{total} sites, {written} cameras, {failed} failed.", file=sys.stderr)
+    if args.snapshot:
+        counts = report_snapshot_diff(args.snapshot, previous, current, unreachable)
+        _print_diff_summary(counts, len(current))
+    return 1 if failed else 0
+
+
 def main(argv=None):
     args = build_arg_parser().parse_args(argv)
     config = resolve_config(args, load_env_file(args.env_file))
 
-    missing = [name for name in ("host", "user", "password") if not config[name]]
+    # With --hosts-file the servers come from the file, not --host.
+    required = ("user", "password") if args.hosts_file else ("host", "user", "password")
+    missing = [name for name in required if not config[name]]
     if missing:
         print("Missing config: " + ", ".join(missing) +
               ".\nProvide via flags or .env (copy .env.example). See the README.",
               file=sys.stderr)
         return 2
+    if args.hosts_file:
+        return _main_fleet(args, config)
+    previous = _load_snapshot_arg(args) if args.snapshot else {}
+    if previous is None:
+        return 2
 
     client = NxServerClient(
         host=config["host"], user=config["user"], password=config["password"],
@@ -218,6 +430,12 @@ def main(argv=None):
 
     try:
         client.login()
+        if args.snapshot:
+            current = dict(snapshot_entries(
+                config["host"], client.iter_cameras(_listing_fields(args))))
+            counts = report_snapshot_diff(args.snapshot, previous, current)
+            _print_diff_summary(counts, len(current))
+            return 0
         print(f"Logged in to {config['host']} as {config['user']}\n")
         print(format_cameras_table(client.list_cameras()))
         return 0
@@ -6,8 +6,13 @@ Run from this folder:  pytest -v
 """
 
 import argparse
+import asyncio
+import json
+import threading
+import time
 
 import pytest
+import requests
 
 import rest_list_cameras as sample
 
@@ -31,6 +36,15 @@ class FakeResponse:
             raise ValueError("no json")
         return self._json
 
+    def iter_content(self, chunk_size=None):
+        # Small chunks on purpose: items get split across chunk boundaries.
+        body = json.dumps(self._json).encode("utf-8") if self._json is not None else b""
+        for start in range(0, len(body), 7):
+            yield body[start:start + 7]
+
+    def close(self):
+        pass
+
 
 class FakeSession:
     """Serves queued responses per verb and records calls (incl. DELETE count)."""
@@ -39,7 +53,7 @@ class FakeSession:
         self.verify = None
         self._post, self._get, self._delete = post, get, delete
         self.post_url = self.post_json = None
-        self.get_url = self.get_headers = None
+        self.get_url = self.get_headers = self.get_params = None
         self.delete_url = None
         self.delete_calls = 0
 
@@ -47,8 +61,8 @@ class FakeSession:
         self.post_url, self.post_json = url, json
         return self._post
 
-    def get(self, url, headers=None, timeout=None):
-        self.get_url, self.get_headers = url, headers
+    def get(self, url, headers=None, params=None, timeout=None, stream=None):
+        self.get_url, self.get_headers, self.get_params = url, headers, params
         return self._get
 
     def delete(self, url, headers=None, timeout=None):
@@ -124,6 +138,39 @@ def test_list_cameras_without_login_raises():
         client.list_cameras()
 
 
+def test_list_cameras_asks_only_for_the_table_fields():
+    session = FakeSession(get=FakeResponse(200, []))
+    client = sample.NxServerClient("https://srv:7001", "admin", "pw", session=session)
+    client.token = "abc123"
+
+    client.list_cameras()
+    assert session.get_params == {"_with": "id,name,status,model"}
+
+    client.list_cameras(fields=None)        # full device objects
+    assert session.get_params is None
+
+
+def test_iter_cameras_raises_typed_errors_on_bad_status():
+    session = FakeSession(get=FakeResponse(403, text="no"))
+    client = sample.NxServerClient("https://srv:7001", "admin", "pw", session=session)
+    client.token = "abc123"
+    with pytest.raises(sample.AuthError):
+        list(client.iter_cameras())
+
+
+def test_iter_cameras_turns_a_reset_mid_body_into_api_error():
+    class Reset(FakeResponse):
+        def iter_content(self, chunk_size=None):
+            yield b'[{"id": "c1"}, '
+            raise requests.exceptions.ChunkedEncodingError("connection reset")
+
+    session = FakeSession(get=Reset(200))
+    client = sample.NxServerClient("https://srv:7001", "admin", "pw", session=session)
+    client.token = "abc123"
+    with pytest.raises(sample.ApiError, match="connection reset"):
+        list(client.iter_cameras())
+
+
 # ---------------------------------------------------------------------------
 # logout()
 # ---------------------------------------------------------------------------
@@ -147,6 +194,157 @@ def test_logout_without_token_is_noop():
     assert session.delete_calls == 0
 
 
+# ---------------------------------------------------------------------------
+# asyncio front end
+# ---------------------------------------------------------------------------
+
+def test_async_client_runs_the_same_flow_as_the_sync_one():
+    session = FakeSession(post=FakeResponse(200, {"token": "abc123"}),
+                          get=FakeResponse(200, [{"id": "c1", "name": "Lobby"}]),
+                          delete=FakeResponse(204))
+    client = sample.AsyncNxServerClient("https://srv:7001", "admin", "pw",
+                                        session=session)
+
+    async def flow():
+        await client.login()
+        cams = await client.list_cameras()
+        await client.logout()
+        return cams
+
+    cams = asyncio.run(flow())
+
+    assert cams[0]["name"] == "Lobby"
+    assert session.get_headers["Authorization"] == "Bearer abc123"
+    assert session.delete_calls == 1
+    assert client.token is None
+
+
+def test_async_clients_sharing_a_limiter_never_exceed_it():
+    class SlowSession(FakeSession):
+        def __init__(self):
+            super().__init__(get=FakeResponse(200, []))
+            self.active = self.peak = 0
+            self._lock = threading.Lock()
+
+        def get(self, url, headers=None, params=None, timeout=None, stream=None):
+            with self._lock:
+                self.active += 1
+                self.peak = max(self.peak, self.active)
+            time.sleep(0.02)
+            with self._lock:
+                self.active -= 1
+            return super().get(url, headers, params, timeout, stream)
+
+    session = SlowSession()
+
+    async def crawl():
+        limiter = asyncio.Semaphore(2)
+        clients = [sample.AsyncNxServerClient(f"https://srv{i}:7001", "admin", "pw",
+                                              session=session, limiter=limiter)
+                   for i in range(6)]
+        for client in clients:
+            client.sync.token = "t"
+        return await asyncio.gather(*(c.list_cameras() for c in clients))
+
+    assert asyncio.run(crawl()) == [[]] * 6
+    assert session.peak <= 2
+
+
+# ---------------------------------------------------------------------------
+# Fleet inventory (--hosts-file)
+# ---------------------------------------------------------------------------
+
+def test_main_hosts_file_streams_a_merged_inventory(tmp_path, monkeypatch, capsys):
+    hosts = tmp_path / "hosts.txt"
+    hosts.write_text("https://a:7001\nhttps://b:7001\n")
+    session = FakeSession(post=FakeResponse(200, {"token": "t"}),
+                          get=FakeResponse(200, [{"id": "c1", "name": "Lobby"}]),
+                          delete=FakeResponse(204))
+    pool_sizes = []
+
+    def fake_build_session(pool_size=sample.POOL_SIZE):
+        pool_sizes.append(pool_size)
+        return session
+
+    monkeypatch.setattr(sample, "build_session", fake_build_session)
+
+    rc = sample.main(["--hosts-file", str(hosts), "--user", "admin",
+                      "--password", "pw", "--workers", "40",
+                      "--env-file", str(tmp_path / "none")])
+
+    assert rc == 0
+    captured = capsys.readouterr()
+    rows = [json.loads(line) for line in captured.out.splitlines()]
+    assert len(rows) == 1 and rows[0]["id"] == "c1"   # same camera via both servers
+    assert "2 sites, 1 cameras, 0 failed." in captured.err
+    assert session.delete_calls == 2                    # every session logged out
+    assert pool_sizes == [40]                           # a connection per worker
+
+
+# ---------------------------------------------------------------------------
+# Snapshot diff (--snapshot)
+# ---------------------------------------------------------------------------
+
+def _index(site, *cams):
+    return dict(sample.snapshot_entries(site, cams))
+
+
+def test_diff_snapshots_reports_only_added_removed_and_changed():
+    old = _index("https://a", {"id": "c1", "name": "Lobby", "status": "Online"},
+                 {"id": "c2", "name": "Door"}, {"id": "c3", "name": "Dock"})
+    new = _index("https://a", {"id": "c1", "name": "Lobby", "status": "Offline"},
+                 {"id": "c2", "name": "Door"}, {"id": "c4", "name": "Gate"})
+
+    changes = sorted((kind, device_id) for kind, device_id, _ in
+                     sample.diff_snapshots(old, new))
+
+    assert changes == [("added", "c4"), ("changed", "c1"), ("removed", "c3")]
+    assert sample.format_diff_line("added", "c4", new["c4"]) == "+ c4  Gate  (https://a)"
+
+
+def test_diff_snapshots_keeps_cameras_of_unreachable_sites():
+    old = {**_index("https://a", {"id": "c1"}), **_index("https://b", {"id": "c2"})}
+    new = _index("https://a", {"id": "c1"})
+
+    assert list(sample.diff_snapshots(old, new, unreachable={"https://b"})) == []
+    assert "c2" in new   # carried into the next snapshot
+
+
+def test_snapshot_round_trips_and_rejects_foreign_files(tmp_path):
+    path = str(tmp_path / "cams.json")
+    assert sample.load_snapshot(path) == {}
+    index = _index("https://a", {"id": "c1", "name": "Lobby"})
+    sample.save_snapshot(path, index)
+    assert sample.load_snapshot(path) == index
+    assert not (tmp_path / "cams.json.tmp").exists()
+
+    (tmp_path / "other.json").write_text('{"cameras": []}')
+    with pytest.raises(ValueError):
+        sample.load_snapshot(str(tmp_path / "other.json"))
+
+
+def test_main_snapshot_prints_the_diff_since_the_last_run(tmp_path, monkeypatch, capsys):
+    snap = str(tmp_path / "cams.json")
+    sample.save_snapshot(snap, _index("https://srv:7001", {"id": "c1", "name": "Lobby"},
+                                      {"id": "c2", "name": "Door"}))
+    session = FakeSession(post=FakeResponse(200, {"token": "t"}),
+                          get=FakeResponse(200, [{"id": "c1", "name": "Lobby"},
+                                                 {"id": "c9", "name": "Gate"}]),
+                          delete=FakeResponse(204))
+    monkeypatch.setattr(sample, "build_session", lambda **kwargs: session)
+
+    rc = sample.main(["--host", "https://srv:7001", "--user", "admin",
+                      "--password", "pw", "--snapshot", snap,
+                      "--env-file", str(tmp_path / "none")])
+
+    assert rc == 0
+    captured = capsys.readouterr()
+    assert sorted(captured.out.splitlines()) == [
+        "+ c9  Gate  (https://srv:7001)", "- c2  Door  (https://srv:7001)"]
+    assert "1 added, 1 removed, 0 changed (2 cameras)." in captured.err
+    assert set(sample.load_snapshot(snap)) == {"c1", "c9"}
+
+
 # ---------------------------------------------------------------------------
 # config + table
 # ---------------------------------------------------------------------------
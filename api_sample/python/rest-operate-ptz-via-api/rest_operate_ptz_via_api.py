@@ -32,11 +32,14 @@ import uuid
 
 import requests
 
+# nx_transport.py, one folder up, is the HTTP layer every Python sample
+# shares: pooled sessions, logins, the relay 307 and the error types.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from nx_transport import (  # noqa: E402
+    API, RELAY_SUFFIX, ApiError, AuthError, RedirectCache, build_session,
+    check_response, local_logout_url, login_cloud, login_local, revoke_token,
+    send_following_redirects)
 
-CLIENT_ID = "3rdParty"
-RELAY_SUFFIX = ".relay.vmsproxy.com"
-API = "/rest/v4"
-MAX_REDIRECTS = 5
 
 PTZ_OPERATIONS = (
     "move", "stop", "abs_move",
@@ -118,18 +121,6 @@ def resolve_config(cli_args, env_file_values):
     }
 
 
-# ---------------------------------------------------------------------------
-# Errors
-# ---------------------------------------------------------------------------
-
-class AuthError(Exception):
-    """Raised when the server/cloud rejects the credentials or token."""
-
-
-class ApiError(Exception):
-    """Raised for any other unexpected API/network failure."""
-
-
 # ---------------------------------------------------------------------------
 # Pure helpers (easy to test)
 # ---------------------------------------------------------------------------
@@ -181,11 +172,13 @@ def build_ptz_request_body(operation, pan=0.0, tilt=0.0, zoom=0.0, speed=0.5,
 class NxPtzClient:
     """Logs in to a site (local or cloud-relayed) and issues PTZ commands."""
 
-    def __init__(self, host, verify_tls=True, session=None, timeout=15):
+    def __init__(self, host, verify_tls=True, session=None, timeout=15,
+                 redirect_cache=None):
         self.host = (host or "").rstrip("/")
         self.timeout = timeout
-        self.session = session or requests.Session()
+        self.session = session or build_session()
         self.session.verify = verify_tls
+        self.redirect_cache = redirect_cache or RedirectCache()
         self.token = None
         self._local_session = False
         if not verify_tls:
@@ -196,54 +189,17 @@ class NxPtzClient:
 
     def login_local(self, user, password):
         """POST local credentials, receive a bearer token, remember it."""
-        url = f"{self.host}{API}/login/sessions"
-        body = {"username": user, "password": password, "setCookie": False}
-        try:
-            response = self.session.post(url, json=body, timeout=self.timeout)
-        except requests.exceptions.RequestException as exc:
-            raise ApiError(f"Could not reach {url}: {exc}") from exc
-        if response.status_code in (401, 403):
-            raise AuthError(f"Login unauthorized (HTTP {response.status_code}). "
-                            "Check the username/password.")
-        if not response.ok:
-            raise ApiError(f"Login failed: HTTP {response.status_code} "
-                           f"{response.text[:200]}")
-        try:
-            self.token = response.json().get("token")
-        except ValueError as exc:
-            raise ApiError("Login response was not valid JSON.") from exc
-        if not self.token:
-            raise ApiError("Login response did not contain a token.")
+        self.token = login_local(self.session, self.host, user, password,
+                                 timeout=self.timeout,
+                                 rejected="Check the username/password.")
         self._local_session = True
         return self.token
 
     def login_cloud(self, cloud_host, user, password, site_id):
         """POST cloud credentials scoped to one site; receive a bearer token."""
-        url = f"{cloud_host.rstrip('/')}/cdb/oauth2/token"
-        body = {
-            "grant_type": "password",
-            "response_type": "token",
-            "client_id": CLIENT_ID,
-            "username": user,
-            "password": password,
-            "scope": f"cloudSystemId={site_id}",
-        }
-        try:
-            response = self.session.post(url, json=body, timeout=self.timeout)
-        except requests.exceptions.RequestException as exc:
-            raise ApiError(f"Could not reach {url}: {exc}") from exc
-        if response.status_code in (401, 403):
-            raise AuthError(f"Cloud login unauthorized (HTTP {response.status_code}). "
-                            "Check the account credentials and site id.")
-        if not response.ok:
-            raise ApiError(f"Cloud login failed: HTTP {response.status_code} "
-                           f"{response.text[:200]}")
-        try:
-            self.token = response.json().get("access_token")
-        except ValueError as exc:
-            raise ApiError("Cloud token response was not valid JSON.") from exc
-        if not self.token:
-            raise ApiError("Cloud token response did not contain an access_token.")
+        self.token = login_cloud(self.session, cloud_host, user, password, site_id,
+                                 timeout=self.timeout,
+                                 rejected="Check the account credentials and site id.")
         self._local_session = False
         return self.token
 
@@ -262,31 +218,9 @@ class NxPtzClient:
         to follow it automatically; we resend the header (and body, since a
         307/308 must repeat the original request) ourselves.
         """
-        url = f"{self.host}{path}"
-        headers = self._auth_header()
-        for _ in range(MAX_REDIRECTS + 1):
-            try:
-                response = self.session.request(
-                    method, url, headers=headers, json=json_body,
-                    timeout=self.timeout, allow_redirects=False)
-            except requests.exceptions.RequestException as exc:
-                raise ApiError(f"Could not reach {url}: {exc}") from exc
-            if response.status_code in (301, 302, 303, 307, 308):
-                location = response.headers.get("Location")
-                if not location:
-                    raise ApiError(f"Redirect {response.status_code} without a "
-                                   "Location header.")
-                url = location
-                continue
-            break
-        else:
-            raise ApiError("Too many redirects.")
-
-        if response.status_code in (401, 403):
-            raise AuthError(f"{what} unauthorized (HTTP {response.status_code}).")
-        if not response.ok:
-            raise ApiError(f"{what} failed: HTTP {response.status_code} "
-                           f"{response.text[:200]}")
+        response = self._send_following_redirects(
+            method, f"{self.host}{path}", self._auth_header(), json_body)
+        check_response(response, what)
         if not response.content:
             return {}
         try:
@@ -294,6 +228,18 @@ class NxPtzClient:
         except ValueError:
             return {}
 
+    def _send_following_redirects(self, method, url, headers, json_body):
+        """Send one request, chasing redirects by hand; returns the response.
+
+        Once a 307 has been followed, self.redirect_cache sends later commands
+        straight to the serving node, so each PTZ nudge is one round trip
+        instead of two; a POST the node answered is never sent twice. See
+        nx_transport.send_following_redirects().
+        """
+        return send_following_redirects(self.session, method, url, headers,
+                                        self.redirect_cache, timeout=self.timeout,
+                                        json=json_body)
+
     def get_camera(self, device_id):
         """GET camera metadata, including PTZ capabilities."""
         return self._request("GET", f"{API}/devices/{device_id}", "Reading camera info")
@@ -348,14 +294,9 @@ class NxPtzClient:
         if not self.token or not self._local_session:
             self.token = None
             return
-        url = f"{self.host}{API}/login/sessions/{self.token}"
-        try:
-            self.session.delete(url, headers=self._auth_header(), timeout=self.timeout)
-        except requests.exceptions.RequestException:
-            # Logout is cleanup; never let it crash the program.
-            pass
-        finally:
-            self.token = None
+        revoke_token(self.session, local_logout_url(self.host, self.token),
+                     self.token, timeout=self.timeout)
+        self.token = None
 
 
 # ---------------------------------------------------------------------------
@@ -10,6 +10,7 @@ import argparse
 import pytest
 
 import rest_operate_ptz_via_api as sample
+import nx_transport  # on sys.path once the sample is imported
 
 
 # ---------------------------------------------------------------------------
@@ -34,6 +35,9 @@ class FakeResponse:
             raise ValueError("no json")
         return self._json
 
+    def close(self):
+        pass
+
 
 class FakeSession:
     """Serves queued responses per verb and records calls.
@@ -260,10 +264,69 @@ def test_request_resends_body_across_redirect():
     assert session.request_calls[1][3] == {"pan": 0.5}  # body repeated on the 2nd hop
 
 
+def test_second_command_goes_straight_to_the_cached_node():
+    node = "https://node7.relay.vmsproxy.com/rest/v4/devices/cam-1/ptz/move"
+    session = FakeSession(requests_queue=[
+        FakeResponse(307, headers={"Location": node}),
+        FakeResponse(200, content=b""),
+        FakeResponse(200, content=b""),
+    ])
+    client = sample.NxPtzClient("https://sys.relay.vmsproxy.com", session=session)
+    client.token = "cloudtoken"
+
+    client.ptz_move_start("cam-1", {"pan": 0.5})
+    client.ptz_move_start("cam-1", {"pan": -0.5})
+
+    assert len(session.request_calls) == 3
+    assert session.request_calls[2][1] == node
+    assert session.request_calls[2][2]["Authorization"] == "Bearer cloudtoken"
+    assert session.request_calls[2][3] == {"pan": -0.5}
+
+
+def test_failing_cached_node_is_dropped_and_relay_asked_again():
+    relay = "https://sys.relay.vmsproxy.com/rest/v4/devices/cam-1"
+    node = "https://node7.relay.vmsproxy.com/rest/v4/devices/cam-1"
+    session = FakeSession(requests_queue=[
+        FakeResponse(503),
+        FakeResponse(307, headers={"Location": node}),
+        FakeResponse(200, {"name": "Cam 1"}),
+    ])
+    client = sample.NxPtzClient("https://sys.relay.vmsproxy.com", session=session)
+    client.token = "cloudtoken"
+    client.redirect_cache.remember(relay, "https://node3.relay.vmsproxy.com/rest/v4/devices/cam-1")
+
+    assert client.get_camera("cam-1") == {"name": "Cam 1"}
+    assert [call[1] for call in session.request_calls] == [
+        "https://node3.relay.vmsproxy.com/rest/v4/devices/cam-1", relay, node]
+    assert client.redirect_cache.lookup(relay) == node
+
+
+def test_cached_node_answer_is_never_replayed_through_the_relay():
+    relay = "https://sys.relay.vmsproxy.com/rest/v4/devices/cam-1"
+    node = "https://node3.relay.vmsproxy.com/rest/v4/devices/cam-1"
+    session = FakeSession(requests_queue=[FakeResponse(503), FakeResponse(404)])
+    client = sample.NxPtzClient("https://sys.relay.vmsproxy.com", session=session)
+    client.token = "cloudtoken"
+
+    # A POST the node answered (even "gone") is not sent a second time ...
+    client.redirect_cache.remember(relay + "/ptz/move", node + "/ptz/move")
+    with pytest.raises(sample.ApiError):
+        client.ptz_move_start("cam-1", {"pan": 0.5})
+    assert [call[1] for call in session.request_calls] == [node + "/ptz/move"]
+    assert client.redirect_cache.lookup(relay + "/ptz/move") is None
+
+    # ... and a legitimate 404 costs no extra trip through the relay.
+    client.redirect_cache.remember(relay, node)
+    with pytest.raises(sample.ApiError):
+        client.get_camera("cam-1")
+    assert [call[1] for call in session.request_calls][1:] == [node]
+    assert client.redirect_cache.lookup(relay) == node
+
+
 def test_request_too_many_redirects_raises_apierror():
     location = {"Location": "https://sys.relay.vmsproxy.com/rest/v4/devices/cam-1"}
     session = FakeSession(requests_queue=[FakeResponse(307, headers=location)
-                                          for _ in range(sample.MAX_REDIRECTS + 1)])
+                                          for _ in range(nx_transport.MAX_REDIRECTS + 1)])
     client = sample.NxPtzClient("https://sys.relay.vmsproxy.com", session=session)
     client.token = "cloudtoken"
 
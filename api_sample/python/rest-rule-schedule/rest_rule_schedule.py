@@ -47,13 +47,15 @@ import argparse
 import os
 import sys
 
-import requests
+# nx_transport.py, one folder up, is the HTTP layer every Python sample
+# shares: pooled sessions, logins, the relay 307 and the error types.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from nx_transport import (  # noqa: E402
+    API, RELAY_SUFFIX, ApiError, AsyncClient, AuthError, RedirectCache,
+    build_session, check_response, cloud_logout_url, local_logout_url,
+    login_cloud, login_local, revoke_token, send_following_redirects)
 
 
-CLIENT_ID = "3rdParty"
-RELAY_SUFFIX = ".relay.vmsproxy.com"
-# API version path segment. v4 is the latest Nx REST API.
-API = "/rest/v4"
 RULES_PATH = f"{API}/events/rules"
 
 # The two auth modes this sample supports (same names as the other samples).
@@ -62,8 +64,6 @@ MODE_CLOUD = "cloud"
 
 SECONDS_PER_HOUR = 3600
 SECONDS_PER_DAY = 86400
-# Most redirects we will follow when chasing the relay 307.
-MAX_REDIRECTS = 5
 
 # Schedule presets the CLI offers.
 PRESETS = ["always", "weekdays", "weekend", "24x7"]
@@ -74,18 +74,6 @@ WEEKDAYS = [1, 2, 3, 4, 5]
 WEEKEND = [6, 7]
 
 
-# ---------------------------------------------------------------------------
-# Errors
-# ---------------------------------------------------------------------------
-
-class AuthError(Exception):
-    """Raised when login or the bearer token is rejected."""
-
-
-class ApiError(Exception):
-    """Raised for any other unexpected API/network failure."""
-
-
 # ---------------------------------------------------------------------------
 # Schedule helpers (pure functions -- the heart of the sample)
 # ---------------------------------------------------------------------------
@@ -224,7 +212,7 @@ class NxRuleClient:
 
     def __init__(self, mode, user, password, server_host="",
                  cloud_host="https://nxvms.com", site_id="", mfa_code=None,
-                 verify_tls=True, session=None, timeout=15):
+                 verify_tls=True, session=None, timeout=15, redirect_cache=None):
         self.mode = mode
         self.user = user
         self.password = password
@@ -233,8 +221,9 @@ class NxRuleClient:
         self.site_id = site_id
         self.mfa_code = mfa_code
         self.timeout = timeout
-        self.session = session or requests.Session()
+        self.session = session or build_session()
         self.session.verify = verify_tls
+        self.redirect_cache = redirect_cache or RedirectCache()
         self.token = None
 
     @property
@@ -257,66 +246,19 @@ class NxRuleClient:
     # -----------------------------------------------------------------------
 
     def login(self):
-        return self._login_cloud() if self.mode == MODE_CLOUD else self._login_direct()
-
-    def _login_direct(self):
-        """Direct: POST {server}/rest/v4/login/sessions -> { token }."""
-        url = f"{self.server_host}{API}/login/sessions"
-        body = {"username": self.user, "password": self.password, "setCookie": False}
-        try:
-            response = self.session.post(url, json=body, timeout=self.timeout)
-        except requests.exceptions.RequestException as exc:
-            raise ApiError(f"Could not reach {url}: {exc}") from exc
-        if response.status_code in (401, 403):
-            raise AuthError(
-                f"Login rejected (HTTP {response.status_code}). Check the "
-                "username/password, and that it is a LOCAL server account "
-                "(cloud users use --mode cloud).")
-        if not response.ok:
-            raise ApiError(f"Login failed: HTTP {response.status_code} "
-                           f"{response.text[:200]}")
-        try:
-            data = response.json()
-        except ValueError as exc:
-            raise ApiError("Login response was not valid JSON.") from exc
-        self.token = data.get("token")
-        if not self.token:
-            raise ApiError("Login response did not contain a token.")
-        return self.token
-
-    def _login_cloud(self):
-        """Cloud: POST {cloud}/cdb/oauth2/token with cloudSystemId scope."""
-        url = f"{self.cloud_host}/cdb/oauth2/token"
-        body = {
-            "grant_type": "password",
-            "response_type": "token",
-            "client_id": CLIENT_ID,
-            "username": self.user,
-            "password": self.password,
-            # THIS scope is what makes the token usable against the site relay.
-            "scope": f"cloudSystemId={self.site_id}",
-        }
-        if self.mfa_code:
-            body["mfaCode"] = self.mfa_code
-        try:
-            response = self.session.post(url, json=body, timeout=self.timeout)
-        except requests.exceptions.RequestException as exc:
-            raise ApiError(f"Could not reach {url}: {exc}") from exc
-        if response.status_code in (401, 403):
-            raise AuthError(
-                f"Login rejected (HTTP {response.status_code}). Check the cloud "
-                "email/password, the site id, and that the account has access to "
-                "that site. Add --mfa-code for 2FA.")
-        if not response.ok:
-            raise ApiError(f"Token request failed: HTTP {response.status_code} "
-                           f"{response.text[:200]}")
-        try:
-            data = response.json()
-        except ValueError as exc:
-            raise ApiError("Token response was not valid JSON.") from exc
-        self.token = data.get("access_token")
-        if not self.token:
-            raise ApiError("Token response did not contain an access_token.")
+        """Direct: POST {server}/rest/v4/login/sessions. Cloud: a token from
+        {cloud}/cdb/oauth2/token scoped with cloudSystemId -- THAT scope is
+        what makes it usable against the site relay."""
+        if self.mode == MODE_CLOUD:
+            self.token = login_cloud(self.session, self.cloud_host, self.user,
+                                     self.password, self.site_id, self.mfa_code,
+                                     timeout=self.timeout)
+        else:
+            self.token = login_local(
+                self.session, self.server_host, self.user, self.password,
+                timeout=self.timeout,
+                rejected="Check the username/password, and that it is a LOCAL "
+                         "server account (cloud users use --mode cloud).")
         return self.token
 
     # -----------------------------------------------------------------------
@@ -327,42 +269,22 @@ class NxRuleClient:
         """Issue a request, following the relay's 307 MANUALLY and re-attaching
         the bearer (and preserving method + body -- a 307 keeps both) on each hop.
 
-        Auto-follow can drop the Authorization header across hosts, so we use
-        allow_redirects=False and resolve Location ourselves, re-sending the same
-        method and body on every hop. Works for the direct server too (it just
-        won't redirect). One helper serves both GET and PATCH.
+        See nx_transport.send_following_redirects(): the followed node is
+        cached in self.redirect_cache, and a PATCH the node answered is never
+        sent twice. One helper serves both GET and PATCH.
         """
-        from urllib.parse import urljoin
         headers = dict(self._auth_header())
         if json_body is not None:
             headers["Content-Type"] = "application/json"
-        current = url
-        for _hop in range(MAX_REDIRECTS + 1):
-            try:
-                response = self.session.request(
-                    method, current, headers=headers, json=json_body,
-                    timeout=self.timeout, allow_redirects=False)
-            except requests.exceptions.RequestException as exc:
-                raise ApiError(f"Could not reach {current}: {exc}") from exc
-            if response.status_code in (301, 302, 303, 307, 308):
-                location = response.headers.get("Location")
-                if not location:
-                    return response
-                current = urljoin(current, location)
-                continue  # re-issue with the SAME method/body/headers
-            return response
-        raise ApiError(
-            f"Too many redirects (>{MAX_REDIRECTS}) chasing the relay.")
+        return send_following_redirects(
+            self.session, method, url, headers, self.redirect_cache,
+            timeout=self.timeout, json=json_body)
 
     def _check_auth_ok(self, response, what):
-        if response.status_code in (401, 403):
-            raise AuthError(
-                f"{what} unauthorized (HTTP {response.status_code}). In cloud "
-                "mode make sure the token was scoped with cloudSystemId for "
-                "THIS site.")
-        if not response.ok:
-            raise ApiError(f"{what} failed: HTTP {response.status_code} "
-                           f"{response.text[:200]}")
+        check_response(response, what, rejected=(
+            f"{what} unauthorized (HTTP {response.status_code}). In cloud "
+            "mode make sure the token was scoped with cloudSystemId for "
+            "THIS site."))
 
     def list_rules(self):
         """GET every event rule."""
@@ -396,16 +318,34 @@ class NxRuleClient:
         """Revoke the token. Best-effort cleanup."""
         if not self.token:
             return
-        url = (f"{self.cloud_host}/cdb/oauth2/token/{self.token}"
+        url = (cloud_logout_url(self.cloud_host, self.token)
                if self.mode == MODE_CLOUD
-               else f"{self.server_host}{API}/login/sessions/{self.token}")
-        try:
-            self.session.delete(url, headers=self._auth_header(),
-                                timeout=self.timeout)
-        except requests.exceptions.RequestException:
-            pass  # best effort
-        finally:
-            self.token = None
+               else local_logout_url(self.server_host, self.token))
+        revoke_token(self.session, url, self.token, timeout=self.timeout)
+        self.token = None
+
+
+# ---------------------------------------------------------------------------
+# asyncio front end
+# ---------------------------------------------------------------------------
+
+class AsyncNxRuleClient(AsyncClient):
+    """asyncio counterpart of NxRuleClient: same methods, as coroutines.
+    Each call holds a thread of the shared pool; see AsyncClient."""
+
+    sync_class = NxRuleClient
+
+    async def login(self):
+        return await self._run(self.sync.login)
+
+    async def list_rules(self):
+        return await self._run(self.sync.list_rules)
+
+    async def patch_schedule(self, rule_id, schedule):
+        return await self._run(self.sync.patch_schedule, rule_id, schedule)
+
+    async def logout(self):
+        return await self._run(self.sync.logout)
 
 
 # ---------------------------------------------------------------------------
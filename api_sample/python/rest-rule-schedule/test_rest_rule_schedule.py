@@ -13,10 +13,12 @@ Run from this folder:  pytest -q
 """
 
 import argparse
+import asyncio
 
 import pytest
 
 import rest_rule_schedule as sample
+import nx_transport  # on sys.path once the sample is imported
 
 
 SITE = "11111111-2222-3333-4444-555555555555"
@@ -43,6 +45,9 @@ class FakeResponse:
             raise ValueError("no json")
         return self._json
 
+    def close(self):
+        pass
+
 
 class FakeSession:
     """Serves queued responses in order; records every request it sees."""
@@ -67,6 +72,9 @@ class FakeSession:
     def delete(self, url, headers=None, timeout=None):
         return self._serve("DELETE", url, headers, None, None)
 
+    def mount(self, prefix, adapter):
+        pass  # build_session() mounts its pooled adapter; nothing to do here
+
 
 def direct_client(responses=None):
     session = FakeSession(responses=responses)
@@ -332,16 +340,87 @@ def test_patch_schedule_follows_307_preserving_method_body_bearer():
     assert session.calls[1][2]["Authorization"] == "Bearer nxcdb-t"
 
 
+def test_list_then_patch_reuses_the_cached_node():
+    redirected = "https://node-7.relay.vmsproxy.com/rest/v4/events/rules"
+    client, session = cloud_client([
+        FakeResponse(307, headers={"Location": redirected}),
+        FakeResponse(200, []),
+        FakeResponse(200, {"id": "r1"}),
+    ])
+    client.token = "nxcdb-t"
+    client.list_rules()
+    client.patch_schedule("r1", [])
+    assert len(session.calls) == 3
+    assert session.calls[2][0] == "PATCH"
+    assert session.calls[2][1] == redirected + "/r1"
+    assert session.calls[2][2]["Authorization"] == "Bearer nxcdb-t"
+
+
+def test_failing_cached_node_falls_back_to_the_relay():
+    base = f"https://{SITE}.relay.vmsproxy.com/rest/v4/events/rules"
+    redirected = "https://node-7.relay.vmsproxy.com/rest/v4/events/rules"
+    client, session = cloud_client([
+        FakeResponse(502),
+        FakeResponse(307, headers={"Location": redirected}),
+        FakeResponse(200, []),
+    ])
+    client.token = "t"
+    client.redirect_cache.remember(base, "https://node-3.relay.vmsproxy.com/rest/v4/events/rules")
+    assert client.list_rules() == []
+    assert [c[1] for c in session.calls] == [
+        "https://node-3.relay.vmsproxy.com/rest/v4/events/rules", base, redirected]
+
+
+def test_patch_answered_by_the_cached_node_is_not_replayed():
+    base = f"https://{SITE}.relay.vmsproxy.com/rest/v4/events/rules"
+    node = "https://node-3.relay.vmsproxy.com/rest/v4/events/rules"
+    client, session = cloud_client([FakeResponse(500), FakeResponse(504)])
+    client.token = "t"
+    client.redirect_cache.remember(base + "/r1", node + "/r1")
+    with pytest.raises(sample.ApiError):
+        client.patch_schedule("r1", [])
+    client.redirect_cache.remember(base + "/r1", node + "/r1")
+    with pytest.raises(sample.ApiError):
+        client.patch_schedule("r1", [])
+    assert [(c[0], c[1]) for c in session.calls] == [("PATCH", node + "/r1")] * 2
+
+
 def test_too_many_redirects_raises():
     # Every response is a 307 pointing somewhere else -> never resolves.
     responses = [FakeResponse(307, headers={"Location": f"https://h{i}.x/p"})
-                 for i in range(sample.MAX_REDIRECTS + 2)]
+                 for i in range(nx_transport.MAX_REDIRECTS + 2)]
     client, _ = cloud_client(responses)
     client.token = "t"
     with pytest.raises(sample.ApiError, match="Too many redirects"):
         client.patch_schedule("r1", [])
 
 
+# ---------------------------------------------------------------------------
+# asyncio front end
+# ---------------------------------------------------------------------------
+
+def test_async_client_lists_and_patches_rules():
+    session = FakeSession(responses=[
+        FakeResponse(200, {"token": "srv"}),
+        FakeResponse(200, [{"id": "r1"}]),
+        FakeResponse(200, {"id": "r1", "schedule": []}),
+        FakeResponse(204),
+    ])
+    client = sample.AsyncNxRuleClient(sample.MODE_DIRECT, "admin", "pw",
+                                      server_host=SERVER, session=session)
+
+    async def flow():
+        await client.login()
+        rules = await client.list_rules()
+        patched = await client.patch_schedule(rules[0]["id"], [])
+        await client.logout()
+        return patched
+
+    assert asyncio.run(flow()) == {"id": "r1", "schedule": []}
+    assert [c[0] for c in session.calls] == ["POST", "GET", "PATCH", "DELETE"]
+    assert session.calls[2][2]["Authorization"] == "Bearer srv"
+
+
 # ---------------------------------------------------------------------------
 # logout
 # ---------------------------------------------------------------------------
@@ -411,7 +490,7 @@ def test_main_list_prints_table(monkeypatch, capsys):
         FakeResponse(200, RULES),              # list_rules
         FakeResponse(204),                     # logout
     ])
-    monkeypatch.setattr(sample.requests, "Session", lambda: session)
+    monkeypatch.setattr(sample, "build_session", lambda **kwargs: session)
     rc = sample.main(["--mode", "direct", "--server-host", SERVER,
                       "--user", "admin", "--password", "pw", "--list"])
     assert rc == 0
@@ -0,0 +1,347 @@
+# Copyright 2018-present Network Optix, Inc. Licensed under MPL 2.0: www.mozilla.org/MPL/2.0/
+"""
+Offline tests for nx_transport.py, the HTTP layer the Python samples share.
+No network, no server needed.
+
+Run from this folder:  pytest -v test_nx_transport.py
+"""
+
+import asyncio
+import io
+import json
+import threading
+
+import pytest
+import requests
+
+import nx_transport as transport
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, json_data=None, text="", headers=None):
+        self.status_code = status_code
+        self._json = json_data
+        self.text = text
+        self.headers = headers or {}
+        self.closed = False
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    def json(self):
+        if self._json is None:
+            raise ValueError("no json")
+        return self._json
+
+    def close(self):
+        self.closed = True
+
+
+class FakeSession:
+    """Serves queued responses in order (an exception is raised instead of
+    returned) and records every call as (method, url, kwargs)."""
+
+    def __init__(self, responses=()):
+        self._responses = list(responses)
+        self.calls = []
+
+    def _next(self, method, url, kwargs):
+        self.calls.append((method, url, kwargs))
+        response = self._responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    def request(self, method, url, **kwargs):
+        return self._next(method, url, kwargs)
+
+    def post(self, url, **kwargs):
+        return self._next("POST", url, kwargs)
+
+    def delete(self, url, **kwargs):
+        return self._next("DELETE", url, kwargs)
+
+
+RELAY = "https://site.relay.vmsproxy.com/rest/v4/devices"
+NODE = "https://node7.relay.vmsproxy.com/rest/v4/devices"
+
+
+# ---------------------------------------------------------------------------
+# build_session()
+# ---------------------------------------------------------------------------
+
+def test_default_session_pools_connections_and_retries_only_idempotent_calls():
+    adapter = transport.build_session().get_adapter("https://example.com")
+    assert adapter._pool_maxsize == transport.POOL_SIZE
+    assert adapter.max_retries.total == transport.RETRIES
+    assert "GET" in adapter.max_retries.allowed_methods
+    assert "POST" not in adapter.max_retries.allowed_methods  # logins never replayed
+    assert transport.build_session(pool_size=32).get_adapter(
+        "https://example.com")._pool_maxsize == 32
+
+
+def test_build_session_takes_the_methods_to_retry():
+    session = transport.build_session(retry_methods=frozenset({"GET"}))
+    assert session.get_adapter("http://example.com").max_retries.allowed_methods == {"GET"}
+
+
+# ---------------------------------------------------------------------------
+# check_response()
+# ---------------------------------------------------------------------------
+
+def test_check_response_maps_statuses_to_errors():
+    ok = FakeResponse(200)
+    assert transport.check_response(ok, "Listing") is ok
+    with pytest.raises(transport.AuthError, match="scope"):
+        transport.check_response(FakeResponse(403), "Listing", rejected="scope")
+    with pytest.raises(transport.ApiError, match="HTTP 500 boom"):
+        transport.check_response(FakeResponse(500, text="boom"), "Listing")
+
+
+# ---------------------------------------------------------------------------
+# Login / logout
+# ---------------------------------------------------------------------------
+
+def test_login_local_posts_credentials_and_returns_the_token():
+    session = FakeSession([FakeResponse(200, {"token": "vms-t"})])
+    token = transport.login_local(session, "https://h:7001/", "admin", "pw")
+    assert token == "vms-t"
+    method, url, kwargs = session.calls[0]
+    assert (method, url) == ("POST", "https://h:7001/rest/v4/login/sessions")
+    assert kwargs["json"] == {"username": "admin", "password": "pw", "setCookie": False}
+
+
+def test_login_cloud_scopes_the_token_only_when_given_a_site():
+    session = FakeSession([FakeResponse(200, {"access_token": "t"})] * 2)
+    transport.login_cloud(session, "https://nxvms.com", "me@x.com", "pw",
+                          site_id="sys-1", mfa_code="123456")
+    transport.login_cloud(session, "https://nxvms.com", "me@x.com", "pw")
+    scoped, wide = (call[2]["json"] for call in session.calls)
+    assert session.calls[0][1] == "https://nxvms.com/cdb/oauth2/token"
+    assert scoped["scope"] == "cloudSystemId=sys-1"
+    assert scoped["mfaCode"] == "123456"
+    assert scoped["client_id"] == transport.CLIENT_ID
+    assert "scope" not in wide and "mfaCode" not in wide
+
+
+def test_login_errors_are_typed():
+    with pytest.raises(transport.AuthError, match="LOCAL"):
+        transport.login_local(FakeSession([FakeResponse(401)]), "https://h", "u", "p")
+    with pytest.raises(transport.ApiError, match="Could not reach"):
+        transport.login_local(FakeSession([requests.exceptions.ConnectionError("x")]),
+                              "https://h", "u", "p")
+    with pytest.raises(transport.ApiError, match="access_token"):
+        transport.login_cloud(FakeSession([FakeResponse(200, {})]), "https://c", "u", "p")
+
+
+def test_revoke_token_deletes_with_the_bearer_and_never_raises():
+    session = FakeSession([FakeResponse(204), requests.exceptions.ConnectionError("x")])
+    url = transport.cloud_logout_url("https://nxvms.com/", "t")
+    transport.revoke_token(session, url, "t")
+    transport.revoke_token(session, transport.local_logout_url("https://h", "t"), "t")
+    assert session.calls[0][1] == "https://nxvms.com/cdb/oauth2/token/t"
+    assert session.calls[0][2]["headers"] == {"Authorization": "Bearer t"}
+    assert session.calls[1][1] == "https://h/rest/v4/login/sessions/t"
+
+
+# ---------------------------------------------------------------------------
+# RedirectCache / send_following_redirects()
+# ---------------------------------------------------------------------------
+
+def test_redirect_cache_expires_and_ignores_path_changing_redirects():
+    now = [0.0]
+    cache = transport.RedirectCache(ttl_s=10, clock=lambda: now[0])
+    cache.remember("https://relay/a", "https://relay/b")
+    cache.remember("https://relay/a", "https://node/elsewhere")
+    assert cache.lookup("https://relay/a") is None
+    cache.remember("https://relay/a?x=1", "https://node/a?x=1")
+    assert cache.lookup("https://RELAY/c?y=2") == "https://node/c?y=2"
+    now[0] = 10.0
+    assert cache.lookup("https://relay/c") is None
+
+
+def test_redirect_is_followed_with_method_body_and_headers_then_cached():
+    session = FakeSession([
+        FakeResponse(307, headers={"Location": NODE}),
+        FakeResponse(200),
+        FakeResponse(200),
+    ])
+    cache = transport.RedirectCache()
+    headers = {"Authorization": "Bearer t"}
+
+    transport.send_following_redirects(session, "POST", RELAY, headers, cache,
+                                       params={"a": "1"}, json={"x": 1})
+    transport.send_following_redirects(session, "POST", RELAY, headers, cache)
+
+    assert [(call[0], call[1]) for call in session.calls] == [
+        ("POST", RELAY), ("POST", NODE), ("POST", NODE)]
+    first, second, _ = (call[2] for call in session.calls)
+    assert first["params"] == {"a": "1"} and "params" not in second
+    assert second["json"] == {"x": 1}
+    assert second["headers"] == headers and second["allow_redirects"] is False
+
+
+def test_cached_node_that_is_gone_sends_a_get_back_to_the_relay():
+    session = FakeSession([
+        FakeResponse(307, headers={"Location": NODE}), FakeResponse(200),
+        FakeResponse(502),
+        FakeResponse(307, headers={"Location": NODE}), FakeResponse(200),
+    ])
+    cache = transport.RedirectCache()
+    for _ in range(2):
+        response = transport.send_following_redirects(session, "GET", RELAY, {}, cache)
+    assert response.status_code == 200
+    assert [call[1] for call in session.calls] == [RELAY, NODE, NODE, RELAY, NODE]
+
+
+def test_cached_node_answer_to_a_post_is_never_replayed():
+    session = FakeSession([
+        FakeResponse(307, headers={"Location": NODE}), FakeResponse(200),
+        FakeResponse(503),
+    ])
+    cache = transport.RedirectCache()
+    transport.send_following_redirects(session, "POST", RELAY, {}, cache, json={})
+    response = transport.send_following_redirects(session, "POST", RELAY, {}, cache,
+                                                  json={})
+    assert response.status_code == 503
+    assert len(session.calls) == 3
+    assert cache.lookup(RELAY) is None  # the next call asks the relay again
+
+
+def test_redirect_loops_and_missing_locations_raise():
+    loop = FakeSession([FakeResponse(307, headers={"Location": NODE})]
+                       * (transport.MAX_REDIRECTS + 1))
+    with pytest.raises(transport.ApiError, match="Too many redirects"):
+        transport.send_following_redirects(loop, "GET", RELAY, {})
+    with pytest.raises(transport.ApiError, match="Location"):
+        transport.send_following_redirects(FakeSession([FakeResponse(307)]),
+                                           "GET", RELAY, {})
+
+
+# ---------------------------------------------------------------------------
+# iter_json_array()
+# ---------------------------------------------------------------------------
+
+def _chunked(text, size):
+    data = text.encode("utf-8")
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize("size", [1, 2, 5, 1000])
+def test_iter_json_array_survives_any_chunk_boundary(size):
+    body = ' [ {"id": "c1", "name": "Lobby \u00e9é"}, 12345, true ,{"a": [1, 2]} ] '
+    assert list(transport.iter_json_array(_chunked(body, size))) == [
+        {"id": "c1", "name": "Lobby éé"}, 12345, True, {"a": [1, 2]}]
+
+
+def test_iter_json_array_unwraps_envelope_and_handles_empty_bodies():
+    assert list(transport.iter_json_array(_chunked('{"reply": [{"id": 1}]}', 3))) == [{"id": 1}]
+    assert list(transport.iter_json_array([])) == []
+    assert list(transport.iter_json_array([b"[]"])) == []
+
+
+def test_iter_json_array_rejects_truncated_or_broken_json():
+    with pytest.raises(ValueError):
+        list(transport.iter_json_array(_chunked('[{"id": 1}, {"id"', 4)))
+    with pytest.raises(ValueError):
+        list(transport.iter_json_array([b"[nope]"]))
+
+
+# ---------------------------------------------------------------------------
+# Fleet crawl
+# ---------------------------------------------------------------------------
+
+def test_load_list_file_skips_blanks_and_comments(tmp_path):
+    path = tmp_path / "hosts.txt"
+    path.write_text("# lab\nhttps://a:7001\n\n  https://b:7001  \n")
+    assert transport.load_list_file(str(path)) == ["https://a:7001", "https://b:7001"]
+
+
+def test_crawl_sites_yields_every_site_and_reports_failures():
+    def list_site(site):
+        if site == "bad":
+            raise transport.ApiError("unreachable")
+        return [{"id": site}]
+
+    results = list(transport.crawl_sites(["a", "bad", "c", "d", "e"], list_site, workers=2))
+
+    by_site = {r["site"]: r for r in results}
+    assert sorted(by_site) == ["a", "bad", "c", "d", "e"]
+    assert by_site["bad"]["error"] == "unreachable" and by_site["bad"]["cameras"] == []
+    assert by_site["c"]["cameras"] == [{"id": "c"}] and by_site["c"]["error"] is None
+    assert all(r["seconds"] >= 0 for r in results)
+
+
+def test_crawl_sites_keeps_only_a_bounded_window_queued():
+    started = []
+
+    def list_site(site):
+        started.append(site)
+        return []
+
+    crawl = transport.crawl_sites(range(100), list_site, workers=2)
+    next(crawl)
+    assert len(started) <= 2 * 2 + 1   # not all 100 sites submitted up front
+    assert len(list(crawl)) == 99
+
+
+def test_write_inventory_dedups_ids_and_writes_jsonl_and_csv():
+    results = [
+        {"site": "https://a", "seconds": 0.1, "error": None,
+         "cameras": [{"id": "c1", "name": "Lobby"}, {"id": "c2", "name": "Door"}]},
+        {"site": "https://b", "seconds": 0.2, "error": None,
+         "cameras": [{"id": "c1", "name": "Lobby"}]},
+        {"site": "https://x", "seconds": 1.0, "error": "boom", "cameras": []},
+    ]
+    out, log = io.StringIO(), io.StringIO()
+    assert transport.write_inventory(results, out, "jsonl", log=log) == (3, 2, 1)
+    rows = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert [(r["site"], r["id"]) for r in rows] == [("https://a", "c1"), ("https://a", "c2")]
+    assert "https://x: FAILED: boom" in log.getvalue()
+
+    out = io.StringIO()
+    transport.write_inventory(results[:1], out, "csv")
+    lines = out.getvalue().splitlines()
+    assert lines[0] == "site,id,name,status,model"
+    assert lines[1] == "https://a,c1,Lobby,,"
+
+
+def test_inventory_keeps_every_camera_without_an_id():
+    # No id to match on, so none of them is taken for a duplicate of another.
+    result = {"site": "https://a", "cameras": [
+        {"name": "New 1"}, {"id": None, "name": "New 2"}, {"id": "c1"}, {"id": "c1"}]}
+    rows = list(transport.inventory_rows(result, set()))
+    assert [(r["id"], r["name"]) for r in rows] == [
+        ("", "New 1"), ("", "New 2"), ("c1", "")]
+
+
+# ---------------------------------------------------------------------------
+# asyncio support
+# ---------------------------------------------------------------------------
+
+def test_shared_async_executor_is_one_bounded_pool():
+    executor = transport.shared_async_executor()
+    assert executor is transport.shared_async_executor()
+    assert executor._max_workers == transport.ASYNC_CONCURRENCY
+
+
+def test_async_client_runs_the_sync_methods_on_the_shared_pool():
+    class Blocking:
+        def __init__(self, name):
+            self.token = name
+
+        def whoami(self):
+            return self.token, threading.current_thread().name
+
+    class AsyncBlocking(transport.AsyncClient):
+        sync_class = Blocking
+
+        async def whoami(self):
+            return await self._run(self.sync.whoami)
+
+    client = AsyncBlocking("a", limiter=asyncio.Semaphore(1))
+    token, thread = asyncio.run(client.whoami())
+    assert (token, client.token) == ("a", "a")
+    assert thread.startswith("nx-async")
+    assert client.executor is AsyncBlocking("b").executor
@@ -8,6 +8,8 @@ Run from this folder:  pytest -v
 import argparse
 import base64
 import hashlib
+import threading
+import time
 
 import pytest
 
@@ -270,6 +272,16 @@ def test_parse_upload_item_invalid_chunk_size_falls_back():
     assert chunk == 999
 
 
+def test_default_session_leaves_chunk_puts_to_upload_chunks():
+    # The shared session retries PUT; this sample's must not (upload_chunks does).
+    client = sample.NxVirtualCameraClient("https://h:7001", "admin", "pw")
+    allowed = client.session.get_adapter("https://example.com").max_retries.allowed_methods
+    assert "PUT" not in allowed
+    assert "GET" in allowed
+    assert sample.build_session(pool_size=32).get_adapter(
+        "https://example.com")._pool_maxsize == 32
+
+
 # ---------------------------------------------------------------------------
 # Client: login
 # ---------------------------------------------------------------------------
@@ -322,7 +334,8 @@ def test_full_upload_call_sequence(tmp_path):
 
     result = upload = sample.upload_video(
         client, str(path), name="Cam", start_time_ms=1700000000000,
-        ttl_ms=300000, requested_chunk_size=1048576, duration_ms=30000)
+        ttl_ms=300000, requested_chunk_size=1048576, duration_ms=30000,
+        workers=1)
 
     methods_urls = [(c["method"], c["url"]) for c in session.calls]
     base = HOST + "/rest/v4/devices"
@@ -417,6 +430,506 @@ def test_release_called_even_when_a_step_fails(tmp_path):
     assert release_calls[0]["json"] == {"token": "lock-9"}
 
 
+# ---------------------------------------------------------------------------
+# Adaptive chunk size and window
+# ---------------------------------------------------------------------------
+
+def test_pick_chunk_size_scales_with_round_trip_and_is_clamped():
+    assert sample.pick_chunk_size(0.0005) == sample.ADAPTIVE_MIN_CHUNK
+    # 50 ms * 4 round trips * 10 MiB/s = 2 MiB.
+    assert sample.pick_chunk_size(0.05) == 2 * 1024 * 1024
+    assert sample.pick_chunk_size(0.06) == 4 * 1024 * 1024     # rounded up
+    assert sample.pick_chunk_size(2.0) == sample.ADAPTIVE_MAX_CHUNK
+
+
+def test_goodput_window_grows_while_goodput_improves_and_halves_on_retry():
+    now = [0.0]
+    window = sample.GoodputWindow(start=2, max_size=4, clock=lambda: now[0])
+    window.on_ack(500)
+    now[0] += 1.0
+    window.on_ack(500)                                        # 1000 B/s: 2 -> 3
+    assert window.size == 3
+    for _ in range(3):
+        now[0] += 0.5
+        window.on_ack(1000)                                   # 2000 B/s: 3 -> 4
+    assert (window.size, window.peak) == (4, 4)
+    for _ in range(4):
+        now[0] += 1.0
+        window.on_ack(1000)                                   # 1000 B/s: 4 -> 3
+    assert window.size == 3 and window.best_bps == 2000
+    window.on_retry()
+    assert window.size == 1
+
+
+def test_adaptive_upload_probes_the_round_trip_and_reports_the_decision(tmp_path):
+    path = _clip(tmp_path, size=500)
+    session = RecordingSession(
+        post=[FakeResponse(200, {"items": [{"uploadId": "u", "chunkSizeB": 100}]})],
+        patch=[FakeResponse(200, {"token": "L"}), FakeResponse(200, {})])
+
+    result = sample.upload_video(
+        make_client(session), path, name="x", start_time_ms=1, ttl_ms=60000,
+        requested_chunk_size=1048576, device_id="{d}", workers=2, adaptive=True)
+
+    probes = [c for c in session.calls if c["url"].endswith("/virtual/status")]
+    assert len(probes) == sample.ADAPTIVE_PROBES
+    create = next(c for c in session.calls if c["url"].endswith("/virtual/uploads"))
+    assert create["json"]["items"][0]["chunkSizeB"] == sample.ADAPTIVE_MIN_CHUNK
+    tuning = result["tuning"]
+    assert tuning["requested_chunk_size_b"] == sample.ADAPTIVE_MIN_CHUNK
+    assert tuning["chunk_size_b"] == 100                  # the server's choice wins
+    assert 1 <= tuning["workers"] <= tuning["peak_workers"] <= sample.ADAPTIVE_MAX_WORKERS
+    assert result["chunk_count"] == 5 and tuning["rtt_ms"] >= 0
+    assert tuning["assumed_rate_bps"] == sample.ASSUMED_RATE_BPS
+
+
+# ---------------------------------------------------------------------------
+# Lock keep-alive
+# ---------------------------------------------------------------------------
+
+class SlowPutSession(RecordingSession):
+    def put(self, *args, **kwargs):
+        time.sleep(0.02)
+        return super().put(*args, **kwargs)
+
+
+def test_lock_is_extended_while_chunks_are_in_flight(tmp_path):
+    path = _clip(tmp_path, size=500)
+    session = SlowPutSession(
+        post=[FakeResponse(200, {"items": [{"uploadId": "u", "chunkSizeB": 100}]})],
+        patch=[FakeResponse(200, {"token": "L"}), FakeResponse(200, {})])
+
+    sample.upload_video(make_client(session), path, name="x", start_time_ms=1,
+                        ttl_ms=40, requested_chunk_size=100, device_id="{d}",
+                        workers=1)
+
+    patches = [(c["url"].rsplit("/", 1)[1], c["json"]) for c in session.calls
+               if c["method"] == "PATCH"]
+    assert patches[0] == ("lock", {"ttlMs": 40})
+    assert patches[-1] == ("release", {"token": "L"})     # keeper stopped first
+    extends = patches[1:-1]
+    assert extends and all(p == ("extend", {"ttlMs": 40, "token": "L"})
+                           for p in extends)
+
+
+def test_lock_keeper_retries_a_failed_renewal_sooner_and_stops_cleanly():
+    class FlakyClient:
+        def __init__(self):
+            self.times = []
+
+        def extend_lock(self, device_id, lock_token, ttl_ms):
+            self.times.append(time.monotonic())
+            if len(self.times) == 1:
+                raise sample.ApiError("HTTP 503")
+
+    client, notes = FlakyClient(), []
+    keeper = sample.LockKeeper(client, "{d}", "L", ttl_ms=300, min_retry_s=0.001,
+                               on_progress=notes.append)   # renews every 150 ms
+    with keeper:
+        deadline = time.time() + 2
+        while keeper.renewals < 1 and time.time() < deadline:
+            time.sleep(0.005)
+    calls = len(client.times)
+    time.sleep(0.2)
+
+    assert keeper.renewals == 1 and "HTTP 503" in str(keeper.error)
+    assert notes[0].startswith("Lock renewal failed")
+    assert client.times[1] - client.times[0] < 0.1      # ~50 ms, not 150 ms
+    assert len(client.times) == calls                   # nothing after stop()
+
+
+def test_lock_keeper_gives_up_once_the_lock_has_expired():
+    class DownClient:
+        calls = 0
+
+        def extend_lock(self, device_id, lock_token, ttl_ms):
+            DownClient.calls += 1
+            raise sample.ApiError("HTTP 503")
+
+    notes = []
+    keeper = sample.LockKeeper(DownClient(), "{d}", "L", ttl_ms=60, min_retry_s=0.01,
+                               on_progress=notes.append).start()
+    deadline = time.time() + 2
+    while not keeper.lost and time.time() < deadline:
+        time.sleep(0.005)
+    calls = DownClient.calls
+    time.sleep(0.1)
+    keeper.stop()
+
+    assert keeper.lost and "expired" in str(keeper.error)
+    assert DownClient.calls == calls                    # no retries once expired
+    assert "giving up" in notes[-1]
+    with pytest.raises(sample.ApiError, match="HTTP 503"):
+        keeper.check()
+
+
+# ---------------------------------------------------------------------------
+# Parallel chunk upload
+# ---------------------------------------------------------------------------
+
+class ChunkClient:
+    """upload_chunk() stand-in: records chunks, tracks concurrency, fails on cue."""
+
+    def __init__(self, failures=None, delay_s=0.0):
+        self.failures = dict(failures or {})   # index -> exceptions to raise first
+        self.delay_s = delay_s
+        self.received = {}
+        self.attempts = []
+        self.in_flight = self.peak = 0
+        self.lock = threading.Lock()
+
+    def upload_chunk(self, device_id, upload_id, index, data_bytes):
+        with self.lock:
+            self.attempts.append(index)
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+            pending = self.failures.get(index)
+            error = pending.pop(0) if pending else None
+        try:
+            time.sleep(self.delay_s)
+            if error:
+                raise error
+            with self.lock:
+                self.received[index] = bytes(data_bytes)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+
+def _clip(tmp_path, size=1000):
+    path = tmp_path / "clip.mkv"
+    path.write_bytes(bytes(range(256)) * (size // 256) + b"t" * (size % 256))
+    return str(path)
+
+
+def test_upload_chunks_sends_every_chunk_with_a_bounded_window(tmp_path):
+    path = _clip(tmp_path)
+    client = ChunkClient(delay_s=0.01)
+    acked = []
+
+    sent = sample.upload_chunks(client, "d", "u", path, sample.chunk_plan(1000, 64),
+                                workers=3, on_chunk=acked.append)
+
+    assert sent == 16 and sorted(acked) == list(range(16))
+    assert b"".join(client.received[i] for i in range(16)) == open(path, "rb").read()
+    assert 1 < client.peak <= 3
+
+
+def test_upload_chunks_retries_only_the_failed_chunk(tmp_path):
+    client = ChunkClient(failures={2: [sample.ApiError("500"), sample.ApiError("500")]})
+    pauses = []
+
+    sample.upload_chunks(client, "d", "u", _clip(tmp_path), sample.chunk_plan(1000, 250),
+                         workers=2, backoff_s=1.0, sleep=pauses.append)
+
+    assert sorted(client.attempts) == [0, 1, 2, 2, 2, 3]
+    assert pauses == [1.0, 2.0]                     # exponential backoff
+    assert len(client.received) == 4
+
+
+def test_upload_chunks_gives_up_after_retries_and_never_retries_auth(tmp_path):
+    path = _clip(tmp_path)
+    client = ChunkClient(failures={1: [sample.ApiError("500")] * 5})
+    with pytest.raises(sample.ApiError):
+        sample.upload_chunks(client, "d", "u", path, sample.chunk_plan(1000, 500),
+                             workers=1, retries=2, sleep=lambda s: None)
+    assert client.attempts.count(1) == 3
+
+    client = ChunkClient(failures={0: [sample.AuthError("403")]})
+    with pytest.raises(sample.AuthError):
+        sample.upload_chunks(client, "d", "u", path, sample.chunk_plan(1000, 500),
+                             workers=1, sleep=lambda s: None)
+    assert client.attempts == [0]
+
+
+def test_upload_chunks_stops_at_once_when_the_lock_is_lost(tmp_path):
+    class LostLock:
+        def check(self):
+            raise sample.ApiError("Lock on d expired")
+
+    client = ChunkClient()
+    with pytest.raises(sample.ApiError, match="expired"):
+        sample.upload_chunks(client, "d", "u", _clip(tmp_path),
+                             sample.chunk_plan(1000, 250), workers=2, lock=LostLock())
+    assert client.attempts == []                        # no PUT, no retries
+
+
+# ---------------------------------------------------------------------------
+# Memory-mapped files and the MD5 cache
+# ---------------------------------------------------------------------------
+
+def test_mapped_file_hashes_and_slices_one_mapping(tmp_path):
+    path = _clip(tmp_path)
+    data = open(path, "rb").read()
+    with sample.MappedFile(path) as mapped:
+        assert mapped.size_b == 1000
+        assert mapped.md5_base64() == sample.file_md5_base64(path)
+        view = mapped.chunk(990, 64)
+        assert isinstance(view, memoryview) and bytes(view) == data[990:]
+        view.release()
+
+    empty = tmp_path / "empty.mkv"
+    empty.write_bytes(b"")
+    with sample.MappedFile(str(empty)) as mapped:  # zero bytes cannot be mmapped
+        assert mapped.md5_base64() == sample.file_md5_base64(str(empty))
+        assert bytes(mapped.chunk(0, 0)) == b""
+
+
+def test_upload_chunks_from_a_mapping_releases_every_view(tmp_path):
+    path = _clip(tmp_path)
+    client = ChunkClient(failures={3: [sample.ApiError("500")]})
+    mapped = sample.MappedFile(path)
+
+    sample.upload_chunks(client, "d", "u", path, sample.chunk_plan(1000, 128),
+                         workers=3, sleep=lambda s: None, source=mapped)
+
+    assert b"".join(client.received[i] for i in range(8)) == open(path, "rb").read()
+    mapped.close()  # BufferError here if a chunk view were still alive
+
+
+def test_md5_cache_skips_hashing_an_unchanged_file(tmp_path, monkeypatch):
+    path = _clip(tmp_path)
+    cache_path = str(tmp_path / "md5.json")
+    expected = sample.file_md5_base64(path)
+
+    def upload(cache):
+        session = RecordingSession(
+            post=[FakeResponse(200, {"items": [{"uploadId": "clip.mkv"}]})],
+            patch=[FakeResponse(200, {"token": "L"}), FakeResponse(200, {})])
+        sample.upload_video(make_client(session), path, name="x", start_time_ms=1,
+                            ttl_ms=1000, requested_chunk_size=300,
+                            device_id="{d}", mapped=True, md5_cache=cache)
+        return session.calls[1]["json"]["items"][0]["md5"]
+
+    assert upload(sample.Md5Cache(cache_path)) == expected
+
+    def no_hashing(*args):
+        raise AssertionError("hashed a cached file")
+
+    monkeypatch.setattr(sample, "file_md5_base64", no_hashing)
+    monkeypatch.setattr(sample.MappedFile, "md5_base64", no_hashing)
+    assert upload(sample.Md5Cache(cache_path)) == expected  # reloaded from disk
+
+    stat = sample.os.stat(path)
+    sample.os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert sample.Md5Cache(cache_path).get(path, sample.os.stat(path)) is None
+
+
+# ---------------------------------------------------------------------------
+# Resumable uploads
+# ---------------------------------------------------------------------------
+
+def test_index_ranges_round_trip():
+    assert sample.index_ranges({5, 0, 2, 1}) == [[0, 3], [5, 6]]
+    assert sample.index_ranges([]) == []
+    assert sample.range_indices([[0, 3], [5, 6]]) == {0, 1, 2, 5}
+
+
+def _resume_run(path, put, get=(), post=()):
+    session = RecordingSession(
+        post=list(post) or [FakeResponse(200, {"items": [{"uploadId": "up-1",
+                                                          "chunkSizeB": 100}]})],
+        patch=[FakeResponse(200, {"token": "L"}), FakeResponse(200, {})],
+        put=put, get=list(get))
+    try:
+        result = sample.upload_video(
+            make_client(session), path, name="x", start_time_ms=1, ttl_ms=60000,
+            requested_chunk_size=100, device_id="{d}", workers=1, resume=True)
+    except sample.AuthError:
+        result = None
+    return session, result
+
+
+def test_resume_sends_only_the_chunks_the_server_lacks(tmp_path):
+    path = _clip(tmp_path, size=500)
+    sidecar = path + sample.UPLOAD_STATE_SUFFIX
+
+    # Run 1 dies on chunk 2; chunks 0 and 1 were acknowledged.
+    session, result = _resume_run(
+        path, put=[FakeResponse(200), FakeResponse(200), FakeResponse(401)])
+    assert result is None
+    assert session.calls[-1]["url"].endswith("/virtual/release")
+    state = sample.load_upload_state(sidecar)
+    assert (state["uploadId"], state["chunkSizeB"], state["chunks"]) == ("up-1", 100, [[0, 2]])
+    assert state["md5"] == sample.file_md5_base64(path)
+
+    # Run 2: the server confirms 40% held -> no new upload, chunks 2-4 only.
+    session, result = _resume_run(
+        path, put=[FakeResponse(200)],
+        get=[FakeResponse(200, {"uploadProgressPercent": 40}),
+             FakeResponse(200, {"uploadProgressPercent": 100})])
+    assert not any(c["url"].endswith("/virtual/uploads") for c in session.calls)
+    assert [c["params"] for c in session.calls if c["method"] == "PUT"] == [
+        {"chunk": 2}, {"chunk": 3}, {"chunk": 4}]
+    assert (result["chunk_count"], result["resumed_chunks"]) == (3, 2)
+    assert not sample.os.path.exists(sidecar)
+
+
+def test_resume_starts_over_when_the_server_lost_the_upload(tmp_path):
+    path = _clip(tmp_path, size=500)
+    _resume_run(path, put=[FakeResponse(200), FakeResponse(200), FakeResponse(401)])
+
+    session, result = _resume_run(
+        path, put=[FakeResponse(200)],
+        get=[FakeResponse(200, {"uploadProgressPercent": 0}), FakeResponse(200, {})],
+        post=[FakeResponse(200, {"items": [{"uploadId": "up-2", "chunkSizeB": 100}]})])
+    assert session.calls[2]["url"].endswith("/virtual/uploads")  # a fresh upload
+    assert result["upload_id"] == "up-2" and result["chunk_count"] == 5
+
+
+def test_resume_refuses_a_sidecar_for_a_changed_file(tmp_path):
+    path = _clip(tmp_path, size=500)
+    _resume_run(path, put=[FakeResponse(200), FakeResponse(401)])
+    with open(path, "ab") as handle:
+        handle.write(b"more")
+    with pytest.raises(sample.ApiError, match="different upload"):
+        _resume_run(path, put=[FakeResponse(200)])
+
+
+# ---------------------------------------------------------------------------
+# Bulk directory ingest
+# ---------------------------------------------------------------------------
+
+def test_start_time_from_name():
+    # 2026-06-16T12:00:00Z == 1781611200000 ms.
+    for name in ("cam_20260616T120000.mp4", "2026-06-16_12-00-00.mkv",
+                 "front 2026-06-16T12:00:00Z.mp4", "clip-1781611200000.mp4"):
+        assert sample.start_time_from_name(name) == 1781611200000, name
+    assert sample.start_time_from_name("clip-2026-13-45_99-00-00.mp4") is None
+    assert sample.start_time_from_name("footage.mp4") is None
+
+
+def test_plan_ingest_groups_clips_by_device(tmp_path):
+    (tmp_path / "Front Door").mkdir()
+    (tmp_path / "Front Door" / "b_20260616T120500.mp4").write_bytes(b"b")
+    (tmp_path / "Front Door" / "a_20260616T120000.mp4").write_bytes(b"a")
+    (tmp_path / "root_1781611200000.mp4").write_bytes(b"r")
+    (tmp_path / "evidence.mkv").write_bytes(b"e")
+    (tmp_path / "evidence.mkv.json").write_text(
+        '{"startTime": "2026-06-16T12:00:00Z", "durationMs": 5000, "deviceId": "{d9}"}')
+    (tmp_path / "undated.mp4").write_bytes(b"u")
+    (tmp_path / "broken.mp4").write_bytes(b"x")
+    (tmp_path / "broken.mp4.json").write_text("{not json")
+
+    groups, skipped = sample.plan_ingest(str(tmp_path), name="Inbox")
+
+    assert sorted(groups) == [("id", "{d9}"), ("name", "Front Door"), ("name", "Inbox")]
+    assert [c["filename"] for c in groups[("name", "Front Door")]] == [
+        "a_20260616T120000.mp4", "b_20260616T120500.mp4"]       # by start time
+    assert groups[("id", "{d9}")][0]["durationMs"] == 5000
+    assert groups[("name", "Inbox")][0]["startTimeMs"] == 1781611200000
+    assert sorted(sample.os.path.basename(p) for p, _ in skipped) == [
+        "broken.mp4", "undated.mp4"]
+
+    groups, _ = sample.plan_ingest(str(tmp_path), device_id="{root}")
+    assert ("id", "{root}") in groups
+
+
+def test_ingest_directory_one_lock_and_one_create_upload_per_device(tmp_path):
+    (tmp_path / "Lobby").mkdir()
+    (tmp_path / "Lobby" / "1_20260616T120000.mp4").write_bytes(b"a" * 150)
+    (tmp_path / "Lobby" / "2_20260616T130000.mp4").write_bytes(b"b" * 50)
+    (tmp_path / "Dock").mkdir()
+    (tmp_path / "Dock" / "20260616T140000.mp4").write_bytes(b"c" * 10)
+    groups, _ = sample.plan_ingest(str(tmp_path))
+
+    session = RecordingSession(
+        get=[FakeResponse(200, [{"id": "{lobby}", "name": "Lobby"}]),  # device list
+             FakeResponse(200, {})],
+        post=[FakeResponse(200, {"id": "{dock}"}),                      # create Dock
+              FakeResponse(200, [{"uploadId": "u-dock", "chunkSizeB": 100}]),
+              FakeResponse(200, [{"uploadId": "u-1", "chunkSizeB": 100},
+                                 {"_error": "overlaps existing footage"}])],
+        patch=[FakeResponse(200, {"token": "L"})])
+
+    results = sample.ingest_directory(make_client(session), groups, ttl_ms=60000,
+                                      requested_chunk_size=100, device_workers=1)
+
+    by_file = {sample.os.path.basename(r["path"]): r for r in results}
+    assert by_file["20260616T140000.mp4"]["device_id"] == "{dock}"
+    assert by_file["1_20260616T120000.mp4"]["chunk_count"] == 2
+    assert "overlaps" in by_file["2_20260616T130000.mp4"]["error"]
+    creates = [c for c in session.calls if c["url"].endswith("/virtual/uploads")]
+    assert [len(c["json"]["items"]) for c in creates] == [1, 2]
+    patches = [c["url"].rsplit("/", 1)[1] for c in session.calls if c["method"] == "PATCH"]
+    assert patches == ["lock", "release", "lock", "release"]
+
+
+# ---------------------------------------------------------------------------
+# Waiting for the import
+# ---------------------------------------------------------------------------
+
+class StatusClient:
+    """upload_status() stand-in on a fake clock: scripted replies per upload."""
+
+    def __init__(self, scripts):
+        self.scripts = {upload_id: list(replies) for upload_id, replies in scripts.items()}
+        self.now = 0.0
+        self.polls = []
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+    def upload_status(self, device_id, upload_id):
+        self.polls.append((self.now, upload_id))
+        script = self.scripts[upload_id]
+        reply = script.pop(0) if len(script) > 1 else script[0]
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+
+def _watch(client, uploads, **kwargs):
+    return sample.wait_for_imports(client, uploads, clock=lambda: client.now,
+                                   sleep=client.sleep, rand=lambda: 0.0, **kwargs)
+
+
+def test_wait_for_imports_multiplexes_uploads_with_backoff():
+    quiet = {"uploadProgressPercent": 100, "archiveProgressPercent": 0}
+    client = StatusClient({
+        "a": [quiet, quiet, quiet,
+              {"uploadProgressPercent": 100, "archiveProgressPercent": 50},
+              {"uploadProgressPercent": 100, "archiveProgressPercent": 100}],
+        "b": [quiet, {"_error": "Unsupported codec"}],
+    })
+    notes = []
+    uploads = [{"device_id": "d", "upload_id": "a", "size_b": 1000, "label": "a.mkv"},
+               {"device_id": "d", "upload_id": "b", "size_b": 10, "label": "b.mkv"}]
+
+    results = _watch(client, uploads, poll_s=1.0, max_poll_s=4.0,
+                     on_progress=notes.append)
+
+    assert [r["state"] for r in results] == ["imported", "failed"]
+    assert results[1]["error"] == "Unsupported codec"
+    # One thread, earliest-due first. Quiet polls back off 2s, then 4s (the
+    # cap); the poll that saw progress keeps its 4s.
+    assert client.polls == [(0.0, "a"), (0.0, "b"), (1.0, "a"), (1.0, "b"),
+                            (3.0, "a"), (7.0, "a"), (11.0, "a")]
+    assert results[0]["archive_bps"] == 1000 // 11      # 1000 B archived in 11 s
+    assert "a.mkv: uploaded 100%, archived 50%" in notes[-2]
+
+
+def test_wait_for_imports_jitters_and_gives_up():
+    stuck = {"uploadProgressPercent": 100, "archiveProgressPercent": 10}
+    client = StatusClient({"a": [stuck], "b": [sample.ApiError("HTTP 502")]})
+    uploads = [{"device_id": "d", "upload_id": "a", "size_b": 1},
+               {"device_id": "d", "upload_id": "b", "size_b": 1}]
+
+    results = sample.wait_for_imports(
+        client, uploads, poll_s=1.0, max_poll_s=8.0, timeout_s=30, error_limit=3,
+        clock=lambda: client.now, sleep=client.sleep, rand=lambda: 1.0)
+
+    assert [r["state"] for r in results] == ["timeout", "failed"]
+    assert "HTTP 502" in results[1]["error"]
+    times = [t for t, upload_id in client.polls if upload_id == "a"]
+    assert times[:3] == pytest.approx([0.0, 0.8, 2.4])   # 1s, 2s, each 20% early
+    assert max(times) <= 30
+
+    client = StatusClient({"a": [sample.AuthError("401")]})
+    with pytest.raises(sample.AuthError):
+        _watch(client, uploads[:1])
+
+
 # ---------------------------------------------------------------------------
 # config
 # ---------------------------------------------------------------------------
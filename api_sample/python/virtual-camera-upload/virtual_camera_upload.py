@@ -32,6 +32,8 @@ THE VIRTUAL-CAMERA UPLOAD FLOW (from docs/v4_api_spec.json):
                   (PATCH .../virtual/consume is DEPRECATED -- not used)
   7. Release:   PATCH  {server}/rest/v4/devices/{id}/virtual/release  {"token": <lock>}
                   (always run, even on error, so the lock is freed)
+  + Keep-alive: PATCH  {server}/rest/v4/devices/{id}/virtual/extend  {ttlMs, token}
+                  (every half TTL while 4-6 run, so a short --ttl never expires)
   + Log out:    DELETE {server}/rest/v4/login/sessions/<token>
 
 The `/*/` in step 2 is the current-server wildcard -- it is part of the path, not
@@ -48,35 +50,83 @@ Reference: https://meta.nxvms.com/doc/developers/api-tool/main?type=1
 
 import argparse
 import base64
+import concurrent.futures
+import contextlib
 import datetime as dt
 import hashlib
+import heapq
+import itertools
+import json
+import mmap
 import os
+import random
 import re
 import sys
+import threading
+import time
 
 import requests
 
+# nx_transport.py, one folder up, is the HTTP layer every Python sample
+# shares: pooled sessions, logins and the error types.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import nx_transport  # noqa: E402
+from nx_transport import (  # noqa: E402
+    API, POOL_SIZE, ApiError, AuthError, check_response, local_logout_url,
+    login_local, revoke_token)
 
-# API version path segment. v4 is the latest Nx REST API.
-API = "/rest/v4"
 
 # Default lock time-to-live (seconds) and requested upload chunk size (bytes).
 DEFAULT_TTL_S = 300
+# While an upload runs the lock is extended every LOCK_RENEW_FRACTION of its
+# TTL, so a short --ttl (quick recovery after a crashed uploader) never
+# expires under a long transfer. A failed renewal is retried sooner.
+LOCK_RENEW_FRACTION = 0.5
 DEFAULT_CHUNK_SIZE = 1024 * 1024  # 1 MiB
 # Size of the reads used while hashing the file (bytes).
 HASH_READ_SIZE = 1024 * 1024
-
-
-# ---------------------------------------------------------------------------
-# Errors
-# ---------------------------------------------------------------------------
-
-class AuthError(Exception):
-    """Raised when the server rejects the credentials or token."""
-
-
-class ApiError(Exception):
-    """Raised for any other unexpected API/network failure."""
+# Chunk PUTs kept in flight at once (--workers). The server addresses chunks
+# by ?chunk=<n>, so they may arrive in any order. A failed chunk is re-sent
+# up to CHUNK_RETRIES times, CHUNK_RETRY_BACKOFF_S, 2x, 4x... apart.
+DEFAULT_UPLOAD_WORKERS = 4
+CHUNK_RETRIES = 3
+CHUNK_RETRY_BACKOFF_S = 1.0
+# --adaptive. The server fixes the chunk size at create-upload, before any
+# data is sent, so it is picked from the round-trip time (the fastest of
+# ADAPTIVE_PROBES status GETs): big enough that one chunk takes
+# ADAPTIVE_RTTS_PER_CHUNK round trips at ASSUMED_RATE_BPS, so request
+# overhead stays small, and no bigger, so a retry stays cheap. The rate is
+# an assumption, not a measurement: no data has been sent yet to measure.
+# The chunks in flight then follow the measured goodput, up to
+# ADAPTIVE_MAX_WORKERS.
+ADAPTIVE_PROBES = 3
+ASSUMED_RATE_BPS = 10 * 1024 * 1024
+ADAPTIVE_RTTS_PER_CHUNK = 4
+ADAPTIVE_MIN_CHUNK = 256 * 1024
+ADAPTIVE_MAX_CHUNK = 32 * 1024 * 1024
+ADAPTIVE_MAX_WORKERS = 16
+# --wait: after the chunks, poll each upload's status until the server has
+# written it into the archive. Polls start WAIT_POLL_S apart and double
+# (minus up to WAIT_JITTER of random jitter, so many uploads don't poll in
+# lockstep) while nothing changes, up to WAIT_MAX_POLL_S. An upload not
+# imported within WAIT_TIMEOUT_S, or with WAIT_ERROR_LIMIT failed polls in
+# a row, is given up on.
+WAIT_POLL_S = 1.0
+WAIT_MAX_POLL_S = 30.0
+WAIT_JITTER = 0.2
+WAIT_TIMEOUT_S = 3600
+WAIT_ERROR_LIMIT = 5
+# Sidecar file (next to --file) holding the --resume progress.
+UPLOAD_STATE_SUFFIX = ".upload.json"
+# --dir bulk ingest: optional per-clip metadata lives in <clip>.json, and
+# DEFAULT_DEVICE_WORKERS devices are uploaded to at once (each with its own
+# lock and --workers chunks in flight).
+CLIP_SIDECAR_SUFFIX = ".json"
+DEFAULT_DEVICE_WORKERS = 2
+# Methods the session (build_session) retries: the shared ones minus PUT. A
+# chunk PUT is retried by upload_chunks() (CHUNK_RETRIES), and a second layer
+# underneath would multiply the attempts and the backoff.
+RETRY_METHODS = nx_transport.RETRY_METHODS - {"PUT"}
 
 
 # ---------------------------------------------------------------------------
@@ -118,6 +168,86 @@ def file_md5_base64(path, read_size=HASH_READ_SIZE):
     return base64.b64encode(digest.digest()).decode("ascii")
 
 
+class MappedFile:
+    """A file mapped read-only into memory, for hashing and uploading it.
+
+    The MD5 and every chunk come from the same mapping: the upload reads the
+    pages hashing already pulled into the OS page cache instead of going back
+    to disk, and chunk() hands the HTTP layer a zero-copy memoryview instead
+    of a fresh bytes copy. A zero-byte file, which cannot be mapped, is
+    served from an empty buffer.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._handle = open(path, "rb")
+        try:
+            self.size_b = os.fstat(self._handle.fileno()).st_size
+            self._map = (mmap.mmap(self._handle.fileno(), 0, access=mmap.ACCESS_READ)
+                         if self.size_b else b"")
+        except (OSError, ValueError):
+            self._handle.close()
+            raise
+
+    def md5_base64(self):
+        return base64.b64encode(hashlib.md5(self._map).digest()).decode("ascii")
+
+    def chunk(self, offset, length):
+        """A memoryview of `length` bytes at `offset`. release() it when sent:
+        the mapping cannot be closed while views of it are alive."""
+        return memoryview(self._map)[offset:offset + length]
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._handle.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class Md5Cache:
+    """File MD5s kept in one JSON file, keyed by path, size and mtime.
+
+    A re-upload of an unchanged file then skips hashing it entirely; any
+    change to its size or modification time makes the entry miss. The file
+    is rewritten atomically (temp file + rename) on every change.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._files = {}
+        self._lock = threading.Lock()  # bulk ingest hashes on several threads
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as handle:
+                    data = json.load(handle)
+            except (OSError, ValueError):
+                data = None  # unreadable: start over, it's only a cache
+            if isinstance(data, dict):
+                self._files = data
+
+    def get(self, file_path, stat):
+        """The cached base64 MD5 for `file_path` as `stat` describes it, or None."""
+        entry = self._files.get(os.path.abspath(file_path))
+        if (isinstance(entry, dict) and entry.get("sizeB") == stat.st_size
+                and entry.get("mtimeNs") == stat.st_mtime_ns):
+            return entry.get("md5")
+        return None
+
+    def put(self, file_path, stat, md5_b64):
+        with self._lock:
+            self._files[os.path.abspath(file_path)] = {
+                "sizeB": stat.st_size, "mtimeNs": stat.st_mtime_ns, "md5": md5_b64}
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as handle:
+                json.dump(self._files, handle, separators=(",", ":"))
+            os.replace(tmp_path, self.path)
+
+
 def chunk_plan(total_size, chunk_size):
     """Plan how a file of `total_size` bytes splits into `chunk_size` pieces.
 
@@ -149,6 +279,85 @@ def iter_file_chunks(path, chunk_size):
             yield index, handle.read(length)
 
 
+def pick_chunk_size(rtt_s, rate_bps=ASSUMED_RATE_BPS,
+                    rtts_per_chunk=ADAPTIVE_RTTS_PER_CHUNK,
+                    min_chunk=ADAPTIVE_MIN_CHUNK, max_chunk=ADAPTIVE_MAX_CHUNK):
+    """The chunk size (a power of two, in bytes) for a link with `rtt_s`.
+
+    A chunk that takes `rtts_per_chunk` round trips to send at `rate_bps`
+    (an assumed rate; only the round trip is measured) keeps the
+    per-request wait a small share of the transfer; the result is clamped
+    to [min_chunk, max_chunk].
+    """
+    target = max(1, int(rtt_s * rtts_per_chunk * rate_bps))
+    size = 1 << (target - 1).bit_length()  # round up to a power of two
+    return max(min_chunk, min(max_chunk, size))
+
+
+def index_ranges(indices):
+    """Compress chunk indices into sorted [start, end) ranges: {0,1,2,5} ->
+    [[0, 3], [5, 6]]. Acknowledged chunks are mostly contiguous, so the
+    --resume sidecar stays a few bytes long however many chunks it covers."""
+    ranges = []
+    for index in sorted(indices):
+        if ranges and ranges[-1][1] == index:
+            ranges[-1][1] = index + 1
+        else:
+            ranges.append([index, index + 1])
+    return ranges
+
+
+def range_indices(ranges):
+    """The inverse of index_ranges(): [[0, 3], [5, 6]] -> {0, 1, 2, 5}."""
+    return {index for start, end in ranges for index in range(start, end)}
+
+
+def upload_state_path(file_path):
+    """Where the --resume sidecar for `file_path` lives."""
+    return f"{file_path}{UPLOAD_STATE_SUFFIX}"
+
+
+def _load_json(path, what):
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as handle:
+            return json.load(handle)
+    except (OSError, ValueError) as exc:
+        raise ApiError(f"Could not read {what} {path}: {exc}") from exc
+
+
+def load_upload_state(path):
+    """Read a --resume sidecar. Missing file -> None."""
+    return _load_json(path, "upload state")
+
+
+def save_upload_state(path, state):
+    """Write the sidecar atomically, so a crash never leaves half a file."""
+    temp = f"{path}.tmp"
+    with open(temp, "w", encoding="utf-8") as handle:
+        json.dump(state, handle)
+    os.replace(temp, path)
+
+
+def build_upload_item(filename, size_b, md5_b64, start_time_ms, chunk_size_b,
+                      duration_ms=None):
+    """Build one item of the create-upload request's "items" list.
+
+    See build_items_payload() for what the fields mean.
+    """
+    item = {
+        "filename": filename,
+        "sizeB": size_b,
+        "md5": md5_b64,
+        "startTimeMs": start_time_ms,
+        "chunkSizeB": chunk_size_b,
+    }
+    if duration_ms is not None and duration_ms > 0:
+        item["durationMs"] = duration_ms
+    return item
+
+
 def build_items_payload(filename, size_b, md5_b64, start_time_ms, chunk_size_b,
                         duration_ms=None):
     """Build the {"items": [...]} body for the create-upload request.
@@ -165,16 +374,8 @@ def build_items_payload(filename, size_b, md5_b64, start_time_ms, chunk_size_b,
     footage will not appear on the timeline (see the README's troubleshooting
     section), so pass --duration-ms if you know the clip length.
     """
-    item = {
-        "filename": filename,
-        "sizeB": size_b,
-        "md5": md5_b64,
-        "startTimeMs": start_time_ms,
-        "chunkSizeB": chunk_size_b,
-    }
-    if duration_ms is not None and duration_ms > 0:
-        item["durationMs"] = duration_ms
-    return {"items": [item]}
+    return {"items": [build_upload_item(filename, size_b, md5_b64, start_time_ms,
+                                        chunk_size_b, duration_ms)]}
 
 
 def _unwrap(data):
@@ -218,12 +419,12 @@ def parse_lock_token(data):
     raise ApiError("Lock response did not contain a token.")
 
 
-def parse_upload_item(data, requested_chunk_size, fallback_upload_id):
-    """Read the create-upload reply -> (upload_id, chunk_size_b), defensively.
+def parse_upload_items(data):
+    """The per-item list of a create-upload reply, defensively.
 
-    Uses the server's returned chunkSizeB when present, else the requested size.
-    Uses the server's returned uploadId when present, else the filename (the
-    consume body documents uploadId as the previously uploaded file's name).
+    The reply is a list with one object per requested item, in request
+    order; it may also come as {"items": [...]}, a bare object or a
+    {"reply": ...} envelope. Non-object entries become {}.
     """
     data = _unwrap(data)
     if isinstance(data, dict) and isinstance(data.get("items"), list):
@@ -234,9 +435,18 @@ def parse_upload_item(data, requested_chunk_size, fallback_upload_id):
         items = [data]
     else:
         items = []
+    return [item if isinstance(item, dict) else {} for item in items]
+
+
+def parse_upload_item(data, requested_chunk_size, fallback_upload_id):
+    """Read the create-upload reply -> (upload_id, chunk_size_b), defensively.
+
+    Uses the server's returned chunkSizeB when present, else the requested size.
+    Uses the server's returned uploadId when present, else the filename (the
+    consume body documents uploadId as the previously uploaded file's name).
+    """
+    items = parse_upload_items(data)
     item = items[0] if items else {}
-    if not isinstance(item, dict):
-        item = {}
     upload_id = item.get("uploadId") or fallback_upload_id
     chunk_size_b = item.get("chunkSizeB") or requested_chunk_size
     try:
@@ -248,6 +458,93 @@ def parse_upload_item(data, requested_chunk_size, fallback_upload_id):
     return upload_id, chunk_size_b
 
 
+def parse_upload_status(data):
+    """The status object from an upload-status reply, defensively.
+
+    The path form answers with one object, the query form with a list of
+    them; either may come in a {"reply": ...} envelope. Anything else -> {}.
+    """
+    data = _unwrap(data)
+    if isinstance(data, list):
+        data = data[0] if data else {}
+    return data if isinstance(data, dict) else {}
+
+
+# A date-time in a clip's file name: 20260616T120000, 2026-06-16_12-00-00,
+# 2026-06-16T12:00:00Z ... (read as UTC). Else a 13-digit epoch-ms number.
+_NAME_TIME_RE = re.compile(
+    r"(?<!\d)(\d{4})-?(\d{2})-?(\d{2})[T_ -]?(\d{2})[-:.]?(\d{2})[-:.]?(\d{2})(?!\d)")
+_NAME_EPOCH_MS_RE = re.compile(r"(?<!\d)(\d{13})(?!\d)")
+
+
+def start_time_from_name(filename):
+    """The start time encoded in a clip's file name (epoch ms), or None."""
+    match = _NAME_TIME_RE.search(filename)
+    if match:
+        try:
+            when = dt.datetime(*map(int, match.groups()), tzinfo=dt.timezone.utc)
+        except ValueError:
+            when = None  # digits, but not a real date
+        if when:
+            return int(when.timestamp() * 1000)
+    match = _NAME_EPOCH_MS_RE.search(filename)
+    return int(match.group(1)) if match else None
+
+
+def plan_ingest(root, device_id=None, name="Virtual Camera"):
+    """Walk `root` and group its clips by the virtual device they go to.
+
+    Returns ({device: [clip, ...]}, [(path, reason), ...] skipped). A device
+    is ("id", <device id>) or ("name", <virtual device name>); each clip is
+    {path, filename, startTimeMs, durationMs}, sorted by start time.
+
+    A clip may have a <clip>.json sidecar with startTime (ISO 8601 or epoch
+    ms), durationMs, deviceId and/or deviceName. Without one, the start time
+    comes from the file name (start_time_from_name) and the device from the
+    top-level subfolder the clip sits in, used as a device name. Clips
+    directly in `root` go to `device_id`, or else to a device named `name`.
+    """
+    groups = {}
+    skipped = []
+    for folder, subfolders, files in os.walk(root):
+        subfolders[:] = sorted(d for d in subfolders if not d.startswith("."))
+        relative = os.path.relpath(folder, root)
+        top = None if relative == os.curdir else relative.split(os.sep)[0]
+        for filename in sorted(files):
+            if filename.startswith(".") or filename.endswith(
+                    (CLIP_SIDECAR_SUFFIX, ".tmp")):
+                continue
+            path = os.path.join(folder, filename)
+            try:
+                meta = _load_json(path + CLIP_SIDECAR_SUFFIX, "clip sidecar") or {}
+                if not isinstance(meta, dict):
+                    raise ApiError("its sidecar is not a JSON object")
+                start = meta.get("startTime", meta.get("startTimeMs"))
+                start_ms = (parse_start_time_ms(start) if start is not None
+                            else start_time_from_name(filename))
+            except ApiError as exc:
+                skipped.append((path, str(exc)))
+                continue
+            if start_ms is None:
+                skipped.append((path, "no start time in its name or sidecar"))
+                continue
+            if not isinstance(meta.get("durationMs", 0), int):
+                skipped.append((path, "durationMs in its sidecar is not a number"))
+                continue
+            if meta.get("deviceId"):
+                device = ("id", meta["deviceId"])
+            elif meta.get("deviceName") or top:
+                device = ("name", meta.get("deviceName") or top)
+            else:
+                device = ("id", device_id) if device_id else ("name", name)
+            groups.setdefault(device, []).append({
+                "path": path, "filename": filename, "startTimeMs": start_ms,
+                "durationMs": meta.get("durationMs")})
+    for clips in groups.values():
+        clips.sort(key=lambda clip: clip["startTimeMs"])
+    return groups, skipped
+
+
 # ---------------------------------------------------------------------------
 # Configuration (CLI > env > .env). Server vars are NX_SERVER_*.
 # ---------------------------------------------------------------------------
@@ -288,6 +585,11 @@ def resolve_config(cli_args, env_file_values):
 # Client
 # ---------------------------------------------------------------------------
 
+def build_session(pool_size=POOL_SIZE):
+    """nx_transport.build_session(), minus PUT retries: upload_chunks() owns those."""
+    return nx_transport.build_session(pool_size=pool_size, retry_methods=RETRY_METHODS)
+
+
 class NxVirtualCameraClient:
     """Creates a virtual device on a single VMS server and uploads footage."""
 
@@ -297,7 +599,7 @@ class NxVirtualCameraClient:
         self.user = user
         self.password = password
         self.timeout = timeout
-        self.session = session or requests.Session()
+        self.session = session or build_session()
         self.session.verify = verify_tls
         if not verify_tls:
             # We deliberately skipped TLS verification (--insecure, for lab
@@ -312,14 +614,9 @@ class NxVirtualCameraClient:
 
     def _check(self, response, what):
         """Shared response validation -> typed errors + parsed JSON."""
-        if response.status_code in (401, 403):
-            raise AuthError(
-                f"{what} unauthorized (HTTP {response.status_code}). Check the "
-                "username/password, and that you are using a local (not cloud) user."
-            )
-        if not response.ok:
-            raise ApiError(
-                f"{what} failed: HTTP {response.status_code} {response.text[:200]}")
+        check_response(response, what, rejected=(
+            f"{what} unauthorized (HTTP {response.status_code}). Check the "
+            "username/password, and that you are using a local (not cloud) user."))
         try:
             return response.json()
         except ValueError as exc:
@@ -353,29 +650,19 @@ class NxVirtualCameraClient:
 
     def login(self):
         """POST credentials, receive a bearer token, remember it."""
-        url = f"{self.host}{API}/login/sessions"
-        body = {"username": self.user, "password": self.password, "setCookie": False}
-        try:
-            response = self.session.post(url, json=body, timeout=self.timeout)
-        except requests.exceptions.RequestException as exc:
-            raise ApiError(f"Could not reach {url}: {exc}") from exc
-        data = self._check(response, "Login")
-        self.token = data.get("token")
-        if not self.token:
-            raise ApiError("Login response did not contain a token.")
+        self.token = login_local(
+            self.session, self.host, self.user, self.password, timeout=self.timeout,
+            rejected="Check the username/password, and that you are using a "
+                     "local (not cloud) user.")
         return self.token
 
     def logout(self):
         """DELETE the session so the token cannot be reused. Best-effort."""
         if not self.token:
             return
-        url = f"{self.host}{API}/login/sessions/{self.token}"
-        try:
-            self.session.delete(url, headers=self._auth_header(), timeout=self.timeout)
-        except requests.exceptions.RequestException:
-            pass  # logout is cleanup; never let it crash the program
-        finally:
-            self.token = None
+        revoke_token(self.session, local_logout_url(self.host, self.token),
+                     self.token, timeout=self.timeout)
+        self.token = None
 
     # -- 2. create virtual device -------------------------------------------
 
@@ -388,6 +675,28 @@ class NxVirtualCameraClient:
         data = self._post(url, {"name": name}, "Create virtual device")
         return parse_device_id(data)
 
+    def list_virtual_devices(self):
+        """GET {server}/rest/v4/devices/*/virtual -> the virtual devices."""
+        url = f"{self.host}{API}/devices/*/virtual"
+        try:
+            response = self.session.get(
+                url, headers=self._auth_header(), timeout=self.timeout)
+        except requests.exceptions.RequestException as exc:
+            raise ApiError(f"Could not reach {url}: {exc}") from exc
+        data = _unwrap(self._check(response, "List virtual devices"))
+        return [device for device in data if isinstance(device, dict)] \
+            if isinstance(data, list) else []
+
+    def virtual_status(self, device_id):
+        """GET .../virtual/status -> the device's lock state (a cheap call)."""
+        url = f"{self.host}{API}/devices/{device_id}/virtual/status"
+        try:
+            response = self.session.get(
+                url, headers=self._auth_header(), timeout=self.timeout)
+        except requests.exceptions.RequestException as exc:
+            raise ApiError(f"Could not reach {url}: {exc}") from exc
+        return self._check(response, "Virtual device status")
+
     # -- 3. lock -------------------------------------------------------------
 
     def lock_device(self, device_id, ttl_ms):
@@ -396,6 +705,12 @@ class NxVirtualCameraClient:
         data = self._patch(url, {"ttlMs": ttl_ms}, "Lock virtual device")
         return parse_lock_token(data)
 
+    def extend_lock(self, device_id, lock_token, ttl_ms):
+        """PATCH .../virtual/extend {"ttlMs": ..., "token": ...} -> renew the lock."""
+        url = f"{self.host}{API}/devices/{device_id}/virtual/extend"
+        return self._patch(url, {"ttlMs": ttl_ms, "token": lock_token},
+                           "Extend lock")
+
     # -- 4. create upload ----------------------------------------------------
 
     def create_upload(self, device_id, filename, size_b, md5_b64,
@@ -408,6 +723,16 @@ class NxVirtualCameraClient:
         data = self._post(url, body, "Create upload")
         return parse_upload_item(data, requested_chunk_size, filename)
 
+    def create_uploads(self, device_id, items):
+        """POST .../virtual/uploads with several items -> one reply per item.
+
+        Each reply is an object (see parse_upload_items), in the order of
+        `items`; an item the server refused carries an "_error" string.
+        """
+        url = f"{self.host}{API}/devices/{device_id}/virtual/uploads"
+        replies = parse_upload_items(self._post(url, {"items": items}, "Create upload"))
+        return replies + [{}] * (len(items) - len(replies))
+
     # -- 5. upload one chunk -------------------------------------------------
 
     def upload_chunk(self, device_id, upload_id, index, data_bytes):
@@ -471,9 +796,256 @@ class NxVirtualCameraClient:
 # Orchestration (steps 2-7) -- separated so it is easy to test end-to-end.
 # ---------------------------------------------------------------------------
 
+class GoodputWindow:
+    """How many chunk PUTs upload_chunks() keeps in flight, tuned as it goes.
+
+    Goodput (acknowledged bytes per second) is measured over rounds of
+    `size` acknowledged chunks. While a round beats the best one so far by
+    10%, one more chunk is let in flight; once a round falls 10% below it,
+    one fewer. A retried chunk halves the window straight away: on a flaky
+    link more chunks in flight only means more to re-send.
+    """
+
+    def __init__(self, start, max_size=ADAPTIVE_MAX_WORKERS, clock=time.monotonic):
+        self.max_size = max(1, max_size)
+        self.size = max(1, min(start, self.max_size))
+        self.peak = self.size
+        self.best_bps = 0.0
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._round_start = clock()
+        self._round_b = 0
+        self._round_acks = 0
+
+    def on_ack(self, length):
+        with self._lock:
+            self._round_b += length
+            self._round_acks += 1
+            if self._round_acks < self.size:
+                return
+            elapsed = self._clock() - self._round_start
+            bps = self._round_b / elapsed if elapsed > 0 else 0.0
+            if bps > self.best_bps * 1.1:
+                self.size = min(self.max_size, self.size + 1)
+            elif bps < self.best_bps * 0.9:
+                self.size = max(1, self.size - 1)
+            self.best_bps = max(self.best_bps, bps)
+            self.peak = max(self.peak, self.size)
+            self._round_start = self._clock()
+            self._round_b = self._round_acks = 0
+
+    def on_retry(self):
+        with self._lock:
+            self.size = max(1, self.size // 2)
+
+
+class LockKeeper:
+    """Renews a virtual-device lock on a background thread until stopped.
+
+    Every `renew_fraction` of `ttl_ms` the lock is extended for another
+    `ttl_ms`. A failed renewal is logged and retried after a third of the
+    time the lock has left (at least `min_retry_s`), so one lost request does
+    not cost the lock. A renewal that fails once the lock has expired ends
+    the keeper: `lost` is set, `error` says why, and check() raises it, so
+    the upload stops instead of sending chunks the server will refuse. Use
+    it as a context manager around the uploads: it stops, and waits for any
+    renewal in progress, before the lock is released.
+    """
+
+    def __init__(self, client, device_id, lock_token, ttl_ms,
+                 renew_fraction=LOCK_RENEW_FRACTION, min_retry_s=0.5,
+                 on_progress=None, clock=time.monotonic):
+        self.client = client
+        self.device_id = device_id
+        self.lock_token = lock_token
+        self.ttl_ms = ttl_ms
+        self.interval_s = ttl_ms / 1000 * renew_fraction
+        self.min_retry_s = min_retry_s
+        self.renewals = 0
+        self.error = None  # the last failed renewal, if any
+        self.lost = False  # the lock expired before a renewal got through
+        self._on_progress = on_progress
+        self._clock = clock
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name=f"lock-keeper-{device_id}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def check(self):
+        """Raise `error` if the lock has been lost."""
+        if self.lost:
+            raise self.error
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _run(self):
+        expires = self._clock() + self.ttl_ms / 1000
+        wait_s = self.interval_s
+        while not self._stopped.wait(wait_s):
+            try:
+                self.client.extend_lock(self.device_id, self.lock_token, self.ttl_ms)
+            except (AuthError, ApiError) as exc:
+                self.error = exc
+                left_s = expires - self._clock()
+                if left_s <= 0:
+                    # The server has dropped the lock; extending can't bring
+                    # it back, so stop here and let the upload fail.
+                    self.error = ApiError(
+                        f"Lock on {self.device_id} expired; last renewal "
+                        f"failed: {exc}")
+                    self.lost = True
+                    if self._on_progress:
+                        self._on_progress(f"Lock renewal failed and the lock "
+                                          f"expired, giving up: {exc}")
+                    return
+                wait_s = max(self.min_retry_s, left_s / 3)
+                if self._on_progress:
+                    self._on_progress(f"Lock renewal failed, retrying in "
+                                      f"{wait_s:.1f}s: {exc}")
+                continue
+            self.renewals += 1
+            expires = self._clock() + self.ttl_ms / 1000
+            wait_s = self.interval_s
+
+
+def upload_chunks(client, device_id, upload_id, file_path, plan,
+                  workers=DEFAULT_UPLOAD_WORKERS, retries=CHUNK_RETRIES,
+                  backoff_s=CHUNK_RETRY_BACKOFF_S, on_chunk=None, sleep=time.sleep,
+                  source=None, window=None, lock=None):
+    """PUT every (index, offset, length) chunk of `plan`, `workers` at a time.
+
+    Over a high-latency link a serial upload spends most of its time waiting
+    for each PUT's round trip; with several in flight the link stays busy.
+    Only `workers` chunks are read into memory at once; with a MappedFile
+    `source` they are slices of its mapping rather than reads of `file_path`.
+    A GoodputWindow `window` replaces the fixed `workers` with its tuned size.
+    With a LockKeeper `lock`, each PUT first calls lock.check(), so a lost
+    lock stops the upload at once.
+    A chunk that fails with an ApiError is re-sent on its own, up to
+    `retries` times with exponential backoff; an AuthError, or a chunk out
+    of retries, stops the upload. `on_chunk(index)` is called as each chunk
+    is acknowledged. Returns the number of chunks sent.
+    """
+    if workers < 1:
+        raise ApiError("--workers must be at least 1.")
+
+    def read(offset, length):
+        if source is not None:
+            return source.chunk(offset, length)
+        with open(file_path, "rb") as handle:
+            handle.seek(offset)
+            return handle.read(length)
+
+    def send(index, offset, length):
+        data_bytes = read(offset, length)
+        try:
+            for attempt in range(retries + 1):
+                if lock is not None:
+                    lock.check()
+                try:
+                    client.upload_chunk(device_id, upload_id, index, data_bytes)
+                    return index
+                except ApiError:
+                    if attempt == retries:
+                        raise
+                    if window:
+                        window.on_retry()
+                    sleep(backoff_s * 2 ** attempt)
+        finally:
+            if isinstance(data_bytes, memoryview):
+                data_bytes.release()
+
+    def in_flight():
+        return window.size if window else workers
+
+    queued = iter(plan)
+    running = {}
+    sent = 0
+    with concurrent.futures.ThreadPoolExecutor(
+            max_workers=window.max_size if window else workers) as pool:
+
+        def top_up():
+            for chunk in itertools.islice(queued, max(0, in_flight() - len(running))):
+                running[pool.submit(send, *chunk)] = chunk
+
+        top_up()
+        try:
+            while running:
+                done, _ = concurrent.futures.wait(
+                    running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    index = future.result()
+                    _, _, length = running.pop(future)
+                    sent += 1
+                    if window:
+                        window.on_ack(length)
+                    if on_chunk:
+                        on_chunk(index)
+                top_up()
+        except BaseException:
+            for future in running:
+                future.cancel()
+            raise
+    return sent
+
+
+def probe_rtt(client, device_id, rounds=ADAPTIVE_PROBES, clock=time.monotonic):
+    """The round-trip time to the server, in seconds: the fastest of `rounds`
+    GETs of the device's virtual status (the fastest is the one least
+    inflated by queuing on the way)."""
+    best = None
+    for _ in range(rounds):
+        started = clock()
+        client.virtual_status(device_id)
+        elapsed = clock() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best or 0.0
+
+
+def _chunks_still_held(client, device_id, state, note):
+    """The chunks of a --resume `state` the server still holds, or None when
+    the upload has to start over.
+
+    The status reply only says what percentage of the file the server has
+    stored, not which chunks, so the acknowledged chunks in `state` are the
+    list; the percentage checks it. An upload the server no longer knows,
+    or one holding less than was acknowledged, is started over.
+    """
+    upload_id = state["uploadId"]
+    try:
+        status = parse_upload_status(client.upload_status(device_id, upload_id))
+    except ApiError as exc:
+        note(f"Upload {upload_id} cannot be resumed ({exc}); starting over")
+        return None
+    done = range_indices(state.get("chunks", []))
+    acked_b = sum(min(state["chunkSizeB"], state["sizeB"] - index * state["chunkSizeB"])
+                  for index in done)
+    held_pct = status.get("uploadProgressPercent")
+    if (isinstance(held_pct, int) and state["sizeB"]
+            and held_pct < acked_b * 100 // state["sizeB"]):
+        note(f"Server holds {held_pct}% of upload {upload_id}, less than was "
+             "acknowledged; starting over")
+        return None
+    note(f"Resuming upload {upload_id}: {len(done)} chunk(s) already on the server")
+    return done
+
+
 def upload_video(client, file_path, name, start_time_ms, ttl_ms,
                  requested_chunk_size, duration_ms=None, device_id=None,
-                 on_progress=None):
+                 on_progress=None, workers=DEFAULT_UPLOAD_WORKERS, mapped=False,
+                 md5_cache=None, resume=False, adaptive=False):
     """Run the full create -> lock -> create-upload -> chunk PUTs -> status ->
     release sequence.
 
@@ -482,48 +1054,135 @@ def upload_video(client, file_path, name, start_time_ms, ttl_ms,
     `.../virtual/uploads/{uploadId}` endpoint (footage placement comes from the
     startTimeMs given at create-upload). We GET that endpoint to report status.
 
-    Returns a dict summarising what happened. The lock is always released in a
-    finally block, even if a step fails.
+    Chunks are sent `workers` at a time (see upload_chunks); workers=1 sends
+    them one after another, in order. With `mapped` the file is memory-mapped
+    once for both the MD5 and the chunks (see MappedFile); an Md5Cache
+    `md5_cache` skips hashing a file that has not changed since last time.
+
+    With `resume` the upload's ids, MD5, chunk size and acknowledged chunks
+    are kept in a sidecar ({file_path}.upload.json) as it goes. A rerun
+    after a failure re-locks the same device, checks the upload with the
+    server, and sends only the chunks it does not hold yet; the sidecar is
+    removed once the upload is complete.
+
+    With `adaptive` the requested chunk size comes from the measured round
+    trip time and an assumed rate (pick_chunk_size) instead of
+    `requested_chunk_size`, and the chunks in flight follow the measured
+    goodput, starting from `workers` (GoodputWindow). The summary's "tuning" entry reports the decision.
+
+    Returns a dict summarising what happened. A LockKeeper extends the lock
+    while the upload runs, and the lock is always released in a finally
+    block, even if a step fails.
     """
     def note(message):
         if on_progress:
             on_progress(message)
 
-    size_b = os.path.getsize(file_path)
-    md5_b64 = file_md5_base64(file_path)
+    stat = os.stat(file_path)
+    size_b = stat.st_size
     filename = os.path.basename(file_path)
-
-    if device_id is None:
-        device_id = client.create_virtual_device(name)
-        note(f"Created virtual device {device_id}")
-    else:
-        note(f"Using existing virtual device {device_id}")
-
-    lock_token = client.lock_device(device_id, ttl_ms)
-    note("Lock acquired")
-    status = None
-    try:
-        upload_id, server_chunk_size = client.create_upload(
-            device_id, filename, size_b, md5_b64, start_time_ms,
-            requested_chunk_size, duration_ms)
-
-        chunk_count = 0
-        for index, data_bytes in iter_file_chunks(file_path, server_chunk_size):
-            client.upload_chunk(device_id, upload_id, index, data_bytes)
-            chunk_count += 1
-        note(f"{chunk_count} chunk(s) uploaded ({server_chunk_size} B each)")
-
-        # No consume call (deprecated): the import auto-starts on completion.
-        status = client.upload_status(device_id, upload_id)
-        note(f"Upload complete; server is importing footage at {start_time_ms}ms")
-    finally:
-        client.release(device_id, lock_token)
-        note("Released")
+    clip = {"filename": filename, "sizeB": size_b, "mtimeNs": stat.st_mtime_ns,
+            "startTimeMs": start_time_ms}
+
+    sidecar = upload_state_path(file_path) if resume else None
+    state = load_upload_state(sidecar) if resume else None
+    if state is not None:
+        if ({key: state.get(key) for key in clip} != clip
+                or device_id not in (None, state.get("deviceId"))):
+            raise ApiError(
+                f"{sidecar} belongs to a different upload (or the file changed). "
+                "Delete it to start over.")
+        device_id = state["deviceId"]
+
+    with (MappedFile(file_path) if mapped else contextlib.nullcontext()) as source:
+        md5_b64 = state["md5"] if state else None
+        if md5_b64 is None and md5_cache:
+            md5_b64 = md5_cache.get(file_path, stat)
+            if md5_b64:
+                note("MD5 taken from the cache")
+        if md5_b64 is None:
+            md5_b64 = source.md5_base64() if source else file_md5_base64(file_path)
+            if md5_cache:
+                md5_cache.put(file_path, stat, md5_b64)
+
+        if device_id is None:
+            device_id = client.create_virtual_device(name)
+            note(f"Created virtual device {device_id}")
+        else:
+            note(f"Using existing virtual device {device_id}")
+
+        lock_token = client.lock_device(device_id, ttl_ms)
+        note("Lock acquired")
+        status = None
+        done = set()
+        keeper = LockKeeper(client, device_id, lock_token, ttl_ms,
+                            on_progress=on_progress).start()
+        tuning = None
+        window = None
+        try:
+            if adaptive:
+                rtt_s = probe_rtt(client, device_id)
+                window = GoodputWindow(workers)
+                tuning = {"rtt_ms": round(rtt_s * 1000, 1),
+                          "assumed_rate_bps": ASSUMED_RATE_BPS}
+                if state is None:
+                    requested_chunk_size = pick_chunk_size(rtt_s)
+                note(f"Round trip {tuning['rtt_ms']} ms at an assumed "
+                     f"{ASSUMED_RATE_BPS // 1024} KiB/s: requesting "
+                     f"{requested_chunk_size} B chunks")
+            if state is not None:
+                upload_id = state["uploadId"]
+                server_chunk_size = state["chunkSizeB"]
+                done = _chunks_still_held(client, device_id, state, note)
+                if done is None:
+                    state = None
+                    done = set()
+            if state is None:
+                upload_id, server_chunk_size = client.create_upload(
+                    device_id, filename, size_b, md5_b64, start_time_ms,
+                    requested_chunk_size, duration_ms)
+                if resume:
+                    state = dict(clip, md5=md5_b64, deviceId=device_id,
+                                 uploadId=upload_id, chunkSizeB=server_chunk_size,
+                                 chunks=[])
+                    save_upload_state(sidecar, state)
+
+            def acknowledged(index):
+                done.add(index)
+                state["chunks"] = index_ranges(done)
+                save_upload_state(sidecar, state)
+
+            plan = chunk_plan(size_b, server_chunk_size)
+            skipped = len(done)
+            chunk_count = upload_chunks(
+                client, device_id, upload_id, file_path,
+                [chunk for chunk in plan if chunk[0] not in done], workers=workers,
+                on_chunk=acknowledged if resume else None, source=source,
+                window=window, lock=keeper)
+            if window:
+                tuning.update(requested_chunk_size_b=requested_chunk_size,
+                              chunk_size_b=server_chunk_size,
+                              workers=window.size, peak_workers=window.peak,
+                              goodput_bps=int(window.best_bps))
+            note(f"{chunk_count} chunk(s) uploaded ({server_chunk_size} B each)"
+                 + (f", {skipped} already on the server" if skipped else ""))
+
+            # No consume call (deprecated): the import auto-starts on completion.
+            status = client.upload_status(device_id, upload_id)
+            note(f"Upload complete; server is importing footage at {start_time_ms}ms")
+            if resume:
+                os.remove(sidecar)
+        finally:
+            keeper.stop()
+            client.release(device_id, lock_token)
+            note("Released")
 
     return {
         "device_id": device_id,
         "upload_id": upload_id,
         "chunk_count": chunk_count,
+        "resumed_chunks": skipped,
+        "tuning": tuning,
         "chunk_size_b": server_chunk_size,
         "size_b": size_b,
         "start_time_ms": start_time_ms,
@@ -531,6 +1190,220 @@ def upload_video(client, file_path, name, start_time_ms, ttl_ms,
     }
 
 
+def resolve_devices(client, devices, on_progress=None):
+    """Map the ("id"|"name", value) devices of plan_ingest() to device ids.
+
+    Names are looked up among the server's virtual devices; a name with no
+    device yet gets a new one, so a rerun lands in the same devices.
+    """
+    ids = {device: device[1] for device in devices if device[0] == "id"}
+    names = sorted(value for kind, value in devices if kind == "name")
+    if names:
+        existing = {}
+        for device in client.list_virtual_devices():
+            existing.setdefault(device.get("name"), device.get("id"))
+        for name in names:
+            if not existing.get(name):
+                existing[name] = client.create_virtual_device(name)
+                if on_progress:
+                    on_progress(f"Created virtual device {existing[name]} ({name})")
+            ids[("name", name)] = existing[name]
+    return ids
+
+
+def ingest_device(client, device_id, clips, ttl_ms, requested_chunk_size,
+                  workers=DEFAULT_UPLOAD_WORKERS, mapped=False, md5_cache=None,
+                  on_progress=None):
+    """Upload a batch of clips into one virtual device, under one lock.
+
+    All clips are declared in a single create-upload request (one item
+    each), then their chunks are sent clip after clip while a LockKeeper
+    extends the lock. A clip the server
+    refuses, or whose upload fails with an ApiError, is recorded and the
+    batch carries on; an AuthError stops it. The lock is always released.
+    Returns one {path, device_id, upload_id, size_b, chunk_count, status,
+    error} dict per clip.
+    """
+    def note(message):
+        if on_progress:
+            on_progress(message)
+
+    results = [{"path": clip["path"], "device_id": device_id, "upload_id": None,
+                "size_b": None, "chunk_count": 0, "status": None, "error": None}
+               for clip in clips]
+    items = []
+    sizes = []
+    for clip in clips:
+        stat = os.stat(clip["path"])
+        md5_b64 = md5_cache.get(clip["path"], stat) if md5_cache else None
+        if md5_b64 is None:
+            if mapped:
+                with MappedFile(clip["path"]) as source:
+                    md5_b64 = source.md5_base64()
+            else:
+                md5_b64 = file_md5_base64(clip["path"])
+            if md5_cache:
+                md5_cache.put(clip["path"], stat, md5_b64)
+        sizes.append(stat.st_size)
+        items.append(build_upload_item(
+            clip["filename"], stat.st_size, md5_b64, clip["startTimeMs"],
+            requested_chunk_size, clip.get("durationMs")))
+
+    lock_token = client.lock_device(device_id, ttl_ms)
+    note(f"{device_id}: lock acquired, {len(clips)} clip(s)")
+    keeper = LockKeeper(client, device_id, lock_token, ttl_ms,
+                        on_progress=on_progress).start()
+    try:
+        replies = client.create_uploads(device_id, items)
+        for clip, size_b, reply, result in zip(clips, sizes, replies, results):
+            result["size_b"] = size_b
+            if reply.get("_error"):
+                result["error"] = f"Create upload refused: {reply['_error']}"
+                continue
+            upload_id, chunk_size_b = parse_upload_item(
+                reply, requested_chunk_size, clip["filename"])
+            result["upload_id"] = upload_id
+            try:
+                with (MappedFile(clip["path"]) if mapped
+                      else contextlib.nullcontext()) as source:
+                    result["chunk_count"] = upload_chunks(
+                        client, device_id, upload_id, clip["path"],
+                        chunk_plan(size_b, chunk_size_b), workers=workers,
+                        source=source, lock=keeper)
+                result["status"] = client.upload_status(device_id, upload_id)
+                note(f"{device_id}: {clip['filename']} uploaded")
+            except ApiError as exc:
+                result["error"] = str(exc)
+    finally:
+        keeper.stop()
+        client.release(device_id, lock_token)
+        note(f"{device_id}: released")
+    return results
+
+
+def ingest_directory(client, groups, ttl_ms, requested_chunk_size,
+                     workers=DEFAULT_UPLOAD_WORKERS,
+                     device_workers=DEFAULT_DEVICE_WORKERS, mapped=False,
+                     md5_cache=None, on_progress=None):
+    """Upload every plan_ingest() group, `device_workers` devices at a time.
+
+    Each device gets one lock and one create-upload for its whole batch
+    (ingest_device). A device that cannot be resolved, locked or declared
+    fails all of its clips without stopping the others; an AuthError stops
+    the run. Returns the per-clip result dicts, grouped by device.
+    """
+    if device_workers < 1:
+        raise ApiError("--device-workers must be at least 1.")
+    device_ids = resolve_devices(client, groups, on_progress)
+
+    def run(device, clips):
+        try:
+            return ingest_device(client, device_ids[device], clips, ttl_ms,
+                                 requested_chunk_size, workers=workers,
+                                 mapped=mapped, md5_cache=md5_cache,
+                                 on_progress=on_progress)
+        except ApiError as exc:
+            return [{"path": clip["path"], "device_id": device_ids[device],
+                     "upload_id": None, "size_b": None, "chunk_count": 0,
+                     "status": None, "error": str(exc)} for clip in clips]
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=device_workers) as pool:
+        futures = [pool.submit(run, device, clips) for device, clips in groups.items()]
+        return [result for future in futures for result in future.result()]
+
+
+def wait_for_imports(client, uploads, poll_s=WAIT_POLL_S, max_poll_s=WAIT_MAX_POLL_S,
+                     jitter=WAIT_JITTER, timeout_s=WAIT_TIMEOUT_S,
+                     error_limit=WAIT_ERROR_LIMIT, on_progress=None,
+                     clock=time.monotonic, sleep=time.sleep, rand=random.random):
+    """Poll every upload's status until the server has imported it.
+
+    `uploads` are {device_id, upload_id, size_b, label} dicts. They are all
+    polled from this one thread over the client's one session: a heap holds
+    each upload's next due time and the earliest is polled next, so a
+    thousand uploads cost no more threads or connections than one.
+
+    An upload is imported once archiveProgressPercent reaches 100, and
+    failed when its status carries an "_error". Each poll that sees no
+    progress doubles that upload's interval (jittered, up to `max_poll_s`);
+    progress keeps it. `on_progress(message)` hears each change, with the
+    archive write rate seen so far. AuthError stops the wait; other errors
+    count towards `error_limit`. Returns the uploads, in order, each with
+    state (imported|failed|timeout), upload_percent, archive_percent,
+    archive_bps and error.
+    """
+    started = clock()
+    results = [dict(upload, state=None, upload_percent=None, archive_percent=None,
+                    archive_bps=None, error=None) for upload in uploads]
+    heap = [(started, number, poll_s) for number in range(len(results))]
+    heapq.heapify(heap)
+    first_seen = {}
+    errors = {}
+
+    def report(result, message):
+        if on_progress:
+            on_progress(f"{result.get('label') or result['upload_id']}: {message}")
+
+    while heap:
+        due, number, interval_s = heapq.heappop(heap)
+        result = results[number]
+        now = clock()
+        if due - started > timeout_s:
+            result["state"] = "timeout"
+            report(result, "still not imported, giving up")
+            continue
+        if due > now:
+            sleep(due - now)
+            now = clock()
+        try:
+            status = parse_upload_status(
+                client.upload_status(result["device_id"], result["upload_id"]))
+        except AuthError:
+            raise
+        except ApiError as exc:
+            errors[number] = errors.get(number, 0) + 1
+            result["error"] = str(exc)
+            if errors[number] >= error_limit:
+                result["state"] = "failed"
+                report(result, f"status failed {error_limit} times: {exc}")
+                continue
+            status = None
+        else:
+            errors[number] = 0
+        if status is not None and status.get("_error"):
+            result.update(state="failed", error=status["_error"])
+            report(result, f"import failed: {status['_error']}")
+            continue
+
+        progressed = False
+        if status is not None:
+            upload_pct = status.get("uploadProgressPercent")
+            archive_pct = status.get("archiveProgressPercent")
+            progressed = (upload_pct, archive_pct) != (
+                result["upload_percent"], result["archive_percent"])
+            result.update(upload_percent=upload_pct, archive_percent=archive_pct)
+            if isinstance(archive_pct, int):
+                seen_at, seen_pct = first_seen.setdefault(number, (now, archive_pct))
+                if now > seen_at:
+                    result["archive_bps"] = int(
+                        result.get("size_b", 0) * (archive_pct - seen_pct) / 100
+                        / (now - seen_at))
+            if progressed:
+                rate = (f", {result['archive_bps'] // 1024} KiB/s"
+                        if result["archive_bps"] else "")
+                report(result, f"uploaded {upload_pct}%, archived "
+                               f"{archive_pct if archive_pct is not None else '?'}%{rate}")
+            if isinstance(archive_pct, int) and archive_pct >= 100:
+                result.update(state="imported", error=None)
+                continue
+
+        if not progressed:
+            interval_s = min(max_poll_s, interval_s * 2)
+        delay_s = interval_s * (1 - jitter * rand())
+        heapq.heappush(heap, (now + delay_s, number, interval_s))
+    return results
+
+
 # ---------------------------------------------------------------------------
 # CLI
 # ---------------------------------------------------------------------------
@@ -539,8 +1412,14 @@ def build_arg_parser():
     parser = argparse.ArgumentParser(
         description="Create an Nx virtual camera and upload a video file into "
                     "its archive.")
-    parser.add_argument("--file", default=None, required=True,
-                        help="Local video file to upload (required)")
+    parser.add_argument("--file", default=None,
+                        help="Local video file to upload (this or --dir is required)")
+    parser.add_argument("--dir", default=None,
+                        help="Bulk ingest: upload every clip in this directory, "
+                             "one virtual device per subfolder (see README)")
+    parser.add_argument("--device-workers", default=DEFAULT_DEVICE_WORKERS, type=int,
+                        help=f"--dir: devices uploaded to at once (default "
+                             f"{DEFAULT_DEVICE_WORKERS})")
     parser.add_argument("--name", default="Virtual Camera",
                         help="Name for the new virtual device (default 'Virtual Camera')")
     parser.add_argument("--device-id", default=None,
@@ -551,9 +1430,33 @@ def build_arg_parser():
                         help="Clip length in milliseconds (optional; if omitted "
                              "the server derives it from the file's own metadata)")
     parser.add_argument("--ttl", default=None, type=int,
-                        help=f"Lock TTL in seconds (default {DEFAULT_TTL_S})")
+                        help=f"Lock TTL in seconds (default {DEFAULT_TTL_S}); "
+                             "renewed automatically while uploading")
     parser.add_argument("--chunk-size", default=None, type=int,
                         help=f"Requested chunk size in bytes (default {DEFAULT_CHUNK_SIZE})")
+    parser.add_argument("--workers", default=DEFAULT_UPLOAD_WORKERS, type=int,
+                        help="Chunks uploaded at once (default "
+                             f"{DEFAULT_UPLOAD_WORKERS}; 1 = one after another)")
+    parser.add_argument("--wait", action="store_true",
+                        help="After uploading, wait until the server has imported "
+                             "the footage into the archive, reporting progress")
+    parser.add_argument("--wait-timeout", default=WAIT_TIMEOUT_S, type=int,
+                        help=f"--wait: seconds to wait for the import (default "
+                             f"{WAIT_TIMEOUT_S})")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="Pick the chunk size from the measured round trip "
+                             f"and an assumed {ASSUMED_RATE_BPS // (1024 * 1024)} "
+                             "MiB/s; tune the chunks in flight from the measured "
+                             "goodput")
+    parser.add_argument("--mmap", action="store_true",
+                        help="Memory-map the file: hash it and slice its chunks "
+                             "from one mapping instead of reading it twice")
+    parser.add_argument("--md5-cache", default=None,
+                        help="JSON file caching file MD5s by path, size and "
+                             "mtime, so unchanged re-uploads skip hashing")
+    parser.add_argument("--resume", action="store_true",
+                        help="Record progress in <file>.upload.json and, on a "
+                             "rerun, send only the chunks the server lacks")
     parser.add_argument("--server-host", default=None,
                         help="Server URL, e.g. https://192.168.1.10:7001")
     parser.add_argument("--user", default=None, help="Local server username")
@@ -564,6 +1467,44 @@ def build_arg_parser():
     return parser
 
 
+def _main_ingest(args, client, ttl_ms, chunk_size, md5_cache):
+    """--dir: plan the directory, upload it device by device, report per clip."""
+    groups, skipped = plan_ingest(args.dir, device_id=args.device_id, name=args.name)
+    for path, reason in skipped:
+        print(f"Skipped {path}: {reason}", file=sys.stderr)
+    if not groups:
+        print(f"No clips to upload in {args.dir}.")
+        return 0
+    results = ingest_directory(
+        client, groups, ttl_ms, chunk_size, workers=args.workers,
+        device_workers=args.device_workers, mapped=args.mmap,
+        md5_cache=md5_cache, on_progress=lambda m: print(f"  {m}"))
+    failed = [result for result in results if result["error"]]
+    for result in failed:
+        print(f"Failed {result['path']}: {result['error']}", file=sys.stderr)
+    print(f"Done. Uploaded {len(results) - len(failed)} of {len(results)} clip(s) "
+          f"to {len(groups)} device(s).")
+    if args.wait:
+        uploaded = [dict(result, label=os.path.basename(result["path"]))
+                    for result in results if not result["error"]]
+        if not _wait_and_report(args, client, uploaded):
+            return 1
+    return 1 if failed else 0
+
+
+def _wait_and_report(args, client, uploads):
+    """--wait: watch the imports, print the outcome. True if all imported."""
+    print(f"Waiting for {len(uploads)} import(s)...")
+    watched = wait_for_imports(client, uploads, timeout_s=args.wait_timeout,
+                               on_progress=lambda m: print(f"  {m}"))
+    pending = [upload for upload in watched if upload["state"] != "imported"]
+    for upload in pending:
+        print(f"Not imported {upload['label']}: {upload['state']}"
+              + (f" ({upload['error']})" if upload["error"] else ""), file=sys.stderr)
+    print(f"Imported {len(watched) - len(pending)} of {len(watched)} upload(s).")
+    return not pending
+
+
 def main(argv=None):
     args = build_arg_parser().parse_args(argv)
     config = resolve_config(args, load_env_file(args.env_file))
@@ -575,7 +1516,25 @@ def main(argv=None):
               file=sys.stderr)
         return 2
 
-    if not os.path.isfile(args.file):
+    if (args.file is None) == (args.dir is None):
+        print("Give exactly one of --file or --dir.", file=sys.stderr)
+        return 2
+    if args.dir is not None:
+        if not os.path.isdir(args.dir):
+            print(f"Directory not found: {args.dir}", file=sys.stderr)
+            return 2
+        if args.resume or args.start_time or args.duration_ms:
+            print("--resume, --start-time and --duration-ms apply to --file only; "
+                  "--dir reads start times from file names or sidecars.",
+                  file=sys.stderr)
+            return 2
+        if args.device_workers < 1:
+            print("--device-workers must be at least 1.", file=sys.stderr)
+            return 2
+        if args.adaptive:
+            print("--adaptive applies to --file only.", file=sys.stderr)
+            return 2
+    elif not os.path.isfile(args.file):
         print(f"File not found: {args.file}", file=sys.stderr)
         return 2
 
@@ -595,20 +1554,51 @@ def main(argv=None):
         print("--duration-ms must be a positive number of milliseconds.", file=sys.stderr)
         return 2
 
+    if args.workers < 1:
+        print("--workers must be at least 1.", file=sys.stderr)
+        return 2
+
+    if args.wait_timeout <= 0:
+        print("--wait-timeout must be a positive number of seconds.", file=sys.stderr)
+        return 2
+
+    if args.adaptive and args.chunk_size is not None:
+        print("--adaptive picks the chunk size itself; drop --chunk-size.",
+              file=sys.stderr)
+        return 2
+
+    # One pooled connection per chunk in flight.
+    in_flight = (max(args.workers, ADAPTIVE_MAX_WORKERS) if args.adaptive
+                 else args.workers) * (args.device_workers if args.dir else 1)
     client = NxVirtualCameraClient(
         host=config["host"], user=config["user"], password=config["password"],
         verify_tls=not args.insecure,
+        session=build_session(pool_size=max(POOL_SIZE, in_flight)),
     )
+    md5_cache = Md5Cache(args.md5_cache) if args.md5_cache else None
 
     try:
         client.login()
         print(f"Logged in to {config['host']} as {config['user']}")
+        if args.dir:
+            return _main_ingest(args, client, ttl_ms, chunk_size, md5_cache)
         result = upload_video(
             client, args.file, args.name, start_time_ms, ttl_ms,
             chunk_size, duration_ms=args.duration_ms, device_id=args.device_id,
-            on_progress=lambda m: print(f"  {m}"))
+            on_progress=lambda m: print(f"  {m}"), workers=args.workers,
+            mapped=args.mmap,
+            md5_cache=md5_cache, resume=args.resume, adaptive=args.adaptive)
         print(f"Done. Uploaded {result['size_b']} bytes to device "
               f"{result['device_id']} as archive starting {start_time_ms}ms.")
+        if result["tuning"]:
+            tuning = result["tuning"]
+            print(f"  Tuning: {tuning['chunk_size_b']} B chunks at "
+                  f"{tuning['rtt_ms']} ms round trip, up to "
+                  f"{tuning['peak_workers']} in flight, "
+                  f"{tuning['goodput_bps'] // 1024} KiB/s best goodput")
+        if args.wait and not _wait_and_report(
+                args, client, [dict(result, label=os.path.basename(args.file))]):
+            return 1
         return 0
     except AuthError as exc:
         print(f"Login failed: {exc}", file=sys.stderr)